@@ -0,0 +1,413 @@
+"""Rapports de performance de l'index vectoriel.
+
+Usage (depuis backend/) :
+    python -m app.benchmarks quantization [--queries 200] [--k 5]
+    python -m app.benchmarks shards [--counts 1 2 4 8] [--queries 200] [--k 5]
+    python -m app.benchmarks documents [--rows 200000] [--workers 1 4]
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+import faiss
+
+from app.config import VECTOR_STORE_PATH, VECTOR_RESCORE_FACTOR, VECTOR_SHARD_SEARCH_THREADS
+from app.services.vector_store_manager import (
+    current_version, version_path, read_shard_layout, shard_path, FULL_PRECISION_FILE
+)
+
+
+def _rss_mb() -> float:
+    """Mémoire résidente du processus (Linux)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _load_reference_vectors() -> np.ndarray:
+    """Vecteurs float32 de la version publiée (sidecar si l'index est quantifié)"""
+    version = current_version(VECTOR_STORE_PATH)
+    if version is None:
+        raise SystemExit("Aucun vector store publié")
+    path = version_path(VECTOR_STORE_PATH, version)
+    layout = read_shard_layout(path)
+    if layout is not None:
+        return np.vstack([_index_vectors(shard_path(path, i)) for i in layout["shards"]])
+    return _index_vectors(path)
+
+
+def _index_vectors(path: str) -> np.ndarray:
+    sidecar = os.path.join(path, FULL_PRECISION_FILE)
+    if os.path.exists(sidecar):
+        return np.load(sidecar)
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _sample_queries(vectors: np.ndarray, n: int, seed: int = 0) -> np.ndarray:
+    # Requêtes proches des documents : vecteurs existants légèrement bruités
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)]
+    noise = rng.normal(scale=picked.std() * 0.1, size=picked.shape).astype("float32")
+    return picked + noise
+
+
+def _measure(index, queries: np.ndarray, k: int, full: np.ndarray = None):
+    """Latence moyenne (ms/requête) et résultats, avec re-scoring float32 optionnel"""
+    fetch = k * VECTOR_RESCORE_FACTOR if full is not None else k
+    start = time.perf_counter()
+    _, ids = index.search(queries, fetch)
+    if full is not None:
+        rescored = np.empty((len(queries), k), dtype="int64")
+        for row, (query, candidates) in enumerate(zip(queries, ids)):
+            candidates = candidates[candidates != -1]
+            order = np.argsort(((full[candidates] - query) ** 2).sum(axis=1))[:k]
+            rescored[row, :len(order)] = candidates[order]
+        ids = rescored
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return latency_ms, ids
+
+
+def _recall(ids: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids, truth)]))
+
+
+def quantization_report(n_queries: int = 200, k: int = 5, pca_dim: int = None) -> list:
+    """Compare l'index plat float32 aux variantes float16 / int8 / PQ (+ PCA) :
+    taille sérialisée, RSS ajoutée, latence et recall@k"""
+    from app.github_vectors_creator import build_quantized_index
+
+    vectors = _load_reference_vectors()
+    queries = _sample_queries(vectors, n_queries)
+    dim = vectors.shape[1]
+
+    variants = [("float32 (flat)", None), ("float16", "float16"), ("int8", "int8"), ("pq", "pq")]
+    if pca_dim:
+        variants.append((f"pca{pca_dim}+int8", "int8"))
+
+    rows, truth = [], None
+    for name, quantization in variants:
+        rss_before = _rss_mb()
+        if quantization is None:
+            index = faiss.IndexFlatL2(dim)
+            index.add(vectors)
+        else:
+            index = build_quantized_index(vectors, quantization, pca_dim if name.startswith("pca") else None)
+        rss_added = _rss_mb() - rss_before
+        size_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+
+        latency, ids = _measure(index, queries, k)
+        if truth is None:
+            truth = ids
+        row = {
+            "variant": name,
+            "index_mb": round(size_mb, 2),
+            "rss_added_mb": round(rss_added, 2),
+            "latency_ms": round(latency, 3),
+            f"recall@{k}": round(_recall(ids, truth), 4)
+        }
+        if quantization is not None:
+            latency, ids = _measure(index, queries, k, full=vectors)
+            row["rescored_latency_ms"] = round(latency, 3)
+            row[f"rescored_recall@{k}"] = round(_recall(ids, truth), 4)
+        rows.append(row)
+
+    print(f"📊 {len(vectors)} vecteurs de dimension {dim}, {len(queries)} requêtes, k={k}")
+    print(f"   (sidecar float32 pour re-scoring : {vectors.nbytes / 1024 / 1024:.2f} MB, memmap partagé)")
+    for row in rows:
+        print("  " + " | ".join(f"{key}={value}" for key, value in row.items()))
+    return rows
+
+
+def shards_report(counts=(1, 2, 4, 8), n_queries: int = 200, k: int = 5) -> list:
+    """Index plat découpé en n shards (répartition aléatoire) : latence scatter-gather
+    (une requête à la fois, comme /analyze), débit par lots, RSS ajoutée et recall@k"""
+    vectors = _load_reference_vectors()
+    queries = _sample_queries(vectors, n_queries)
+    rng = np.random.default_rng(0)
+    pool = ThreadPoolExecutor(max_workers=VECTOR_SHARD_SEARCH_THREADS)
+
+    rows, truth = [], None
+    for count in counts:
+        rss_before = _rss_mb()
+        assignment = rng.integers(0, count, size=len(vectors))
+        shards = []
+        for shard_id in range(count):
+            ids = np.flatnonzero(assignment == shard_id)
+            index = faiss.IndexFlatL2(vectors.shape[1])
+            index.add(vectors[ids])
+            shards.append((index, ids))
+        rss_added = _rss_mb() - rss_before
+
+        def search(batch):
+            parts = list(pool.map(lambda shard: shard[0].search(batch, k), shards))
+            distances = np.hstack([d for d, _ in parts])
+            ids = np.hstack([np.where(i >= 0, shard[1][i], -1) for (_, i), shard in zip(parts, shards)])
+            order = np.argsort(distances, axis=1)[:, :k]
+            return np.take_along_axis(ids, order, axis=1)
+
+        start = time.perf_counter()
+        ids = np.vstack([search(query.reshape(1, -1)) for query in queries])
+        latency = (time.perf_counter() - start) * 1000 / len(queries)
+        start = time.perf_counter()
+        search(queries)
+        batched = (time.perf_counter() - start) * 1000 / len(queries)
+        if truth is None:
+            truth = ids
+        rows.append({
+            "shards": count,
+            "latency_ms": round(latency, 3),
+            "batched_ms_per_query": round(batched, 3),
+            "rss_added_mb": round(rss_added, 2),
+            "largest_shard": int(max(len(i) for _, i in shards)),
+            f"recall@{k}": round(_recall(ids, truth), 4)
+        })
+        del shards
+    pool.shutdown()
+
+    print(f"📊 {len(vectors)} vecteurs, {len(queries)} requêtes, k={k}, {VECTOR_SHARD_SEARCH_THREADS} threads")
+    for row in rows:
+        print("  " + " | ".join(f"{key}={value}" for key, value in row.items()))
+    return rows
+
+
+def _synthetic_warehouse(rows: int, seed: int = 0) -> dict:
+    """Lignes au format de fetch_github_data (Decimal pour les moyennes, comme psycopg2),
+    réparties entre sections ; quelques titres d'issues dépassent CHUNK_SIZE"""
+    rng = random.Random(seed)
+    repos = [f"org/repo-{i}" for i in range(max(rows // 200, 1))]
+    months = [datetime(2024, m, 1) for m in range(1, 13)]
+    statuses = ["OK", "WARNING", "CRITICAL"]
+
+    def avg():
+        return Decimal(rng.randint(0, 100000)) / 100
+
+    per_section = rows // 5
+    return {
+        "repositories": [
+            (i, repos[i % len(repos)], rng.choice(["Python", "Go", "Java"]), f"https://github.com/{i}",
+             rng.randint(0, 5000), avg(), avg(), avg(), avg(), rng.randint(0, 900), avg())
+            for i in range(per_section)
+        ],
+        "developers": [
+            (i, f"dev{i % 5000}", f"Developer {i}", rng.choice(repos), rng.randint(0, 120),
+             rng.randint(0, 40), rng.randint(0, 30), avg())
+            for i in range(per_section)
+        ],
+        "trends": [
+            (rng.choice(repos), rng.choice(months), rng.randint(0, 300), rng.randint(1, 40))
+            for _ in range(per_section)
+        ],
+        "kpi_status": [
+            (rng.choice(repos), avg(), avg(), avg(), rng.choice(statuses), rng.choice(statuses))
+            for _ in range(per_section)
+        ],
+        "issues": [
+            (i, "Crash on startup " * (80 if i % 500 == 0 else 2), rng.choice(repos), "bug, ui")
+            for i in range(per_section)
+        ],
+    }
+
+
+def _create_documents_rowwise(data) -> list:
+    """create_documents tel qu'avant le rendu en colonnes (un f-string et un split_text par ligne) :
+    référence de débit et d'identité des documents"""
+    from langchain_core.documents import Document
+    from app.github_vectors_creator import _text_splitter
+
+    text_splitter = _text_splitter()
+    documents = []
+    timestamp = datetime.utcnow().isoformat()
+
+    for repo in data["repositories"]:
+        (repo_id, name, language, url, commit_count, avg_merge_time,
+ avg_reopened_issues, avg_review_delay, code_coverage,
+ total_builds, build_success_rate) = repo
+
+        content = f"""Repository: {name}
+Language: {language}
+URL: {url}
+Total Commits: {commit_count}
+Average Merge Time: {avg_merge_time:.2f} hours
+Average Reopened Issues: {avg_reopened_issues:.2f}
+Average Review Delay: {avg_review_delay:.2f} hours
+Code Coverage: {code_coverage:.2f}%
+Total CI Builds: {total_builds}
+Build Success Rate: {build_success_rate:.2f}%
+"""
+
+        docs = text_splitter.split_text(content)
+        for i, chunk in enumerate(docs):
+            documents.append(Document(
+                page_content=chunk,
+                metadata={
+                    "type": "repository",
+                    "repo_id": str(repo_id),
+                    "repo": name,
+                    "language": language,
+                    "chunk_id": i,
+                    "timestamp": timestamp
+                }
+            ))
+
+    # Documents pour développeurs
+    for dev in data["developers"]:
+        user_id, login, name, repo_name, commits, prs, issues, avg_pr_duration = dev
+        content = f"""Developer: {login} ({name})
+                Repository: {repo_name}
+                Commits (3 months): {commits}
+                Pull Requests: {prs}
+                Issues Created: {issues}
+                Average PR Duration: {avg_pr_duration:.2f} hours
+                Performance Level: {'High' if commits > 50 else 'Medium' if commits > 20 else 'Low'}
+                    """
+        docs = text_splitter.split_text(content)
+        for i, chunk in enumerate(docs):
+            documents.append(Document(
+                page_content=chunk,
+                metadata={
+                    "type": "developer",
+                    "user_id": str(user_id),
+                    "login": login,
+                    "repo": repo_name,
+                    "performance_level": "high" if commits > 50 else "medium" if commits > 20 else "low",
+                    "chunk_id": i,
+                    "timestamp": timestamp
+                }
+            ))
+
+    # Documents pour tendances
+    for trend in data["trends"]:
+        repo_name, month, monthly_commits, active_devs = trend
+        content = f"""Monthly Trend: {repo_name}
+                    Month: {month.strftime('%Y-%m')}
+                    Commits: {monthly_commits}
+                    Active Developers: {active_devs}
+                    Activity Level: {'High' if monthly_commits > 100 else 'Medium' if monthly_commits > 50 else 'Low'}
+                        """
+        documents.append(Document(
+            page_content=content,
+            metadata={
+                "type": "trend",
+                "repo": repo_name,
+                "month": month.strftime('%Y-%m'),
+                "activity_level": "high" if monthly_commits > 100 else "medium",
+                "timestamp": timestamp
+            }
+        ))
+
+    # Documents pour KPIs critiques
+    for kpi in data["kpi_status"]:
+        repo_name, merge_time, reopened, review_delay, merge_status, reopened_status = kpi
+        content = f"""KPI Status: {repo_name}
+                        Average Merge Time: {merge_time} hours ({merge_status})
+                        Reopened Issues: {reopened} ({reopened_status})
+                        Review Delay: {review_delay} hours
+                        Overall Health: {'Critical' if 'CRITICAL' in [merge_status, reopened_status] else 'Warning' if 'WARNING' in [merge_status, reopened_status] else 'Good'}
+                        """
+        documents.append(Document(
+            page_content=content,
+            metadata={
+                "type": "kpi_status",
+                "repo": repo_name,
+                "health_level": "critical" if "CRITICAL" in [merge_status, reopened_status] else "warning",
+                "merge_time_status": merge_status.lower(),
+                "reopened_status": reopened_status.lower(),
+                "timestamp": timestamp
+            }
+        ))
+    for issue in data["issues"]:
+        issue_id, title, repo_name, labels = issue
+        content = f"""Issue: {title}
+                    Repository: {repo_name}
+                    Labels: {labels}
+                    """
+        docs = text_splitter.split_text(content)
+        for i, chunk in enumerate(docs):
+            documents.append(Document(
+                page_content=chunk,
+                metadata={
+                    "type": "issue",
+                    "issue_id": str(issue_id),
+                    "repo": repo_name,
+                    "labels": labels,
+                    "chunk_id": i,
+                    "timestamp": timestamp
+                }
+            ))
+
+    return documents
+
+
+def _comparable(documents) -> list:
+    # Le timestamp change à chaque appel
+    return [(doc.page_content, {k: v for k, v in doc.metadata.items() if k != "timestamp"}) for doc in documents]
+
+
+def documents_report(rows: int = 200000, workers=(1, 4)) -> list:
+    """Débit de create_documents (documents/s) : rendu ligne à ligne d'origine, puis rendu
+    en colonnes pour chaque nombre de processus ; vérifie que les documents sont identiques"""
+    from app.github_vectors_creator import create_documents, DOCUMENT_CHUNK_ROWS
+
+    data = _synthetic_warehouse(rows)
+    total_rows = sum(len(section) for section in data.values())
+    variants = [("rowwise", _create_documents_rowwise)]
+    variants += [(f"columnar x{count}", lambda d, count=count: create_documents(d, workers=count)) for count in workers]
+
+    results, reference = [], None
+    for name, build in variants:
+        start = time.perf_counter()
+        documents = build(data)
+        elapsed = time.perf_counter() - start
+        documents = _comparable(documents)
+        if reference is None:
+            reference = documents
+        results.append({
+            "variant": name,
+            "documents": len(documents),
+            "seconds": round(elapsed, 3),
+            "docs_per_s": int(len(documents) / elapsed),
+            "identical": documents == reference
+        })
+
+    print(f"📊 {total_rows} lignes synthétiques, lots de {DOCUMENT_CHUNK_ROWS} lignes minimum")
+    for row in results:
+        print("  " + " | ".join(f"{key}={value}" for key, value in row.items()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapports de performance du vector store")
+    sub = parser.add_subparsers(dest="report", required=True)
+
+    quant = sub.add_parser("quantization", help="float32 vs float16 / int8 / PQ")
+    quant.add_argument("--queries", type=int, default=200)
+    quant.add_argument("--k", type=int, default=5)
+    quant.add_argument("--pca-dim", type=int, default=None)
+
+    shards = sub.add_parser("shards", help="Latence et mémoire selon le nombre de shards")
+    shards.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards.add_argument("--queries", type=int, default=200)
+    shards.add_argument("--k", type=int, default=5)
+
+    documents = sub.add_parser("documents", help="Débit de create_documents (rendu en colonnes, processus)")
+    documents.add_argument("--rows", type=int, default=200000)
+    documents.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+
+    args = parser.parse_args()
+    if args.report == "quantization":
+        quantization_report(args.queries, args.k, args.pca_dim)
+    elif args.report == "shards":
+        shards_report(args.counts, args.queries, args.k)
+    elif args.report == "documents":
+        documents_report(args.rows, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Ingestion incrémentale par capture de changements (high-water marks).
+
+Usage (depuis backend/) :
+    python -m app.change_capture --interval 60          # polling des watermarks
+    python -m app.change_capture --listen github_changes  # + LISTEN/NOTIFY PostgreSQL
+    python -m app.change_capture --once
+
+Chaque cycle détecte les dépôts modifiés depuis le dernier watermark, recalcule
+leurs documents (dépôt, développeurs, tendances, KPI, issues) et publie une
+nouvelle version de l'index ; les workers de l'API la basculent à chaud.
+"""
+import argparse
+import json
+import os
+import select
+import shutil
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+from app.github_vectors_creator import (
+    VECTOR_STORE_PATH, KEEP_VERSIONS, DEDUP_ENABLED, DEDUP_DOC_TYPES, DEDUP_THRESHOLD,
+    EmbeddingService, CustomEmbeddings, embed_in_batches,
+    get_db_connection, fetch_github_data, fetch_contributions, build_repo_graph,
+    fetch_rollup_rows, build_rollups, group_by_shard, save_store, link_version,
+    create_documents, _placeholder
+)
+from app.utils.dedup import deduplicate_documents
+from app.services.vector_store_manager import (
+    current_version, load_vector_store, new_version_id, version_path, shard_path, write_shard_layout,
+    read_extracted_at, publish_version, prune_versions, FULL_PRECISION_FILE, QUANTIZATION_FILE, GRAPH_FILE, ROLLUPS_FILE
+)
+from app.services.vector_search import metadata_index_for, full_precision_for
+
+WATERMARKS_FILE = "watermarks.json"
+
+# (table, colonne de watermark, colonne dépôt, clé primaire) suivies par la capture
+TRACKED_SOURCES = [
+    ("commit_dim", "commit_timestamp", "repo_id", "commit_id"),
+    ("pull_request_dim", "created_at", "repo_id", "pull_request_id"),
+    ("issue_dim", "created_at", "repo_id", "issue_id"),
+    ("code_quality", "date_id", "repo_id", os.getenv("CODE_QUALITY_KEY_COLUMN", "quality_id")),
+    ("kpi_result", "date_id", "repo_id", os.getenv("KPI_RESULT_KEY_COLUMN", "kpi_id")),
+]
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def load_watermarks(root: str = VECTOR_STORE_PATH) -> Dict[str, object]:
+    try:
+        with open(os.path.join(root, WATERMARKS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_watermarks(watermarks: Dict[str, object], root: str = VECTOR_STORE_PATH) -> None:
+    tmp_path = os.path.join(root, f"{WATERMARKS_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f)
+    os.replace(tmp_path, os.path.join(root, WATERMARKS_FILE))
+
+
+def _watermark(entry) -> Tuple[object, Set[str]]:
+    """(valeur, clés des lignes déjà vues à cette valeur) ; ancien format : valeur seule"""
+    if isinstance(entry, dict):
+        return entry.get("value"), set(entry.get("keys", []))
+    return entry, set()
+
+
+def _since_value(cursor, conn, column: str, since: datetime):
+    """Watermark équivalent à l'instant `since` (colonnes date_id : clé du premier jour de date_dim)"""
+    if column != "date_id":
+        return since.isoformat()
+    cursor.execute(f"SELECT MIN(date_id) FROM date_dim WHERE full_date >= {_placeholder(conn)}",
+                   (since.date().isoformat(),))
+    return _serialize(cursor.fetchone()[0])
+
+
+def detect_changes(conn, watermarks: Dict[str, object],
+                   since: Optional[datetime] = None) -> Tuple[Set, Dict[str, object]]:
+    """Dépôts ayant des lignes au-delà des watermarks, et nouveaux watermarks.
+    Comparaison `>=` : une ligne insérée plus tard avec l'horodatage du watermark n'est pas perdue,
+    les lignes déjà vues à cette valeur sont écartées par leur clé.
+    Sans watermark, la capture part de `since` (début d'extraction de la reconstruction complète) ;
+    à défaut, les watermarks sont seulement initialisés au maximum actuel."""
+    cursor = conn.cursor()
+    affected, updated = set(), dict(watermarks)
+    for table, column, repo_column, key_column in TRACKED_SOURCES:
+        key = f"{table}.{column}"
+        if key in watermarks:
+            value, seen = _watermark(watermarks[key])
+        else:
+            value, seen = _since_value(cursor, conn, column, since) if since else None, set()
+            if value is None:
+                cursor.execute(
+                    f"SELECT {column}, {key_column} FROM {table} "
+                    f"WHERE {column} = (SELECT MAX({column}) FROM {table})"
+                )
+                rows = cursor.fetchall()
+                updated[key] = {"value": _serialize(rows[0][0]) if rows else None,
+                                "keys": sorted({str(row_key) for _, row_key in rows})}
+                continue
+        if value is None:
+            cursor.execute(f"SELECT {repo_column}, {column}, {key_column} FROM {table}")
+        else:
+            cursor.execute(
+                f"SELECT {repo_column}, {column}, {key_column} FROM {table} WHERE {column} >= {_placeholder(conn)}",
+                (value,)
+            )
+        high, high_keys = value, set(seen)
+        for repo_id, row_value, row_key in cursor.fetchall():
+            row_value, row_key = _serialize(row_value), str(row_key)
+            if row_value == value and row_key in seen:
+                continue
+            affected.add(repo_id)
+            if high is None or row_value > high:
+                high, high_keys = row_value, set()
+            if row_value == high:
+                high_keys.add(row_key)
+        updated[key] = {"value": high, "keys": sorted(high_keys)}
+    cursor.close()
+    return affected, updated
+
+
+class ChangeCaptureIngester:
+    """Maintient une copie de l'index courant et y applique les recalculs par dépôt"""
+
+    def __init__(self, root: str = VECTOR_STORE_PATH):
+        self.root = root
+        self.embedding_service = EmbeddingService(api_key=os.getenv("GEMINI_API_KEY"))
+        self.embeddings = CustomEmbeddings(self.embedding_service)
+        self.store, self.version = None, None
+
+    def _ensure_store(self) -> None:
+        # Recharge si une reconstruction complète a publié une autre version entre-temps
+        if self.store is None or current_version(self.root) != self.version:
+            self.store, self.version = load_vector_store(self.root, self.embeddings)
+
+    def run_once(self, conn) -> Optional[str]:
+        """Un cycle de capture ; retourne la version publiée (None si aucun changement)"""
+        watermarks = load_watermarks(self.root)
+        since = None
+        if not watermarks and current_version(self.root) is not None:
+            since = read_extracted_at(version_path(self.root, current_version(self.root)))
+        try:
+            affected, updated = detect_changes(conn, watermarks, since)
+        finally:
+            conn.commit()  # Pas de transaction laissée ouverte entre deux cycles
+        if not affected:
+            save_watermarks(updated, self.root)
+            return None
+
+        self._ensure_store()
+        data = fetch_github_data(conn, repo_ids=sorted(affected))
+        repo_names = {row[1] for row in data["repositories"]}
+        documents = create_documents(data)
+        if DEDUP_ENABLED:
+            documents, _ = deduplicate_documents(documents, DEDUP_DOC_TYPES, DEDUP_THRESHOLD)
+
+        version = self.upsert(
+            repo_names, documents,
+            contributions=fetch_contributions(conn),
+            rollup_rows=fetch_rollup_rows(conn, repo_ids=sorted(affected))
+        )
+        save_watermarks(updated, self.root)
+        print(f"🔄 {len(affected)} dépôt(s) mis à jour, {len(documents)} documents -> version {version}")
+        return version
+
+    def upsert(self, repo_names: Set[str], documents: List, contributions: Optional[List] = None,
+               rollup_rows: Optional[List] = None) -> str:
+        """Remplace les documents des dépôts modifiés puis publie une nouvelle version.
+        Index shardé : seuls les shards touchés sont réécrits, les autres sont repris par liens physiques.
+        Le graphe dépôts / contributeurs est recalculé si `contributions` est fourni, sinon reconduit ;
+        les séries temporelles des dépôts modifiés sont remplacées par `rollup_rows`.
+        En cas d'échec, le store en mémoire (déjà modifié) est abandonné et rechargé au cycle suivant."""
+        try:
+            return self._upsert(repo_names, documents, contributions, rollup_rows)
+        except Exception:
+            self.store, self.version = None, None
+            raise
+
+    def _upsert(self, repo_names: Set[str], documents: List, contributions: Optional[List],
+                rollup_rows: Optional[List]) -> str:
+        texts = [doc.page_content for doc in documents]
+        vectors = embed_in_batches(self.embedding_service, texts)
+        metadatas = [doc.metadata for doc in documents]
+
+        version = new_version_id()
+        output_path = version_path(self.root, version)
+        previous_path = version_path(self.root, self.version)
+        if getattr(self.store, "shards", None) is None:
+            _upsert_store(self.store, repo_names, texts, vectors, metadatas, output_path, previous_path)
+        else:
+            self._upsert_shards(repo_names, texts, vectors, metadatas, output_path, previous_path)
+
+        previous_graph = os.path.join(previous_path, GRAPH_FILE)
+        if contributions is not None:
+            build_repo_graph(contributions, output_path)
+        elif os.path.exists(previous_graph):
+            shutil.copyfile(previous_graph, os.path.join(output_path, GRAPH_FILE))
+
+        if rollup_rows is not None:
+            build_rollups(rollup_rows, output_path, previous_path=previous_path, repo_names=sorted(repo_names))
+        elif os.path.exists(os.path.join(previous_path, ROLLUPS_FILE)):
+            shutil.copyfile(os.path.join(previous_path, ROLLUPS_FILE), os.path.join(output_path, ROLLUPS_FILE))
+
+        publish_version(self.root, version)
+        prune_versions(self.root, keep=KEEP_VERSIONS)
+        # Rechargement pour repartir d'un état identique à celui des workers
+        self.store, self.version = load_vector_store(self.root, self.embeddings, version)
+        return version
+
+    def _upsert_shards(self, repo_names: Set[str], texts: List[str], vectors: List, metadatas: List[Dict],
+                       output_path: str, previous_path: str) -> None:
+        store = self.store
+        groups = group_by_shard(metadatas, store.count, store.partition)
+        shard_ids = sorted(set(store.shard_ids) | set(groups))
+        names = {name.lower() for name in repo_names}
+        for shard_id in shard_ids:
+            shard, positions = store.shard(shard_id), groups.get(shard_id, [])
+            target = shard_path(output_path, shard_id)
+            subset = ([texts[i] for i in positions], [vectors[i] for i in positions],
+                      [metadatas[i] for i in positions])
+            if shard is None:
+                # Shard jusque-là vide : index plat, quantifié à la prochaine reconstruction
+                save_store(*subset, self.embeddings, target, "none", None)
+            elif positions or names & metadata_index_for(shard).repos.keys():
+                _upsert_store(shard, repo_names, *subset, target, shard_path(previous_path, shard_id))
+            else:
+                link_version(shard_path(previous_path, shard_id), target)
+        write_shard_layout(output_path, store.count, store.partition, shard_ids)
+
+
+def _narrow_repos(metadata: Dict, repos: List[str]) -> None:
+    if len(repos) > 1:
+        metadata["repos"] = repos
+    else:
+        metadata.pop("repos", None)
+    if metadata.get("repo") not in repos:
+        metadata["repo"] = repos[0]
+
+
+def _stale_ids(store, repo_names: Set[str]) -> List[int]:
+    """Ids des documents à remplacer. Un représentant de quasi-doublons (liste `repos`) partagé
+    avec des dépôts inchangés est conservé pour eux, sans les dépôts modifiés (recalculés à part)."""
+    names = {name.lower() for name in repo_names}
+    postings = metadata_index_for(store).repos
+    stale = []
+    for idx in sorted({int(idx) for name in names for idx in postings.get(name, [])}):
+        metadata = store.docstore.search(store.index_to_docstore_id[idx]).metadata
+        kept = [repo for repo in metadata.get("repos") or [] if str(repo).lower() not in names]
+        if kept:
+            _narrow_repos(metadata, kept)
+        else:
+            stale.append(idx)
+    return stale
+
+
+def _upsert_store(store, repo_names: Set[str], texts: List[str], vectors: List, metadatas: List[Dict],
+                  output_path: str, previous_path: str) -> None:
+    """Supprime les documents des dépôts modifiés, ajoute les nouveaux et sauvegarde dans `output_path`"""
+    stale = _stale_ids(store, repo_names)
+    full = full_precision_for(store)
+
+    if stale:
+        store.delete([store.index_to_docstore_id[idx] for idx in stale])
+    if texts:
+        store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+
+    store.save_local(output_path)
+    if full is not None:
+        # Index quantifié : le sidecar float32 suit les suppressions (compactage) et ajouts
+        full = np.delete(np.asarray(full), stale, axis=0)
+        if vectors:
+            full = np.vstack([full, np.asarray(vectors, dtype="float32")])
+        np.save(os.path.join(output_path, FULL_PRECISION_FILE), full)
+        previous = os.path.join(previous_path, QUANTIZATION_FILE)
+        if os.path.exists(previous):
+            with open(previous) as src, open(os.path.join(output_path, QUANTIZATION_FILE), "w") as dst:
+                dst.write(src.read())
+
+
+def listen(conn, channel: str, interval: float, on_change) -> None:
+    """Réveil sur NOTIFY `channel` (PostgreSQL), avec polling de secours toutes les `interval` s"""
+    import psycopg2.extensions
+
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+    cursor.execute(f"LISTEN {channel}")
+    while True:
+        if select.select([conn], [], [], interval) != ([], [], []):
+            conn.poll()
+            conn.notifies.clear()  # Plusieurs notifications -> un seul cycle
+        on_change()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture de changements vers le vector store")
+    parser.add_argument("--interval", type=float, default=60, help="Secondes entre deux cycles")
+    parser.add_argument("--listen", metavar="CHANNEL", help="Canal LISTEN/NOTIFY PostgreSQL")
+    parser.add_argument("--once", action="store_true", help="Un seul cycle puis sortie")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    ingester = ChangeCaptureIngester()
+
+    def cycle():
+        try:
+            ingester.run_once(conn)
+        except Exception as e:
+            print(f"❌ Cycle de capture en échec : {e}")
+
+    if args.once:
+        cycle()
+    elif args.listen:
+        listen(conn, args.listen, args.interval, cycle)
+    else:
+        while True:
+            cycle()
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,15 +20,117 @@ GEMINI_MODEL_NAME = "gemini-2.0-flash-lite"
 MAX_TOKENS = 4000  # Increased for better responses
 TEMPERATURE = 0.7
 TOP_P = 0.9
+# Génération JSON contrainte par schéma (response_schema Gemini)
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # Récupéré depuis .env pour sécurité
+EMBEDDING_MODEL_NAME = "models/embedding-001"
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")  # grpc (canal persistant) | rest
 
 # Chemins des données et vecteurs
-VECTOR_STORE_PATH = "app/vectors/github_vectors"  # Dossier pour les embeddings GitHub
+VECTOR_STORE_PATH = "app/vectors/github_vectors"  # Dossier pour les embeddings GitHub (versions/ + CURRENT)
+
+# Multi-organisation : un index par tenant (<TENANTS_PATH>/<tenant>/versions/...), chargé au premier usage.
+# Le tenant par défaut reste VECTOR_STORE_PATH, toujours chargé.
+DEFAULT_TENANT = "default"
+TENANTS_PATH = os.getenv("TENANTS_PATH", "app/vectors/tenants")
+TENANT_INDEXES = {
+    "memory_budget_mb": float(os.getenv("TENANT_MEMORY_BUDGET_MB", "4096")),  # Total des index chargés (LRU)
+    "idle_seconds": float(os.getenv("TENANT_IDLE_SECONDS", "1800")),  # Déchargement après inactivité
+    "preload": [t for t in os.getenv("TENANT_PRELOAD", "").split(",") if t],  # Tenants chauds, jamais inactifs
+}
+
+# Intervalle (secondes) de détection des nouvelles versions publiées (0 = désactivé)
+VECTOR_STORE_WATCH_INTERVAL = float(os.getenv("VECTOR_STORE_WATCH_INTERVAL", "30"))
+
+# Budget de démarrage d'un worker (import + lifespan), au-delà un avertissement est émis
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "10"))
+
+# Profilage à la demande (/analyze?profile=sampling|cprofile, jeton admin requis)
+PROFILE_SAMPLE_INTERVAL = 0.005  # Secondes entre deux échantillons de piles
+PROFILE_HISTORY = 20             # Profils conservés en mémoire par worker
+PROFILE_TOP_N = 25               # Fonctions / allocations rapportées
+
+# Réponses pré-calculées des questions fréquentes, régénérées à chaque nouvelle version de l'index
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "app/vectors/query_log.jsonl")
+ANSWER_WARMUP = {
+    "enabled": os.getenv("ANSWER_WARMUP", "true").lower() == "true",
+    "top_n": 200,        # Questions normalisées retenues
+    "min_count": 3,      # Occurrences minimales sur la période
+    "log_days": 7,       # Période du journal analysée
+    "per_minute": 30,    # Générations Gemini par minute pendant le warm-up
+}
+
+# Index quantifiés : nombre de candidats re-classés en float32 (k * facteur)
+VECTOR_RESCORE_FACTOR = 4
+
+# Index shardé : threads de recherche scatter-gather (partagés entre versions)
+VECTOR_SHARD_SEARCH_THREADS = int(os.getenv("VECTOR_SHARD_SEARCH_THREADS", "8"))
+
+# Export des lignes brutes (/export/{dataset}) : lecture par lots via curseur serveur, mémoire constante
+EXPORT = {
+    "batch_rows": int(os.getenv("EXPORT_BATCH_ROWS", "50000")),  # Lignes par lot (= row group Parquet)
+    "snapshot_path": os.getenv("EXPORT_SNAPSHOT_PATH"),  # Instantané SQLite local (lignes brutes seulement)
+}
+
+# Canal WebSocket du chat (/ws/chat) : une connexion par session
+CHAT_CHANNEL = {
+    "max_in_flight": int(os.getenv("CHAT_MAX_IN_FLIGHT", "4")),  # Questions traitées en parallèle par connexion
+    "live_charts": 8,     # Graphiques exacts suivis par connexion, rafraîchis à chaque nouvelle version
+    "send_queue": 256,    # Messages en attente d'envoi avant de fermer une connexion trop lente
+}
+
+# Jeton des endpoints d'administration (désactivés si absent)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 
 # Version API et limites
 API_VERSION = "1.0.0"
-RATE_LIMIT = 100  # Limite max de requêtes par minute (exemple)
+RATE_LIMIT = int(os.getenv("RATE_LIMIT", "100"))  # Limite max de requêtes par minute et par client
+GLOBAL_RATE_LIMIT = int(os.getenv("GLOBAL_RATE_LIMIT", "600"))  # Limite globale du worker (requêtes/minute)
+# Adresses des reverse proxies dont l'en-tête X-Client-ID est pris en compte (sinon : adresse du pair)
+TRUSTED_PROXIES = {p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()}
+
+# Concurrence adaptative (AIMD) des appels Gemini
+GEMINI_CONCURRENCY = {
+    "initial": int(os.getenv("GEMINI_CONCURRENCY", "8")),
+    "min": 1,
+    "max": int(os.getenv("GEMINI_MAX_CONCURRENCY", "32")),
+    "acquire_timeout": 5.0,  # Secondes d'attente max avant un 429 immédiat
+    "max_waiting": 64  # Appels en file au-delà desquels on refuse directement
+}
+RETRY_BACKOFF = {"base": 0.5, "cap": 8.0}  # Backoff exponentiel avec jitter (secondes)
+
+# Délais max (secondes) des étapes du pipeline /analyze avant repli
+STAGE_TIMEOUTS = {
+    "classification": 4.0,  # Repli : type "unknown"
+    "embedding": 5.0,       # Repli : pas de contexte vectoriel
+    "retrieval": 2.0        # Repli : pas de contexte vectoriel
+}
+
+# Analyse groupée (/analyze/batch)
+BATCH_MAX_SIZE = 25  # Nombre max de requêtes par lot
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "4"))  # Générations Gemini simultanées
+
+# Décomposition des comparaisons (COMPARE, TREND multi-dépôts) : une sous-recherche par entité
+DECOMPOSITION = {
+    "max_entities": 5,  # Entités comparées retenues
+    "max_docs": 6,      # Documents de contexte au total, répartis par quota entre entités
+}
+
+# Préchargement spéculatif du contexte des questions de suivi (dépôts du dernier tour)
+PREFETCH = {
+    "enabled": os.getenv("PREFETCH_ENABLED", "true").lower() == "true",
+    "max_repos": 3,        # Dépôts du dernier tour préchargés
+    "max_concurrent": int(os.getenv("PREFETCH_MAX_CONCURRENT", "2")),  # Préchargements simultanés du worker
+    "ttl_seconds": 600,    # Contexte préchargé valable pendant la lecture de la réponse
+    "k": 5,                # Documents par sonde et par dépôt
+    # Sondes indépendantes de la classification : suites habituelles d'une question sur un dépôt
+    "probes": [
+        "{repo} monthly commits trend and activity",
+        "{repo} code quality, KPI status and risks",
+        "{repo} developers, pull requests and review performance",
+    ],
+}
 
 # Prompt système pour guider la génération Gemini
 SYSTEM_PROMPT = """Vous êtes un expert en analyse de données GitHub. Répondez toujours avec du JSON VALIDE :
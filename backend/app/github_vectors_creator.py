@@ -1,37 +1,107 @@
 import os
-from typing import List
+import json
+import shutil
+import argparse
+import multiprocessing
+import numpy as np
+import faiss
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import psycopg2
 from dotenv import load_dotenv
 from datetime import datetime
-import google.generativeai as genai
+from app.services.gemini_client import get_gemini_client
+from app.utils.dedup import deduplicate_documents
+from app.utils.document_renderer import (
+    CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, SECTIONS, render_section, render_chunk, reintern, split_rows
+)
+from app.services.sharded_store import shard_for
+from app.services.tenant_indexes import tenant_root
+from app.services.vector_store_manager import (
+    new_version_id, version_path, publish_version, prune_versions, current_version,
+    read_shard_layout, write_shard_layout, shard_path, write_extracted_at,
+    FULL_PRECISION_FILE, QUANTIZATION_FILE, SHARDS_DIR, SHARDS_FILE
+)
 
 # Charger les variables d'environnement (.env)
 load_dotenv()
 
 VECTOR_STORE_PATH = "app/vectors/github_vectors"
+KEEP_VERSIONS = int(os.getenv("VECTOR_STORE_KEEP_VERSIONS", "3"))  # Versions conservées sur disque
+EMBED_BATCH_SIZE = 100  # Textes par requête d'embedding
+
+# Stockage compressé des vecteurs : none | float16 | int8 | pq (+ réduction PCA optionnelle)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_PCA_DIM = int(os.getenv("VECTOR_PCA_DIM", "0")) or None
+QUANTIZATION_SPECS = {"float16": "SQfp16", "int8": "SQ8"}
+PQ_MIN_TRAINING_VECTORS = 256 * 39  # En dessous, k-means PQ est mal entraîné
+
+# Index shardé : nombre de shards (1 = index unique) et clé de partition (repo | type)
+VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", "1"))
+VECTOR_SHARD_BY = os.getenv("VECTOR_SHARD_BY", "repo")
+
+# Élimination des quasi-doublons (MinHash) avant embedding
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_DOC_TYPES = os.getenv("DEDUP_DOC_TYPES", "issue").split(",")  # Pas les tendances / KPI chiffrés
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # Similarité de Jaccard estimée
+
+# Rendu des documents : processus du pool (1 = processus courant) et lignes minimales par lot
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", str(os.cpu_count() or 1)))
+DOCUMENT_CHUNK_ROWS = int(os.getenv("DOCUMENT_CHUNK_ROWS", "50000"))
+
+# Graphe dépôts / contributeurs (graphiques repo_network et contrib_matrix)
+REPO_GRAPH_TOP_K = 20  # Voisins pré-calculés par dépôt
+
+# Séries temporelles agrégées : métrique -> (table, colonne horodatée)
+ROLLUP_SOURCES = {
+    "commits": ("commit_dim", "commit_timestamp"),
+    "pull_requests": ("pull_request_dim", "created_at"),
+    "issues": ("issue_dim", "created_at"),
+    "builds": ("ci_build", os.getenv("CI_BUILD_TIMESTAMP_COLUMN", "started_at")),
+}
 os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
 
 # Service de génération d'embeddings (mock pour Gemini)
 class EmbeddingService:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        genai.configure(api_key=api_key)
+        # Client partagé : le SDK n'est configuré qu'une fois par processus
+        self.client = get_gemini_client()
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        return [
-            genai.embed_content(
-                model="models/embedding-001",
-                content=t,
-                task_type="retrieval_document"  # ou "retrieval_query" selon le cas
-            )["embedding"]
-            for t in texts
-        ]
+        # Une seule requête pour tout le lot
+        return self.client.embed(texts, task_type="retrieval_document")  # ou "retrieval_query" selon le cas
+
+class CustomEmbeddings:
+    """Interface embeddings attendue par le vector store LangChain"""
+    def __init__(self, embedding_service: EmbeddingService):
+        self.embedding_service = embedding_service
+
+    def embed_documents(self, texts):
+        return self.embedding_service.embed_texts(texts)
+
+    def embed_query(self, text):
+        return self.embedding_service.embed_texts([text])[0]
+
+
+def embed_in_batches(embedding_service: EmbeddingService, texts: List[str],
+                     progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+    vectors = []
+    if progress_callback:
+        progress_callback(0, len(texts))
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(embedding_service.embed_texts(texts[start:start + EMBED_BATCH_SIZE]))
+        if progress_callback:
+            progress_callback(len(vectors), len(texts))
+    return vectors
 
 # Connexion PostgreSQL
 def get_db_connection():
+    import psycopg2
+
     return psycopg2.connect(
         dbname=os.getenv("POSTGRES_DB"),
         user=os.getenv("POSTGRES_USER"),
@@ -39,13 +109,15 @@ def get_db_connection():
         host=os.getenv("POSTGRES_HOST")
     )
 
-# Extraction des données GitHub de la base
-def fetch_github_data():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _placeholder(conn) -> str:
+    # psycopg2 : %s ; sqlite3 (tests de la capture de changements) : ?
+    return "?" if type(conn).__module__ == "sqlite3" else "%s"
+
 
+# Requêtes d'extraction de l'entrepôt (alias r = repo_dim, filtre optionnel {repo_filter})
+WAREHOUSE_QUERIES = {
     # 1. Données repositories enrichies avec KPIs
-    cursor.execute("""
+    "repositories": """
         SELECT r.repo_id, r.name, r.language, r.url,
                COUNT(DISTINCT c.commit_id) as commit_count,
                AVG(k.pr_merge_time_avg) as avg_merge_time,
@@ -59,12 +131,11 @@ def fetch_github_data():
         LEFT JOIN kpi_result k ON r.repo_id = k.repo_id
         LEFT JOIN code_quality cq ON r.repo_id = cq.repo_id
         LEFT JOIN ci_build cb ON r.repo_id = cb.repo_id
+        WHERE TRUE {repo_filter}
         GROUP BY r.repo_id, r.name, r.language, r.url
-    """)
-    repos = cursor.fetchall()
-
+    """,
     # 2. Données d'activité par développeur
-    cursor.execute("""
+    "developers": """
         SELECT u.user_id, u.login, u.name, r.name as repo_name,
                COUNT(DISTINCT c.commit_id) as commits,
                COUNT(DISTINCT pr.pull_request_id) as pull_requests,
@@ -75,37 +146,33 @@ def fetch_github_data():
         LEFT JOIN pull_request_dim pr ON u.user_id = pr.author_id
         LEFT JOIN issue_dim i ON u.user_id = i.author_id
         LEFT JOIN repo_dim r ON c.repo_id = r.repo_id OR pr.repo_id = r.repo_id
-        WHERE c.commit_timestamp >= CURRENT_DATE - INTERVAL '3 months'
+        WHERE c.commit_timestamp >= CURRENT_DATE - INTERVAL '3 months' {repo_filter}
         GROUP BY u.user_id, u.login, u.name, r.name
         HAVING COUNT(DISTINCT c.commit_id) > 0
-    """)
-    developers = cursor.fetchall()
-
+    """,
     # 3. Tendances temporelles (derniers 6 mois)
-    cursor.execute("""
+    "trends": """
         SELECT r.name as repo_name,
                DATE_TRUNC('month', c.commit_timestamp) as month,
                COUNT(c.commit_id) as monthly_commits,
                COUNT(DISTINCT c.author_id) as active_developers
         FROM repo_dim r
         JOIN commit_dim c ON r.repo_id = c.repo_id
-        WHERE c.commit_timestamp >= CURRENT_DATE - INTERVAL '6 months'
+        WHERE c.commit_timestamp >= CURRENT_DATE - INTERVAL '6 months' {repo_filter}
         GROUP BY r.name, DATE_TRUNC('month', c.commit_timestamp)
         ORDER BY month DESC
-    """)
-    trends = cursor.fetchall()
-      # Issues
-    cursor.execute("""
+    """,
+    # Issues (échantillon)
+    "issues": """
         SELECT i.issue_id, i.title, r.name as repo_name,
                array_to_string(i.labels, ', ') as labels
         FROM issue_dim i
         JOIN repo_dim r ON i.repo_id = r.repo_id
+        WHERE TRUE {repo_filter}
         LIMIT 1000
-    """)
-    issues = cursor.fetchall()
-    
+    """,
     # 4. Analyse qualité de code
-    cursor.execute("""
+    "quality_metrics": """
         SELECT r.name as repo_name,
                AVG(cq.bugs) as avg_bugs,
                AVG(cq.vulnerabilities) as avg_vulnerabilities,
@@ -114,12 +181,11 @@ def fetch_github_data():
         FROM repo_dim r
         JOIN code_quality cq ON r.repo_id = cq.repo_id
         WHERE cq.date_id >= (SELECT date_id FROM date_dim WHERE full_date >= CURRENT_DATE - INTERVAL '1 month' LIMIT 1)
+              {repo_filter}
         GROUP BY r.name
-    """)
-    quality_metrics = cursor.fetchall()
-
+    """,
     # 5. KPIs critiques avec seuils
-    cursor.execute("""
+    "kpi_status": """
         SELECT r.name as repo_name,
                k.pr_merge_time_avg,
                k.reopened_issues,
@@ -136,12 +202,40 @@ def fetch_github_data():
                END as reopened_status
         FROM repo_dim r
         JOIN kpi_result k ON r.repo_id = k.repo_id
-        WHERE k.date_id = (SELECT MAX(date_id) FROM kpi_result)
-    """)
-    kpi_status = cursor.fetchall()
+        WHERE k.date_id = (SELECT MAX(date_id) FROM kpi_result) {repo_filter}
+    """,
+}
+
+
+def _fetch(cursor, name: str, repo_filter: str, params: tuple) -> List:
+    cursor.execute(WAREHOUSE_QUERIES[name].format(repo_filter=repo_filter), params)
+    return cursor.fetchall()
+
+
+# Extraction des données GitHub de la base
+def fetch_github_data(conn=None, repo_ids: Optional[List] = None):
+    """Extraction complète, ou limitée à `repo_ids` (mise à jour incrémentale)"""
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Filtre optionnel sur les dépôts (alias r = repo_dim dans toutes les requêtes)
+    repo_filter, params = "", ()
+    if repo_ids:
+        repo_filter = f"AND r.repo_id IN ({', '.join([_placeholder(conn)] * len(repo_ids))})"
+        params = tuple(repo_ids)
+
+    repos = _fetch(cursor, "repositories", repo_filter, params)
+    developers = _fetch(cursor, "developers", repo_filter, params)
+    trends = _fetch(cursor, "trends", repo_filter, params)
+    issues = _fetch(cursor, "issues", repo_filter, params)
+    quality_metrics = _fetch(cursor, "quality_metrics", repo_filter, params)
+    kpi_status = _fetch(cursor, "kpi_status", repo_filter, params)
 
     cursor.close()
-    conn.close()
+    if owns_connection:
+        conn.close()
 
     return {
         "repositories": repos,
@@ -152,158 +246,330 @@ def fetch_github_data():
         "kpi_status": kpi_status
     }
 
+def fetch_contributions(conn=None):
+    """Contributions (dépôt, login, commits, pull requests) pour le graphe dépôts / contributeurs"""
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.name, u.login, SUM(x.commits), SUM(x.pull_requests)
+        FROM (
+            SELECT repo_id, author_id, COUNT(*) AS commits, 0 AS pull_requests
+            FROM commit_dim GROUP BY repo_id, author_id
+            UNION ALL
+            SELECT repo_id, author_id, 0 AS commits, COUNT(*) AS pull_requests
+            FROM pull_request_dim GROUP BY repo_id, author_id
+        ) x
+        JOIN repo_dim r ON r.repo_id = x.repo_id
+        JOIN user_dim u ON u.user_id = x.author_id
+        GROUP BY r.name, u.login
+    """)
+    rows = cursor.fetchall()
+    cursor.close()
+    if owns_connection:
+        conn.close()
+    return rows
+
+
+def build_repo_graph(contributions, output_path: str) -> None:
+    """Graphe dépôts / contributeurs sauvegardé avec la version de l'index"""
+    from app.services.repo_graph import RepoGraph
+
+    graph = RepoGraph.build(contributions, top_k=REPO_GRAPH_TOP_K)
+    os.makedirs(output_path, exist_ok=True)
+    graph.save(output_path)
+    print(f"🕸️ Graphe : {len(graph.repos)} dépôts, {len(graph.contributors)} contributeurs, "
+          f"{graph.matrix.nnz} contributions")
+
+def fetch_rollup_rows(conn=None, repo_ids: Optional[List] = None):
+    """Comptes journaliers (dépôt, jour, métrique, compte) de chaque source de ROLLUP_SOURCES"""
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    repo_filter, params = "", ()
+    if repo_ids:
+        repo_filter = f"AND r.repo_id IN ({', '.join([_placeholder(conn)] * len(repo_ids))})"
+        params = tuple(repo_ids)
+
+    rows = []
+    for metric, (table, column) in ROLLUP_SOURCES.items():
+        cursor.execute(f"""
+            SELECT r.name, DATE(t.{column}) AS day, COUNT(*)
+            FROM {table} t
+            JOIN repo_dim r ON r.repo_id = t.repo_id
+            WHERE t.{column} IS NOT NULL {repo_filter}
+            GROUP BY r.name, DATE(t.{column})
+        """, params)
+        rows.extend((repo, day, metric, count) for repo, day, count in cursor.fetchall())
+    cursor.close()
+    if owns_connection:
+        conn.close()
+    return rows
+
+
+def build_rollups(rows, output_path: str, previous_path: Optional[str] = None,
+                  repo_names: Optional[List[str]] = None) -> None:
+    """Séries jour / semaine / mois sauvegardées avec la version de l'index.
+    Avec `previous_path`, seules les séries de `repo_names` sont recalculées."""
+    from app.services.rollups import RollupStore
+    from app.services.vector_store_manager import ROLLUPS_FILE
+
+    rollups = RollupStore.build(rows)
+    if previous_path and os.path.exists(os.path.join(previous_path, ROLLUPS_FILE)):
+        rollups = RollupStore.load(previous_path).replace_repos(repo_names or [], rollups)
+    os.makedirs(output_path, exist_ok=True)
+    rollups.save(output_path)
+    print(f"📈 Séries temporelles : {len(rollups.repos)} dépôts, {len(rollups.arrays['day'][1])} jours-dépôts")
+
 # Création des documents avec métadonnées enrichies
-def create_documents(data):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=['\n\n', '```', '## ']
-    )
-    documents = []
+def _text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+
+
+def create_documents(data, workers: int = DOCUMENT_WORKERS) -> List[Document]:
+    """Documents indexés, rendus en colonnes par app.utils.document_renderer.
+    Au-delà de DOCUMENT_CHUNK_ROWS lignes, les lots sont rendus dans un pool de processus
+    (spawn : le créateur tourne aussi dans un thread de l'API). Seuls les textes plus longs
+    que CHUNK_SIZE passent par le text splitter."""
     timestamp = datetime.utcnow().isoformat()
+    tasks = [
+        (section, rows, timestamp)
+        for section in SECTIONS
+        for rows in split_rows(data[section], workers, DOCUMENT_CHUNK_ROWS)
+    ]
+    cache = {}  # Valeurs de métadonnées partagées entre documents
+    if workers > 1 and sum(len(rows) for _, rows, _ in tasks) > DOCUMENT_CHUNK_ROWS:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+            parts = list(pool.map(render_chunk, tasks))
+        for part in parts:
+            reintern(part, cache)
+    else:
+        parts = [render_section(section, rows, timestamp, cache) for section, rows, _ in tasks]
+
+    documents, text_splitter = [], None
+    for part in parts:
+        for content, metadata, split in part:
+            if not split:
+                documents.append(Document(page_content=content, metadata=metadata))
+                continue
+            text_splitter = text_splitter or _text_splitter()
+            documents.extend(
+                Document(page_content=chunk, metadata={**metadata, "chunk_id": i})
+                for i, chunk in enumerate(text_splitter.split_text(content))
+            )
+    return documents
+
+
+def quantization_spec(dim: int, quantization: str, pca_dim: Optional[int] = None) -> str:
+    """Chaîne index_factory FAISS pour un mode de quantification"""
+    out_dim = pca_dim or dim
+    if quantization == "pq":
+        # 8 dimensions par sous-quantificateur, 1 octet chacun
+        spec = f"PQ{max(1, out_dim // 8)}"
+    else:
+        spec = QUANTIZATION_SPECS[quantization]
+    return f"PCA{pca_dim},{spec}" if pca_dim else spec
+
+
+def build_quantized_index(vectors: np.ndarray, quantization: str, pca_dim: Optional[int] = None,
+                          metric: int = faiss.METRIC_L2):
+    """Index FAISS compressé entraîné sur les vecteurs pleine précision"""
+    if quantization == "pq" and len(vectors) < PQ_MIN_TRAINING_VECTORS:
+        print(f"⚠️ {len(vectors)} vecteurs : trop peu pour PQ, repli sur int8")
+        quantization = "int8"
+    index = faiss.index_factory(vectors.shape[1], quantization_spec(vectors.shape[1], quantization, pca_dim), metric)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def quantize_vector_store(db, output_path: str, quantization: str, pca_dim: Optional[int] = None) -> None:
+    """Remplace l'index plat float32 par un index compressé. Les vecteurs pleine
+    précision sont conservés à part (memmap partagé) pour le re-scoring des candidats."""
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    os.makedirs(output_path, exist_ok=True)
+    np.save(os.path.join(output_path, FULL_PRECISION_FILE), vectors)
+    db.index = build_quantized_index(vectors, quantization, pca_dim, db.index.metric_type)
+    with open(os.path.join(output_path, QUANTIZATION_FILE), "w") as f:
+        json.dump({
+            "quantization": quantization,
+            "pca_dim": pca_dim,
+            "spec": quantization_spec(vectors.shape[1], quantization, pca_dim),
+            "dim": int(vectors.shape[1]),
+            "count": int(vectors.shape[0])
+        }, f)
+
+def group_by_shard(metadatas: List[Dict], count: int, partition: str) -> Dict[int, List[int]]:
+    """Positions des documents de chaque shard non vide"""
+    groups = defaultdict(list)
+    for i, metadata in enumerate(metadatas):
+        groups[shard_for(metadata, count, partition)].append(i)
+    return dict(groups)
+
+
+def save_store(texts: List[str], vectors, metadatas: List[Dict], embeddings, output_path: str,
+               quantization: str, pca_dim: Optional[int]) -> None:
+    """Construit un index FAISS (quantifié ou non) et le sauvegarde dans `output_path`"""
+    db = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+    if quantization != "none":
+        quantize_vector_store(db, output_path, quantization, pca_dim)
+    db.save_local(output_path)
 
-    for repo in data["repositories"]:
-        (repo_id, name, language, url, commit_count, avg_merge_time,
- avg_reopened_issues, avg_review_delay, code_coverage,
- total_builds, build_success_rate) = repo
-
-        content = f"""Repository: {name}
-Language: {language}
-URL: {url}
-Total Commits: {commit_count}
-Average Merge Time: {avg_merge_time:.2f} hours
-Average Reopened Issues: {avg_reopened_issues:.2f}
-Average Review Delay: {avg_review_delay:.2f} hours
-Code Coverage: {code_coverage:.2f}%
-Total CI Builds: {total_builds}
-Build Success Rate: {build_success_rate:.2f}%
-"""
-
-        docs = text_splitter.split_text(content)
-        for i, chunk in enumerate(docs):
-            documents.append(Document(
-                page_content=chunk,
-                metadata={
-                    "type": "repository",
-                    "repo_id": str(repo_id),
-                    "language": language,
-                    "chunk_id": i,
-                    "timestamp": timestamp
-                }
-            ))
-
-    # Documents pour développeurs
-    for dev in data["developers"]:
-        user_id, login, name, repo_name, commits, prs, issues, avg_pr_duration = dev
-        content = f"""Developer: {login} ({name})
-                Repository: {repo_name}
-                Commits (3 months): {commits}
-                Pull Requests: {prs}
-                Issues Created: {issues}
-                Average PR Duration: {avg_pr_duration:.2f} hours
-                Performance Level: {'High' if commits > 50 else 'Medium' if commits > 20 else 'Low'}
-                    """
-        docs = text_splitter.split_text(content)
-        for i, chunk in enumerate(docs):
-            documents.append(Document(
-                page_content=chunk,
-                metadata={
-                    "type": "developer",
-                    "user_id": str(user_id),
-                    "login": login,
-                    "repo": repo_name,
-                    "performance_level": "high" if commits > 50 else "medium" if commits > 20 else "low",
-                    "chunk_id": i,
-                    "timestamp": timestamp
-                }
-            ))
-
-    # Documents pour tendances
-    for trend in data["trends"]:
-        repo_name, month, monthly_commits, active_devs = trend
-        content = f"""Monthly Trend: {repo_name}
-                    Month: {month.strftime('%Y-%m')}
-                    Commits: {monthly_commits}
-                    Active Developers: {active_devs}
-                    Activity Level: {'High' if monthly_commits > 100 else 'Medium' if monthly_commits > 50 else 'Low'}
-                        """
-        documents.append(Document(
-            page_content=content,
-            metadata={
-                "type": "trend",
-                "repo": repo_name,
-                "month": month.strftime('%Y-%m'),
-                "activity_level": "high" if monthly_commits > 100 else "medium",
-                "timestamp": timestamp
-            }
-        ))
-
-    # Documents pour KPIs critiques
-    for kpi in data["kpi_status"]:
-        repo_name, merge_time, reopened, review_delay, merge_status, reopened_status = kpi
-        content = f"""KPI Status: {repo_name}
-                        Average Merge Time: {merge_time} hours ({merge_status})
-                        Reopened Issues: {reopened} ({reopened_status})
-                        Review Delay: {review_delay} hours
-                        Overall Health: {'Critical' if 'CRITICAL' in [merge_status, reopened_status] else 'Warning' if 'WARNING' in [merge_status, reopened_status] else 'Good'}
-                        """
-        documents.append(Document(
-            page_content=content,
-            metadata={
-                "type": "kpi_status",
-                "repo": repo_name,
-                "health_level": "critical" if "CRITICAL" in [merge_status, reopened_status] else "warning",
-                "merge_time_status": merge_status.lower(),
-                "reopened_status": reopened_status.lower(),
-                "timestamp": timestamp
-            }
-        ))
-    for issue in data["issues"]:
-        issue_id, title, repo_name, labels = issue
-        content = f"""Issue: {title}
-                    Repository: {repo_name}
-                    Labels: {labels}
-                    """
-        docs = text_splitter.split_text(content)
-        for i, chunk in enumerate(docs):
-            documents.append(Document(
-                page_content=chunk,
-                metadata={
-                    "type": "issue",
-                    "issue_id": str(issue_id),
-                    "repo": repo_name,
-                    "labels": labels,
-                    "chunk_id": i,
-                    "timestamp": timestamp
-                }
-            ))
 
+def save_sharded_store(texts: List[str], vectors, metadatas: List[Dict], embeddings, output_path: str,
+                       quantization: str, pca_dim: Optional[int], count: int, partition: str) -> List[int]:
+    """Un index indépendant par shard non vide (shards/<id>/) ; retourne les ids des shards écrits"""
+    groups = group_by_shard(metadatas, count, partition)
+    for shard_id, positions in sorted(groups.items()):
+        save_store([texts[i] for i in positions], [vectors[i] for i in positions],
+                   [metadatas[i] for i in positions], embeddings, shard_path(output_path, shard_id),
+                   quantization, pca_dim)
+        print(f"   shard {shard_id} : {len(positions)} documents")
+    return sorted(groups)
+
+
+def prepare_documents(github_data, dedup: bool = DEDUP_ENABLED) -> List[Document]:
+    print("✂️ Découpage des documents...")
+    documents = create_documents(github_data)
+
+    if dedup:
+        print("🧹 Élimination des quasi-doublons...")
+        total = len(documents)
+        documents, removed = deduplicate_documents(documents, DEDUP_DOC_TYPES, DEDUP_THRESHOLD)
+        details = ", ".join(f"{doc_type}: {count}" for doc_type, count in removed.items())
+        print(f"   {total - len(documents)}/{total} documents supprimés ({details or 'aucun'})")
     return documents
 
+
 # Générer et sauvegarder les vecteurs
-def generate_vector_store():
+def generate_vector_store(progress_callback: Optional[Callable[[int, int], None]] = None,
+                          quantization: str = VECTOR_QUANTIZATION,
+                          pca_dim: Optional[int] = VECTOR_PCA_DIM,
+                          dedup: bool = DEDUP_ENABLED,
+                          shards: int = VECTOR_SHARDS,
+                          shard_by: str = VECTOR_SHARD_BY,
+                          root: str = VECTOR_STORE_PATH):
+    """Construit et publie une nouvelle version de l'index.
+    `progress_callback(documents_embarqués, total)` est appelé après chaque lot d'embeddings.
+    `quantization` : none | float16 | int8 | pq, avec réduction PCA optionnelle (`pca_dim`).
+    `dedup` : regroupe les quasi-doublons (issues) en un seul document.
+    `shards` > 1 : un index par shard, documents répartis par hachage de `shard_by` (repo | type).
+    `root` : dossier versionné cible (celui d'un tenant, VECTOR_STORE_PATH par défaut)."""
     print("🔄 Extraction des données depuis PostgreSQL...")
-    github_data = fetch_github_data()
+    # Point de départ de la capture de changements : les lignes écrites pendant la construction seront reprises
+    extracted_at = datetime.utcnow()
+    conn = get_db_connection()
+    try:
+        github_data = fetch_github_data(conn)
+        contributions = fetch_contributions(conn)
+        rollup_rows = fetch_rollup_rows(conn)
+    finally:
+        conn.close()
 
-    print("✂️ Découpage des documents...")
-    documents = create_documents(github_data)
+    documents = prepare_documents(github_data, dedup)
 
     print("🧠 Génération des embeddings...")
     embedding_service = EmbeddingService(api_key=os.getenv("GEMINI_API_KEY"))
+    embeddings = CustomEmbeddings(embedding_service)
+
+    texts = [doc.page_content for doc in documents]
+    vectors = embed_in_batches(embedding_service, texts, progress_callback)
+    metadatas = [doc.metadata for doc in documents]
+
+    # Nouvelle version dans son propre dossier, publiée seulement une fois complète
+    os.makedirs(root, exist_ok=True)
+    version = new_version_id()
+    output_path = version_path(root, version)
+    if quantization != "none":
+        print(f"🗜️ Quantification des vecteurs ({quantization}{f', PCA {pca_dim}' if pca_dim else ''})...")
+    if shards > 1:
+        print(f"🧩 Répartition en {shards} shards (clé : {shard_by})...")
+        shard_ids = save_sharded_store(texts, vectors, metadatas, embeddings, output_path,
+                                       quantization, pca_dim, shards, shard_by)
+        write_shard_layout(output_path, shards, shard_by, shard_ids)  # En dernier : version complète
+    else:
+        save_store(texts, vectors, metadatas, embeddings, output_path, quantization, pca_dim)
+    build_repo_graph(contributions, output_path)
+    build_rollups(rollup_rows, output_path)
+    write_extracted_at(output_path, extracted_at)
+    publish_version(root, version)
+    prune_versions(root, keep=KEEP_VERSIONS)
+    print(f"✅ Vector store sauvegardé dans {output_path}/ (version {version})")
+    return version
 
-    class CustomEmbeddings:
-        def embed_documents(self, texts):
-            return embedding_service.embed_texts(texts)
 
-        def embed_query(self, text):
-            return embedding_service.embed_texts([text])[0]
+def link_version(source: str, target: str, skip_shard: Optional[int] = None) -> None:
+    """Copie une version par liens physiques (aucun octet dupliqué), sans le shard `skip_shard`"""
+    skipped = os.path.join(SHARDS_DIR, str(skip_shard)) if skip_shard is not None else None
+    shutil.copytree(
+        source, target, copy_function=os.link,
+        ignore=lambda directory, names: [
+            name for name in names
+            if os.path.relpath(os.path.join(directory, name), source) == skipped
+        ]
+    )
+
 
-    embeddings = CustomEmbeddings()
+def rebuild_shard(shard_id: int, quantization: str = VECTOR_QUANTIZATION,
+                  pca_dim: Optional[int] = VECTOR_PCA_DIM, dedup: bool = DEDUP_ENABLED,
+                  root: str = VECTOR_STORE_PATH):
+    """Reconstruit un seul shard de la version courante : seuls ses documents sont ré-embarqués,
+    les autres shards, le graphe et les séries sont repris par liens physiques."""
+    current = current_version(root)
+    layout = read_shard_layout(version_path(root, current)) if current else None
+    if layout is None:
+        raise SystemExit("La version courante n'est pas shardée")
+    if not 0 <= shard_id < layout["count"]:
+        raise SystemExit(f"Shard {shard_id} hors de [0, {layout['count']})")
+
+    print("🔄 Extraction des données depuis PostgreSQL...")
+    conn = get_db_connection()
+    try:
+        github_data = fetch_github_data(conn)
+    finally:
+        conn.close()
+
+    documents = prepare_documents(github_data, dedup)
+    documents = [doc for doc in documents
+                 if shard_for(doc.metadata, layout["count"], layout["partition"]) == shard_id]
+
+    print(f"🧠 Génération des embeddings du shard {shard_id} ({len(documents)} documents)...")
+    embedding_service = EmbeddingService(api_key=os.getenv("GEMINI_API_KEY"))
+    embeddings = CustomEmbeddings(embedding_service)
+    texts = [doc.page_content for doc in documents]
+    vectors = embed_in_batches(embedding_service, texts)
+
+    version = new_version_id()
+    output_path = version_path(root, version)
+    link_version(version_path(root, current), output_path, skip_shard=shard_id)
+    os.remove(os.path.join(output_path, SHARDS_FILE))  # Réécrit en dernier
+    shard_ids = [i for i in layout["shards"] if i != shard_id]
+    if documents:
+        save_store(texts, vectors, [doc.metadata for doc in documents], embeddings,
+                   shard_path(output_path, shard_id), quantization, pca_dim)
+        shard_ids.append(shard_id)
+    write_shard_layout(output_path, layout["count"], layout["partition"], shard_ids)
+    publish_version(root, version)
+    prune_versions(root, keep=KEEP_VERSIONS)
+    print(f"✅ Shard {shard_id} reconstruit -> version {version}")
+    return version
 
-    db = FAISS.from_documents(documents, embeddings)
-    db.save_local(VECTOR_STORE_PATH)
-    print(f"✅ Vector store sauvegardé dans {VECTOR_STORE_PATH}/")
 
 # Point d’entrée du script
 if __name__ == "__main__":
-    generate_vector_store()
+    parser = argparse.ArgumentParser(description="Construction du vector store GitHub")
+    parser.add_argument("--shards", type=int, default=VECTOR_SHARDS, help="Nombre de shards (1 = index unique)")
+    parser.add_argument("--shard-by", choices=("repo", "type"), default=VECTOR_SHARD_BY)
+    parser.add_argument("--rebuild-shard", type=int, metavar="N",
+                        help="Reconstruit uniquement le shard N de la version courante")
+    parser.add_argument("--tenant", help="Organisation cible (index sous TENANTS_PATH/<tenant>)")
+    args = parser.parse_args()
+
+    root = tenant_root(args.tenant)
+    if args.rebuild_shard is not None:
+        rebuild_shard(args.rebuild_shard, root=root)
+    else:
+        generate_vector_store(shards=args.shards, shard_by=args.shard_by, root=root)
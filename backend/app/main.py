@@ -1,54 +1,218 @@
-from fastapi import FastAPI, HTTPException
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Query, WebSocket
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
-from datetime import datetime
+from fastapi.middleware.gzip import GZipMiddleware
+from typing import List, Optional, TYPE_CHECKING
+from datetime import date, datetime, timedelta
 import os
+import sys
+import uuid
 
-from app.schemas import GitHubQuery
-from app.services.ai_service import AIService
-from app.services.memory_service import get_conversation_state
+from app.schemas import GitHubQuery, GitHubBatchQuery, SESSION_ID_PATTERN
+from app.services.memory_service import get_conversation_state, history_since
+from app.services.metrics import metrics
+from app.services.rate_limiter import RateLimiter, OverloadedError
 from app.config import (
     GEMINI_MODEL_NAME,
     VECTOR_STORE_PATH,
     RATE_LIMIT,
-    API_VERSION
+    GLOBAL_RATE_LIMIT,
+    TRUSTED_PROXIES,
+    API_VERSION,
+    ADMIN_TOKEN,
+    VECTOR_STORE_WATCH_INTERVAL,
+    STARTUP_BUDGET_SECONDS,
+    TENANT_INDEXES
 )
-from app.github_vectors_creator import generate_vector_store
+from app.services.vector_store_manager import current_version, list_versions
+from app.services.index_builder import start_background_build, build_status
+from app.services.profiler import profile_request, recent_profiles, ProfilingBusyError, PROFILE_MODES
+from app.services.tenant_indexes import UnknownTenantError
+from app.services.chat_channel import ChatConnection, chat_hub, CLOSE_SLOW_CONSUMER
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
 
 # Timing du démarrage
 app_start_time = datetime.utcnow()
 
-# Générer le vecteur FAISS si absent
-index_file_path = os.path.join(VECTOR_STORE_PATH, "index.faiss")
-if not os.path.exists(index_file_path):
-    print("🚀 Index FAISS absent, génération du vector store en cours...")
-    generate_vector_store()
-    print("✅ Vector store généré avec succès !")
+# Service AI : créé au démarrage (lifespan), les modules lourds (langchain, FAISS,
+# google.generativeai) ne sont pas importés avec app.main
+ai_service: Optional["AIService"] = None
+
+# Admission : seau à jetons par client et global
+rate_limiter = RateLimiter(per_client_per_minute=RATE_LIMIT, global_per_minute=GLOBAL_RATE_LIMIT)
+
+async def watch_vector_store():
+    """Bascule à chaud dès qu'une nouvelle version est publiée (reconstruction, capture de changements)"""
+    while True:
+        await asyncio.sleep(VECTOR_STORE_WATCH_INTERVAL)
+        published = current_version(VECTOR_STORE_PATH)
+        ai_service.answers.refresh(ai_service.data_version)  # Réponses publiées par le worker du warm-up
+        if published and published != ai_service.data_version and not ai_service._reload_lock.locked():
+            try:
+                await ai_service.reload_vector_store(published)
+            except Exception as e:
+                print(f"⚠️ Rechargement de la version {published} impossible : {e}")
+        # Index des autres tenants : déchargement des inactifs, bascule des nouvelles versions
+        ai_service.tenants.evict_idle()
+        await ai_service.tenants.refresh()
+        # Sessions WebSocket : nouvelle version annoncée et graphiques exacts rafraîchis
+        await chat_hub.push_versions()
+
 
-# Initialisation du service AI
-ai_service = AIService()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ai_service
+    from app.services.ai_service import AIService
+    from app.services.gemini_client import get_gemini_client, close_gemini_client, gemini_limiter
+
+    # Chargement de l'index hors de la boucle d'événements
+    ai_service = await asyncio.to_thread(AIService)
+
+    # Client Gemini du worker, connexions ouvertes avant la première requête.
+    # Limiteur attaché à la boucle : les appels faits depuis des threads le partagent.
+    gemini_limiter.attach(asyncio.get_running_loop())
+    gemini = get_gemini_client()
+    try:
+        await gemini.warm_up()
+    except Exception as e:
+        print(f"⚠️ Warm-up Gemini impossible : {e}")
+
+    # Index absent : génération en arrière-plan, l'API démarre en mode dégradé
+    if ai_service.degraded:
+        loop = asyncio.get_running_loop()
+        start_background_build(
+            VECTOR_STORE_PATH,
+            on_ready=lambda version: asyncio.run_coroutine_threadsafe(
+                ai_service.reload_vector_store(version), loop
+            )
+        )
+    watcher = asyncio.create_task(watch_vector_store()) if VECTOR_STORE_WATCH_INTERVAL > 0 else None
+    ai_service.schedule_answer_warmup()
+    # Tenants chauds chargés en arrière-plan : le worker est prêt sans les attendre
+    preload = asyncio.create_task(ai_service.tenants.preload(TENANT_INDEXES["preload"]))
+
+    ready_s = (datetime.utcnow() - app_start_time).total_seconds()
+    metrics.incr("startup_ms", int(ready_s * 1000))
+    if ready_s > STARTUP_BUDGET_SECONDS:
+        print(f"⚠️ Démarrage en {ready_s:.1f}s (budget {STARTUP_BUDGET_SECONDS:.0f}s), voir --profile-startup")
+    else:
+        print(f"🚀 Worker prêt en {ready_s:.1f}s")
+    yield
+    preload.cancel()
+    if watcher:
+        watcher.cancel()
+    await asyncio.to_thread(ai_service.query_log.flush)
+    await close_gemini_client()
 
 # Initialisation FastAPI
 app = FastAPI(
     title="GitHub Analytics API",
     description="API for analyzing GitHub data using Gemini and vector search",
-    version=API_VERSION
+    version=API_VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # Sérialisation orjson (graphiques volumineux)
 )
 
-# Configuration CORS sécurisée
+# Configuration CORS sécurisée (aussi appliquée à l'origine des connexions WebSocket)
+ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(","),
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
     max_age=600
 )
 
+# Exports : flux servis tels quels (Parquet déjà compressé en zstd, lots envoyés dès qu'ils sont lus)
+GZIP_EXCLUDED_PREFIXES = ("/export/",)
+
+
+class ResponseGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware hors des chemins de GZIP_EXCLUDED_PREFIXES"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(GZIP_EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compression des réponses volumineuses (graphiques, historiques)
+app.add_middleware(ResponseGZipMiddleware, minimum_size=1000)
+
+def client_id(request: Request) -> str:
+    """Identifiant client pour la limitation de débit : adresse du pair, ou X-Client-ID
+    posé par un reverse proxy de confiance (un client direct ne choisit pas son seau)"""
+    peer = request.client.host if request.client else "anonymous"
+    if peer in TRUSTED_PROXIES:
+        return request.headers.get("X-Client-ID") or peer
+    return peer
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return ORJSONResponse(
+        status_code=429,
+        content={
+            "error": str(exc),
+            "type": "OverloadedError",
+            "suggestion": "Retry after the delay given in the Retry-After header"
+        },
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(UnknownTenantError)
+async def unknown_tenant_handler(request: Request, exc: UnknownTenantError):
+    return ORJSONResponse(status_code=404, content={"error": str(exc), "type": "UnknownTenantError"})
+
+
+def request_tenant(x_tenant: Optional[str] = Header(None)) -> Optional[str]:
+    """Tenant de l'en-tête X-Tenant (le champ `tenant` de GitHubQuery est prioritaire)"""
+    return x_tenant or None
+
+
+async def tenant_index(tenant: Optional[str] = Depends(request_tenant)):
+    """Instantané (store, version) de l'index du tenant de la requête"""
+    return await ai_service.index_for(tenant)
+
+
 @app.post("/analyze")
-async def generate_text(query: GitHubQuery) -> dict:
+async def generate_text(
+    query: GitHubQuery,
+    request: Request,
+    profile: Optional[str] = None,
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+    tenant: Optional[str] = Depends(request_tenant)
+) -> dict:
+    rate_limiter.check(client_id(request))
+    query.tenant = query.tenant or tenant
+    # Profilage à la demande : ?profile=sampling|cprofile ou en-tête X-Profile, jeton admin requis
+    profile_mode = profile or x_profile
+    if profile_mode:
+        require_admin(x_admin_token)
+        if profile_mode in ("1", "true"):
+            profile_mode = "sampling"
+        if profile_mode not in PROFILE_MODES:
+            raise HTTPException(status_code=400, detail=f"Profiling mode must be one of {', '.join(PROFILE_MODES)}")
     try:
-        return await ai_service.generate_response(query)  # Use the instance method
+        if not profile_mode:
+            return await ai_service.generate_response(query)  # Use the instance method
+        result, report = await profile_request(
+            lambda: ai_service.generate_response(query), mode=profile_mode, label=query.prompt[:80]
+        )
+        return {**result, "profile": report}
+    except ProfilingBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (OverloadedError, UnknownTenantError):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -59,16 +223,276 @@ async def generate_text(query: GitHubQuery) -> dict:
             }
         )
 
+@app.post("/analyze/batch")
+async def generate_batch(batch: GitHubBatchQuery, request: Request,
+                         tenant: Optional[str] = Depends(request_tenant)) -> dict:
+    """Analyse groupée : résultats dans l'ordre, erreurs par élément"""
+    rate_limiter.check(client_id(request), cost=len(batch.queries))
+    for query in batch.queries:
+        query.tenant = query.tenant or tenant
+    if len({query.tenant for query in batch.queries}) > 1:
+        raise HTTPException(status_code=400, detail="All queries of a batch must target the same tenant")
+    results = await ai_service.generate_batch(batch.queries, batch.queries[0].tenant)
+    return {
+        "count": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "results": results
+    }
+
+
+@app.websocket("/ws/chat")
+async def chat_channel(websocket: WebSocket, since: int = 0,
+                       session_id: Optional[str] = Query(None, pattern=SESSION_ID_PATTERN),
+                       tenant: Optional[str] = None, x_tenant: Optional[str] = Header(None)):
+    """Canal de chat : une connexion par session, questions multiplexées, texte généré en flux,
+    graphiques poussés à chaque nouvelle version. `tenant` en paramètre (les navigateurs n'envoient pas d'en-têtes)."""
+    origin = websocket.headers.get("origin")
+    if origin and origin not in ALLOWED_ORIGINS:
+        await websocket.close(code=1008)
+        return
+    tenant = tenant or x_tenant
+    try:
+        _, data_version = await ai_service.index_for(tenant)
+    except UnknownTenantError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    await websocket.accept()
+    connection = ChatConnection(
+        websocket, ai_service, rate_limiter,
+        session_id=session_id or str(uuid.uuid4()),
+        tenant=tenant,
+        client=client_id(websocket),
+        data_version=data_version
+    )
+    chat_hub.register(connection)
+    try:
+        await connection.run(since)
+    finally:
+        chat_hub.unregister(connection)
+    if connection.closed_by_server:
+        await websocket.close(code=CLOSE_SLOW_CONSUMER)
+
+
+@app.get("/sessions/{session_id}/history")
+async def session_history(session_id: str, since: int = 0, include_charts: bool = False):
+    """Tours de la session postérieurs au curseur `since` (réponses /analyze en delta)"""
+    return {"session_id": session_id, **history_since(session_id, since, include_charts)}
+
+
+def active_graph(store):
+    """Graphe dépôts / contributeurs de la version active"""
+    from app.services.repo_graph import graph_for
+
+    graph = graph_for(store)
+    if graph is None:
+        raise HTTPException(status_code=404, detail="No repository graph for the active data version")
+    return graph
+
+
+@app.get("/graph/neighbours")
+async def graph_neighbours(repo: str, k: int = Query(10, ge=1, le=50), index=Depends(tenant_index)):
+    """Dépôts les plus proches par contributeurs partagés"""
+    store, version = index
+    graph = active_graph(store)
+    if graph.repo_id(repo) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown repository '{repo}'")
+    return {"repo": repo, "version": version, "neighbours": graph.neighbours(repo, k)}
+
+
+@app.get("/graph/network")
+async def graph_network(repos: List[str] = Query(...), k: int = Query(5, ge=1, le=20),
+                        index=Depends(tenant_index)):
+    """Graphique repo_network prêt à afficher"""
+    chart = active_graph(index[0]).network(repos, k)
+    if chart is None:
+        raise HTTPException(status_code=404, detail="None of the requested repositories is in the graph")
+    return chart
+
+
+@app.get("/graph/contrib_matrix")
+async def graph_contrib_matrix(repos: List[str] = Query(...), top: int = Query(20, ge=1, le=100),
+                               index=Depends(tenant_index)):
+    """Graphique contrib_matrix : dépôts × principaux contributeurs"""
+    chart = active_graph(index[0]).contrib_matrix(repos, top)
+    if chart is None:
+        raise HTTPException(status_code=404, detail="None of the requested repositories is in the graph")
+    return chart
+
+
+@app.get("/timeseries")
+async def timeseries(
+    repos: List[str] = Query(...),
+    series_metrics: List[str] = Query(["commits"], alias="metrics"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("auto", pattern="^(auto|day|week|month)$"),
+    points: int = Query(100, ge=3, le=100),
+    index=Depends(tenant_index)
+):
+    """Série exacte depuis les agrégats jour / semaine / mois, sous-échantillonnée (LTTB) à `points`"""
+    from app.services.rollups import rollups_for, METRICS, DEFAULT_RANGE_DAYS
+
+    rollups = rollups_for(index[0])
+    if rollups is None:
+        raise HTTPException(status_code=404, detail="No time-series rollups for the active data version")
+    unknown = [m for m in series_metrics if m not in METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics {unknown}, expected {list(METRICS)}")
+    end = end or rollups.latest_day() or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    chart = rollups.series(repos, start, end, granularity, series_metrics, max_points=points)
+    if chart is None:
+        raise HTTPException(status_code=404, detail="None of the requested repositories has rollups")
+    return chart
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Protège les endpoints d'administration par le jeton ADMIN_TOKEN"""
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+async def _export_chunks(request: Request, body):
+    """Lots lus hors boucle d'événements ; lecture arrêtée dès la déconnexion du client.
+    Le curseur serveur est fermé dans tous les cas, même si la réponse est annulée."""
+    try:
+        while not await request.is_disconnected():
+            chunk = await asyncio.to_thread(next, body, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Fermeture soumise au pool immédiatement : elle aboutit même si l'attente est annulée
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(None, body.close))
+
+
+@app.get("/export/{dataset}", dependencies=[Depends(require_admin)])
+async def export_rows(
+    dataset: str,
+    request: Request,
+    format: str = Query("arrow", pattern="^(arrow|parquet|csv)$"),
+    repos: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Lignes brutes (commits, PRs, issues, builds) ou agrégats de l'entrepôt en flux
+    Arrow IPC, Parquet ou CSV, lues par lots via un curseur serveur (mémoire constante).
+    Données nominatives (logins) : jeton admin requis"""
+    from app.services.exporter import open_export, ExportError
+
+    rate_limiter.check(client_id(request))
+    try:
+        # Requête exécutée avant l'envoi des en-têtes : une erreur SQL reste une erreur HTTP
+        body, headers = await asyncio.to_thread(open_export, dataset, format, repos, start, end)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail={"error": str(e), "type": type(e).__name__})
+    metrics.incr(f"exports_{format}")
+    return StreamingResponse(_export_chunks(request, body), media_type=headers.pop("Content-Type"),
+                             headers=headers)
+
+
+@app.get("/admin/vector_store", dependencies=[Depends(require_admin)])
+async def vector_store_status():
+    """Version active de l'index et versions disponibles"""
+    return {
+        "current_version": ai_service.data_version,
+        "published_version": current_version(VECTOR_STORE_PATH),
+        "available_versions": list_versions(VECTOR_STORE_PATH),
+        "reloading": ai_service._reload_lock.locked()
+    }
+
+
+@app.post("/admin/vector_store/reload", dependencies=[Depends(require_admin)])
+async def reload_vector_store(version: Optional[str] = None):
+    """Charge une version (la publiée par défaut) et la bascule sans redémarrage"""
+    previous = ai_service.data_version
+    try:
+        loaded = await ai_service.reload_vector_store(version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await chat_hub.push_versions()
+    return {"previous_version": previous, "current_version": loaded}
+
+
+@app.get("/admin/tenants", dependencies=[Depends(require_admin)])
+async def tenants_status():
+    """Index des tenants chargés dans ce worker (LRU, mémoire estimée, inactivité)"""
+    return ai_service.tenants.status()
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Profils récents du worker (les plus récents en dernier)"""
+    return {
+        "profiles": [
+            {key: report[key] for key in ("profile_id", "label", "mode", "created_at", "total_ms")}
+            for report in recent_profiles.values()
+        ]
+    }
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = "json"):
+    """Rapport complet ; format=collapsed renvoie les piles pour flamegraph.pl / speedscope"""
+    report = recent_profiles.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    if format == "collapsed":
+        return PlainTextResponse("\n".join(report.get("collapsed_stacks", [])))
+    return report
+
 
 @app.get("/health")
 async def health_check():
     """Service health check"""
-    return {
-        "status": "ready",
+    health = {
+        "status": "degraded" if ai_service.degraded else "ready",
         "model": GEMINI_MODEL_NAME,
         "vector_store": os.path.exists(VECTOR_STORE_PATH),
         "data_ready": bool(ai_service.vector_store),
-        "rate_limit": "60 requests/minute"
+        "vector_store_version": ai_service.data_version,
+        "rate_limit": f"{RATE_LIMIT} requests/minute per client, {GLOBAL_RATE_LIMIT} global",
+        "gemini_concurrency_limit": int(ai_service.gemini_limiter.limit)
+    }
+    if ai_service.degraded:
+        # Progression de la génération : documents embarqués / total
+        health["index_build"] = build_status(VECTOR_STORE_PATH) or {"state": "pending"}
+    return health
+
+def prefetch_stats() -> dict:
+    """Taux de succès du préchargement spéculatif (questions de suivi servies sans recherche)"""
+    hits, misses = metrics.get("prefetch_hits"), metrics.get("prefetch_misses")
+    return {
+        "hits": int(hits),
+        "misses": int(misses),
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "in_flight": len(ai_service._prefetch_tasks)
+    }
+
+
+@app.get("/metrics")
+async def service_metrics():
+    """Compteurs internes du worker (déduplication, etc.)"""
+    return {
+        "counters": metrics.snapshot(),
+        "generation_in_flight": ai_service._generation_flight.in_flight,
+        "precomputed_answers": ai_service.answers.size,
+        "chat_connections": len(chat_hub),
+        "prefetch": prefetch_stats(),
+        "tenant_indexes": {
+            "loaded": len(ai_service.tenants),
+            "memory_mb": round(ai_service.tenants.memory_mb, 1)
+        },
+        "gemini_limiter": {
+            "limit": round(ai_service.gemini_limiter.limit, 2),
+            "in_flight": ai_service.gemini_limiter.in_flight,
+            "waiting": ai_service.gemini_limiter.waiting
+        }
     }
 
 @app.get("/available_metrics")
@@ -87,6 +511,18 @@ async def root():
                 "description": "Analyze school data with natural language",
                 "example_body": {"prompt": "Compare schools in Casablanca by success rate"}
             },
+            "POST /analyze/batch": "Analyze several queries in one call (batched embedding and retrieval)",
+            "GET /sessions/{session_id}/history": "Session turns after a history cursor (?since=N)",
+            "WS /ws/chat": "Chat session channel (?session_id=&since=&tenant=): concurrent queries by id, "
+                           "partial charts, pushed chart updates on new data versions",
+            "GET /graph/neighbours": "Repositories sharing contributors with ?repo=",
+            "GET /graph/network": "repo_network chart for ?repos=",
+            "GET /graph/contrib_matrix": "contrib_matrix chart (repositories x top contributors) for ?repos=",
+            "GET /timeseries": "Exact commits / PRs / issues / builds series for ?repos= (day, week, month)",
+            "GET /export/{dataset}": "Stream warehouse rows (commits, pull_requests, issues, builds, aggregates) "
+                                     "as ?format=arrow|parquet|csv (admin token)",
+            "X-Tenant header": "Organisation whose index is queried (or `tenant` in the query body)",
+            "GET /metrics": "Internal counters (coalesced generations, ...)",
             "GET /available_metrics": "List all available metrics for queries",
             "GET /health": "Check API status and dependencies"
         },
@@ -95,4 +531,65 @@ async def root():
             "JSON-formatted responses with visualizations",
             "Conversational memory"
         ]
-    }
\ No newline at end of file
+    }
+
+# Profilage du démarrage : python -m app.main --profile-startup
+_STARTUP_PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+
+async def ready():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready_at = asyncio.run(ready())
+print(json.dumps({"import_s": imported - start, "ready_s": ready_at - start}))
+"""
+
+
+def profile_startup(top: int = 20) -> dict:
+    """Temps d'import par module (-X importtime) et temps jusqu'à l'état prêt, dans un processus neuf"""
+    import json
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _STARTUP_PROBE],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <module>"
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        imports.append((int(cumulative_us), int(self_us), module.strip()))
+    timings = json.loads(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else {}
+
+    print("⏱️ Imports les plus coûteux (cumulé, ms) :")
+    for cumulative_us, self_us, module in sorted(imports, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:9.1f}  (self {self_us / 1000:7.1f})  {module}")
+    if timings:
+        print(f"📦 import app.main : {timings['import_s'] * 1000:.0f} ms")
+        print(f"🚀 time-to-ready (lifespan terminé) : {timings['ready_s'] * 1000:.0f} ms")
+    else:
+        print(f"❌ Démarrage en échec :\n{result.stderr[-2000:]}")
+    return timings
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GitHub Analytics API")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Mesure les temps d'import et le time-to-ready puis quitte")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+    else:
+        import uvicorn
+        uvicorn.run("app.main:app", host=args.host, port=args.port)
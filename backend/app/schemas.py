@@ -2,6 +2,7 @@ from enum import Enum
 from typing import Dict, List, Optional, Union, Tuple
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
+from app.config import BATCH_MAX_SIZE
 
 class GitHubQueryType(str, Enum):
     """Types de requêtes spécifiques à l'analyse GitHub"""
@@ -81,12 +82,15 @@ class GitHubQueryResult(BaseModel):
             raise ValueError("Raw data sample too large (max 10 items)")
         return v
 
+SESSION_ID_PATTERN = r'^[a-f0-9]{8}-([a-f0-9]{4}-){3}[a-f0-9]{12}$'
+
+
 class GitHubQuery(BaseModel):
     """Requête d'analyse GitHub"""
     prompt: str = Field(..., min_length=5)
     session_id: Optional[str] = Field(
         None,
-        pattern=r'^[a-f0-9]{8}-([a-f0-9]{4}-){3}[a-f0-9]{12}$'  # remplacé regex par pattern
+        pattern=SESSION_ID_PATTERN  # remplacé regex par pattern
     )
     query_type: GitHubQueryType = GitHubQueryType.UNKNOWN
     repos: Optional[List[str]] = Field(
@@ -98,6 +102,11 @@ class GitHubQuery(BaseModel):
         description="Période d'analyse"
     )
     timestamp: Optional[datetime] = Field(default_factory=datetime.utcnow)  # ✅ Ajout du champ timestamp
+    tenant: Optional[str] = Field(
+        None,
+        pattern=r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$',
+        description="Organisation dont l'index est interrogé (sinon en-tête X-Tenant, sinon défaut)"
+    )
 
     @validator('prompt')
     def validate_prompt(cls, v):
@@ -105,6 +114,16 @@ class GitHubQuery(BaseModel):
             raise ValueError("Query must contain at least 2 words")
         return v
 
+class GitHubBatchQuery(BaseModel):
+    """Lot de requêtes d'analyse GitHub (rafraîchissement de dashboard)"""
+    queries: List[GitHubQuery] = Field(..., min_items=1)
+
+    @validator('queries')
+    def validate_batch_size(cls, v):
+        if len(v) > BATCH_MAX_SIZE:
+            raise ValueError(f"Batch too large (max {BATCH_MAX_SIZE} queries)")
+        return v
+
 class GitHubSessionState(BaseModel):
     """État de session pour l'analyse GitHub"""
     session_id: str
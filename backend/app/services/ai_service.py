@@ -1,57 +1,161 @@
 import uuid
 import json
-from typing import List, Dict
+import time
+import asyncio
+from typing import Callable, List, Dict, Optional, Tuple
 from app.schemas import GitHubQuery, GitHubQueryType
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.config import (
     GEMINI_API_KEY, GEMINI_MODEL_NAME, MAX_TOKENS, TEMPERATURE, TOP_P,
-    SYSTEM_PROMPT, FEW_SHOT_EXAMPLES, RECOVERY_PROMPT, VECTOR_STORE_PATH
+    SYSTEM_PROMPT, FEW_SHOT_EXAMPLES, RECOVERY_PROMPT, VECTOR_STORE_PATH,
+    EMBEDDING_MODEL_NAME, BATCH_GENERATION_CONCURRENCY,
+    RETRY_BACKOFF, STRUCTURED_OUTPUT, STAGE_TIMEOUTS,
+    QUERY_LOG_PATH, ANSWER_WARMUP, DECOMPOSITION, TENANT_INDEXES, PREFETCH
 )
 from app.utils.classifiers import classify_query
 from app.utils.formatters import ResponseFormatter
-from app.services.memory_service import get_conversation_state, update_conversation_state
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import google.generativeai as genai
+from app.utils.response_schema import RESPONSE_SCHEMA
+from app.services.metrics import metrics
+from app.services.profiler import stage
+from app.services.memory_service import (
+    get_conversation_state, update_conversation_state, append_turn, format_history
+)
+from app.services.vector_search import search_by_vectors, search_subset, metadata_index_for
+from app.services.singleflight import SingleFlight
+from app.services.vector_store_manager import load_vector_store, current_version, list_versions
+from app.services.answer_store import AnswerStore, QueryLog, answer_key, warm_up_answers
+from app.services.rate_limiter import OverloadedError, backoff_delay
+from app.utils.normalizers import normalize_prompt, cache_key
+from app.utils.decomposition import decompose_query, mentioned_repos
+from app.services.repo_graph import graph_for, requested_graph_charts
+from app.services.rollups import rollups_for, requested_metrics, DEFAULT_RANGE_DAYS
+from app.services.tenant_indexes import TenantIndexManager, is_default_tenant
+from google.api_core.exceptions import ResourceExhausted
+from app.services.gemini_client import get_gemini_client, gemini_limiter
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Type de document privilégié à la récupération selon la catégorie de requête
+PREFERRED_DOC_TYPES = {
+    "team_performance": "developer",
+    "productivity": "developer",
+    "trend": "trend",
+    "risk_assessment": "kpi_status",
+    "code_health": "kpi_status",
+}
 
 class AIService:
-    def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=GEMINI_API_KEY
-        )
-        self.vector_store = FAISS.load_local(
-            folder_path=VECTOR_STORE_PATH,
-            embeddings=self.embeddings,
-            allow_dangerous_deserialization=True
+    def __init__(self, embeddings=None, root: str = VECTOR_STORE_PATH, query_log_path: str = QUERY_LOG_PATH):
+        # Embeddings et répertoire de l'index injectables (tests, outils hors ligne)
+        if embeddings is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            embeddings = GoogleGenerativeAIEmbeddings(
+                model=EMBEDDING_MODEL_NAME,
+                google_api_key=GEMINI_API_KEY
+            )
+        self.embeddings = embeddings
+        self.root = root
+        # (index FAISS, version) : une seule référence, remplacée atomiquement au rechargement
+        # Mode dégradé (sans contexte vectoriel) tant qu'aucun index n'est publié
+        self._active = (None, None)
+        if current_version(self.root) is not None:
+            self._active = load_vector_store(self.root, self.embeddings)
+        self._reload_lock = asyncio.Lock()
+        # Autres organisations : index chargés à la demande (LRU borné en mémoire)
+        self.tenants = TenantIndexManager(
+            self.embeddings,
+            memory_budget_mb=TENANT_INDEXES["memory_budget_mb"],
+            idle_seconds=TENANT_INDEXES["idle_seconds"],
+            hot=TENANT_INDEXES["preload"]
         )
+        self._generation_flight = SingleFlight("generation")
+        # Générations des analyses groupées : plafond commun à tous les lots en cours du worker
+        self._batch_slots = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+        # Préchargement spéculatif des questions de suivi : tâche en cours par session, plafond global
+        self._prefetch_tasks: Dict[str, asyncio.Task] = {}
+        self._prefetch_slots = asyncio.Semaphore(PREFETCH["max_concurrent"])
+        # Réponses pré-calculées de la version active et journal des questions
+        self.answers = AnswerStore(self.root)
+        self.answers.refresh(self.data_version)
+        self.query_log = QueryLog(query_log_path)
+        self._warmup_task: Optional[asyncio.Task] = None
+        # Limiteur partagé avec la classification et les embeddings (appels depuis des threads)
+        self.gemini_limiter = gemini_limiter
+
+    @property
+    def vector_store(self):
+        return self._active[0]
+
+    @property
+    def data_version(self) -> str:
+        return self._active[1]
+
+    @property
+    def degraded(self) -> bool:
+        return self._active[0] is None
 
-    def _retrieve_relevant_data(self, query: str, query_type: GitHubQueryType = None) -> List[Dict]:
+    async def index_for(self, tenant: Optional[str] = None) -> Tuple[object, Optional[str]]:
+        """Instantané (store, version) de l'index d'un tenant ; le tenant par défaut est toujours chargé"""
+        if is_default_tenant(tenant):
+            return self._active
+        return await self.tenants.get(tenant)
+
+    def loaded_index(self, tenant: Optional[str] = None) -> Optional[Tuple[object, Optional[str]]]:
+        """Comme index_for, sans charger un tenant absent de la mémoire (None dans ce cas)"""
+        if is_default_tenant(tenant):
+            return self._active
+        return self.tenants.peek(tenant)
+
+    async def reload_vector_store(self, version: str = None) -> str:
+        """Charge une version de l'index en arrière-plan puis la bascule atomiquement.
+        Les requêtes en cours terminent sur l'ancienne version."""
+        async with self._reload_lock:
+            store, version = await asyncio.to_thread(
+                load_vector_store, self.root, self.embeddings, version
+            )
+            await asyncio.to_thread(metadata_index_for, store)  # Postings prêts avant la bascule
+            self._active = (store, version)
+            self.answers.refresh(version)  # Les réponses de l'ancienne version ne sont plus servies
+        print(f"🔁 Vector store basculé sur la version {version}")
+        self.schedule_answer_warmup()
+        return version
+
+    def schedule_answer_warmup(self) -> None:
+        """Lance (ou relance) le warm-up des réponses fréquentes pour la version active"""
+        version = self.data_version
+        if not ANSWER_WARMUP["enabled"] or version is None:
+            return
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        self.answers.prune(list_versions(self.root))
+        self._warmup_task = asyncio.create_task(warm_up_answers(
+            self, self.query_log, self.answers, version,
+            top_n=ANSWER_WARMUP["top_n"],
+            min_count=ANSWER_WARMUP["min_count"],
+            per_minute=ANSWER_WARMUP["per_minute"],
+            log_days=ANSWER_WARMUP["log_days"]
+        ))
+
+    def _retrieve_relevant_data(self, query: str, query_type: GitHubQueryType = None, store=None) -> List[Dict]:
         # Recherche basique
-        docs = self.vector_store.similarity_search(query, k=5)
-        
-        # Filtrage intelligent selon le type de requête
+        store = store or self.vector_store
+        docs = store.similarity_search(query, k=5)
+        return self._select_relevant_docs(docs, query_type)
+
+    def _select_relevant_docs(self, docs: List, query_type: GitHubQueryType = None) -> List[Dict]:
+        # Filtrage intelligent selon le type de requête (valeur du classifieur ou du schéma)
         if query_type:
-            filtered_docs = []
-            for doc in docs:
-                doc_type = doc.metadata.get('type', '')
-                
-                # Filtres spécialisés
-                if query_type == GitHubQueryType.TEAM_PERFORMANCE and doc_type == 'developer':
-                    filtered_docs.append(doc)
-                elif query_type == GitHubQueryType.TREND and doc_type == 'trend':
-                    filtered_docs.append(doc)
-                elif query_type == GitHubQueryType.RISK_ASSESSMENT and doc_type == 'kpi_status':
-                    filtered_docs.append(doc)
-                else:
-                    filtered_docs.append(doc)  # Garde tout si pas de filtre spécifique
-            
-            docs = filtered_docs[:3]  # Limite à 3 documents les plus pertinents
+            docs = self._rank_docs(docs, query_type)[:3]  # Limite à 3 documents les plus pertinents
         
         return [self._parse_github_doc(doc) for doc in docs]
 
+    @staticmethod
+    def _rank_docs(docs: List, query_type) -> List:
+        preferred = PREFERRED_DOC_TYPES.get(getattr(query_type, "value", query_type))
+        if preferred:
+            # Documents du type privilégié en tête, ordre de similarité conservé
+            docs = sorted(docs, key=lambda doc: doc.metadata.get('type', '') != preferred)
+        return docs
+
     def _parse_github_doc(self, doc) -> Dict:
         try:
             content = json.loads(doc.page_content)
@@ -88,8 +192,23 @@ class AIService:
         return base_prompt
 
     def prepare_prompt(self, user_query: str) -> str:
-        relevant_data = self._retrieve_relevant_data(user_query)
         query_type = classify_query(user_query)
+        relevant_data = self._retrieve_relevant_data(user_query, query_type)
+        return self._build_prompt(user_query, query_type, relevant_data)
+
+    @staticmethod
+    def _scope_note(query: GitHubQuery) -> Optional[str]:
+        """Rappelle au modèle le périmètre demandé (dépôts / période)"""
+        parts = []
+        if query.repos:
+            parts.append(f"repositories {', '.join(query.repos)}")
+        if query.timeframe:
+            start, end = query.timeframe
+            parts.append(f"period {start.date().isoformat()} to {end.date().isoformat()}")
+        return f"NOTE: Restrict the analysis to {' and '.join(parts)}\n\n" if parts else None
+
+    def _build_prompt(self, user_query: str, query_type, relevant_data: List[Dict],
+                      scope_note: Optional[str] = None) -> str:
         context_str = "\n".join(
             f"GitHub Context {i+1}:\n{json.dumps(data, indent=2)}"
             for i, data in enumerate(relevant_data)
@@ -99,79 +218,584 @@ class AIService:
             f"GitHub Documentation Context:\n{context_str}\n\n"
             f"Examples:\n{FEW_SHOT_EXAMPLES}\n\n"
         )
-        if query_type == GitHubQueryType.COMPARE:
+        type_value = getattr(query_type, "value", query_type)
+        if type_value == GitHubQueryType.COMPARE.value:
             base_prompt += "NOTE: Compare repositories or developers using bar charts\n\n"
-        elif query_type == GitHubQueryType.TREND:
+        elif type_value == GitHubQueryType.TREND.value:
             base_prompt += "NOTE: Show time trends with line charts\n\n"
+        if any(data.get("type") == "timeseries" for data in relevant_data):
+            base_prompt += ("NOTE: For trend charts, use the exact timeseries context (labels and values) "
+                            "as-is instead of estimating values\n\n")
+        if any(data.get("type") == "repo_graph" for data in relevant_data):
+            base_prompt += ("NOTE: For repo_network / contrib_matrix charts, base the analysis on the "
+                            "precomputed repo_graph context instead of inferring relationships; set the chart "
+                            "type and a short title only, the precomputed chart replaces its data\n\n")
+        if scope_note:
+            base_prompt += scope_note
         return base_prompt + f"User Query: {user_query}\nResponse:"
 
-    async def generate_response(self, query: GitHubQuery) -> Dict:
-        """Generate response using vector store context"""
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Un seul appel d'embedding pour plusieurs requêtes"""
+        return get_gemini_client().embed(texts, task_type="retrieval_query")
+
+    def _search(self, store, vector: List[float], k: int, repos=None, timeframe=None) -> List:
+        """Recherche d'un vecteur, restreinte aux dépôts/période demandés s'il y en a"""
+        if not repos and not timeframe:
+            return search_by_vectors(store, [vector], k=k)[0]
+        ids = metadata_index_for(store).candidate_ids(repos, timeframe)
+        metrics.incr("scoped_searches")
+        metrics.incr("scoped_vectors_scanned", len(ids))
+        return search_subset(store, vector, ids, k=k)
+
+    def _retrieve_by_vector(self, store, vector: List[float], query_type=None,
+                            repos=None, timeframe=None) -> List[Dict]:
+        hits = self._search(store, vector, 5, repos, timeframe)
+        return self._select_relevant_docs([doc for doc, _ in hits], query_type)
+
+    def _sub_queries(self, store, query: GitHubQuery) -> List[Dict]:
+        """Entités comparées et sous-requêtes (vide si la question n'en compare pas plusieurs)"""
+        if store is None:
+            return []
+        return decompose_query(
+            query.prompt, metadata_index_for(store).repos, query.repos,
+            max_entities=DECOMPOSITION["max_entities"]
+        )
+
+    @staticmethod
+    def _should_decompose(query_type, sub_queries: List[Dict]) -> bool:
+        # Comparaisons et tendances : seulement si plusieurs dépôts sont en jeu
+        type_value = getattr(query_type, "value", query_type)
+        return type_value in (GitHubQueryType.COMPARE.value, GitHubQueryType.TREND.value) and len(sub_queries) >= 2
+
+    def _retrieve(self, store, query: GitHubQuery, query_type, vectors: List[List[float]],
+                  sub_queries: List[Dict]) -> List[Dict]:
+        """vectors[0] : question complète ; vectors[1:] : sous-requêtes éventuelles"""
+        if len(vectors) > len(sub_queries) and self._should_decompose(query_type, sub_queries):
+            return self._retrieve_decomposed(store, query, query_type, vectors[1:], sub_queries)
+        return self._retrieve_by_vector(store, vectors[0], query_type, query.repos, query.timeframe)
+
+    def _retrieve_decomposed(self, store, query: GitHubQuery, query_type, vectors: List[List[float]],
+                             sub_queries: List[Dict]) -> List[Dict]:
+        """Une sous-recherche par dépôt puis fusion sous quota : chaque dépôt a son contexte,
+        sans augmenter k pour la question entière"""
+        quota = max(1, DECOMPOSITION["max_docs"] // len(sub_queries))
+        fetch = quota * 2  # Marge pour les documents partagés entre entités
+        # Recherche restreinte aux postings du dépôt : résultat garanti s'il est indexé
+        hits = [
+            self._search(store, vector, fetch, [sub["entity"]], query.timeframe)
+            for vector, sub in zip(vectors, sub_queries)
+        ]
+
+        merged = self._merge_entity_hits([sub["entity"] for sub in sub_queries], hits, query_type, quota)
+        metrics.incr("decomposed_queries")
+        metrics.incr("decomposed_entities", len(sub_queries))
+        return merged
+
+    def _merge_entity_hits(self, entities: List[str], hits: List[List], query_type, quota: int) -> List[Dict]:
+        """Contexte fusionné sous quota : `quota` documents par entité, sans doublon"""
+        merged, seen = [], set()
+        for entity, entity_hits in zip(entities, hits):
+            docs = [doc for doc, _ in entity_hits if doc.page_content not in seen]
+            for doc in self._rank_docs(docs, query_type)[:quota]:
+                seen.add(doc.page_content)
+                merged.append({**self._parse_github_doc(doc), "compared_entity": entity})
+        return merged
+
+    def _aggregate_context(self, store, query: GitHubQuery, query_type, sub_queries: List[Dict]) -> List[Dict]:
+        """Données pré-calculées exactes (séries temporelles, graphe) ajoutées au contexte"""
+        if store is None:
+            return []
+        contexts = (
+            self._timeseries_context(store, query, query_type, sub_queries),
+            self._graph_context(store, query, sub_queries)
+        )
+        return [context for context in contexts if context]
+
+    @staticmethod
+    def _question_repos(store, query: GitHubQuery, sub_queries: List[Dict]) -> List[str]:
+        """Dépôts visés : filtre explicite, entités comparées, sinon dépôts cités dans la question"""
+        return (query.repos or [sub["entity"] for sub in sub_queries]
+                or mentioned_repos(query.prompt, metadata_index_for(store).repos))
+
+    def _timeseries_context(self, store, query: GitHubQuery, query_type,
+                            sub_queries: List[Dict]) -> Optional[Dict]:
+        """Série exacte issue des agrégats pour les questions de tendance sur des dépôts connus"""
+        rollups = rollups_for(store)
+        if rollups is None or getattr(query_type, "value", query_type) != GitHubQueryType.TREND.value:
+            return None
+        repos = self._question_repos(store, query, sub_queries)
+        if not repos:
+            return None
+        if query.timeframe:
+            start, end = (d.date() for d in query.timeframe)
+        else:
+            end = rollups.latest_day()
+            if end is None:
+                return None
+            start = end - timedelta(days=DEFAULT_RANGE_DAYS)
+        chart = rollups.series(repos[:5], start, end, metrics=requested_metrics(query.prompt))
+        return {"type": "timeseries", "chart": chart} if chart else None
+
+    def _graph_context(self, store, query: GitHubQuery, sub_queries: List[Dict]) -> Optional[Dict]:
+        """Relations pré-calculées (voisins, sous-matrice de contributions) pour les dépôts de la question"""
+        graph = graph_for(store)
+        charts = requested_graph_charts(query.prompt) if graph is not None else []
+        if not charts:
+            return None
+        repos = self._question_repos(store, query, sub_queries)
+        if not repos:
+            return None
+        context = {"type": "repo_graph"}
+        if "repo_network" in charts:
+            context["repo_network"] = graph.network(repos, k=5)
+        if "contrib_matrix" in charts:
+            context["contrib_matrix"] = graph.contrib_matrix(repos, top=15)
+        return context if any(v for k, v in context.items() if k != "type") else None
+
+    def _schedule_prefetch(self, conv_state: Dict, store, data_version: Optional[str], query: GitHubQuery,
+                           sub_queries: List[Dict]) -> None:
+        """Pendant la lecture de la réponse : recherche spéculative du contexte des suites probables
+        (tendance, qualité, équipe) pour les dépôts de ce tour. Au plus une par session et
+        PREFETCH["max_concurrent"] par worker ; au-delà, le préchargement est abandonné."""
+        if not PREFETCH["enabled"] or store is None:
+            return
+        repos = self._question_repos(store, query, sub_queries)[:PREFETCH["max_repos"]]
+        if not repos or self._prefetch_covers(conv_state.get("prefetch"), data_version, query.timeframe, repos):
+            return
+        previous = self._prefetch_tasks.get(query.session_id)
+        if previous and not previous.done():
+            previous.cancel()
+        if self._prefetch_slots.locked():
+            metrics.incr("prefetch_skipped")
+            return
+        task = asyncio.create_task(self._prefetch(conv_state, store, data_version, repos, query.timeframe))
+        self._prefetch_tasks[query.session_id] = task
+        task.add_done_callback(lambda done: self._prefetch_done(query.session_id, done))
+
+    def _prefetch_done(self, session_id: str, task: asyncio.Task) -> None:
+        if self._prefetch_tasks.get(session_id) is task:
+            del self._prefetch_tasks[session_id]
+
+    async def _prefetch(self, conv_state: Dict, store, data_version: Optional[str], repos: List[str],
+                        timeframe) -> None:
+        async with self._prefetch_slots:
+            start = time.perf_counter()
+            probes = [(repo, probe.format(repo=repo)) for repo in repos for probe in PREFETCH["probes"]]
+            try:
+                vectors = await asyncio.to_thread(self._embed_queries, [text for _, text in probes])
+                hits = await asyncio.to_thread(self._prefetch_search, store, probes, vectors, timeframe)
+            except Exception as e:
+                metrics.incr("prefetch_failures")
+                print(f"⚠️ Préchargement spéculatif en échec ({type(e).__name__})")
+                return
+            conv_state["prefetch"] = {
+                "version": data_version,
+                "timeframe": timeframe,
+                "repos": hits,  # dépôt -> documents (meilleurs rangs des sondes d'abord)
+                "expires": time.monotonic() + PREFETCH["ttl_seconds"]
+            }
+            metrics.incr("prefetch_runs")
+            metrics.incr("prefetch_ms", (time.perf_counter() - start) * 1000)
+
+    def _prefetch_search(self, store, probes: List[Tuple[str, str]], vectors: List[List[float]],
+                         timeframe) -> Dict[str, List]:
+        """Recherches restreintes à chaque dépôt, résultats des sondes entrelacés par rang"""
+        per_repo: Dict[str, List[List]] = {}
+        for (repo, _), vector in zip(probes, vectors):
+            per_repo.setdefault(repo, []).append(self._search(store, vector, PREFETCH["k"], [repo], timeframe))
+        pools = {}
+        for repo, probe_hits in per_repo.items():
+            pool, seen = [], set()
+            for rank in range(PREFETCH["k"]):
+                for hits in probe_hits:
+                    if rank < len(hits) and hits[rank][0].page_content not in seen:
+                        seen.add(hits[rank][0].page_content)
+                        pool.append(hits[rank])
+            pools[repo.lower()] = pool
+        return pools
+
+    @staticmethod
+    def _prefetch_covers(cached: Optional[Dict], data_version: Optional[str], timeframe, repos: List[str]) -> bool:
+        return bool(
+            cached and cached["version"] == data_version and cached["timeframe"] == timeframe
+            and time.monotonic() < cached["expires"]
+            and all(repo.lower() in cached["repos"] for repo in repos)
+        )
+
+    def _prefetched_hits(self, conv_state: Dict, store, data_version: Optional[str], query: GitHubQuery,
+                         sub_queries: List[Dict]) -> Optional[Dict[str, List]]:
+        """Contexte préchargé couvrant la question de suivi (dépôts cités, sinon ceux du tour
+        précédent ; même version et même période), None sinon"""
+        cached = conv_state.get("prefetch")
+        if store is None:
+            return None
+        if not cached:
+            task = self._prefetch_tasks.get(query.session_id)
+            if task and not task.done():
+                metrics.incr("prefetch_late")  # Suite posée avant la fin du préchargement
+            return None
+        repos = self._question_repos(store, query, sub_queries) or list(cached["repos"])
+        if not self._prefetch_covers(cached, data_version, query.timeframe, repos):
+            metrics.incr("prefetch_misses")
+            return None
+        metrics.incr("prefetch_hits")
+        return {repo: cached["repos"][repo.lower()] for repo in repos}
+
+    def _prefetched_context(self, prefetched: Dict[str, List], query_type) -> List[Dict]:
+        """Contexte de la question à partir des documents préchargés, classés selon son type"""
+        if len(prefetched) == 1:
+            docs = [doc for doc, _ in next(iter(prefetched.values()))]
+            return self._select_relevant_docs(self._rank_docs(docs, query_type)[:5], query_type)
+        quota = max(1, DECOMPOSITION["max_docs"] // len(prefetched))
+        return self._merge_entity_hits(list(prefetched), list(prefetched.values()), query_type, quota)
+
+    async def _run_stage(self, name: str, awaitable, timeout: float, fallback):
+        """Exécute une étape du pipeline avec délai max ; repli en cas d'échec"""
+        start = time.perf_counter()
+        try:
+            with stage(name):
+                return await asyncio.wait_for(awaitable, timeout)
+        except Exception as e:
+            metrics.incr(f"stage_{name}_fallbacks")
+            print(f"⚠️ Étape {name} en échec ({type(e).__name__}), repli utilisé")
+            return fallback
+        finally:
+            metrics.incr(f"stage_{name}_ms", (time.perf_counter() - start) * 1000)
+
+    def aggregate_charts(self, store, query: GitHubQuery, query_type) -> List[Dict]:
+        """Contextes exacts (séries, graphe) d'une question, recalculés sur `store` (nouvelle version)"""
+        return self._aggregate_context(store, query, query_type, self._sub_queries(store, query))
+
+    async def generate_response(self, query: GitHubQuery,
+                                on_aggregates: Optional[Callable[[object, List[Dict], Optional[str]], None]] = None,
+                                on_text: Optional[Callable[[int, str], None]] = None) -> Dict:
+        """Generate response using vector store context.
+        Pipeline : classification ∥ embedding ∥ historique -> récupération -> génération.
+        `on_aggregates(query_type, contexts, version)` reçoit les contextes exacts dès qu'ils
+        sont calculés, avant la génération (graphiques partiels du canal WebSocket).
+        `on_text(attempt, text)` reçoit les fragments du texte généré au fil du flux Gemini."""
+        # Instantané : la requête finit sur cette version
+        store, data_version = await self.index_for(query.tenant)
+        conv_state = self._open_session(query)
+
+        # Première question de la session : réponse pré-calculée si disponible (tenant par défaut)
+        if len(conv_state["history"]) == 1 and is_default_tenant(query.tenant):
+            if self.query_log.record(query.prompt, query.repos, query.timeframe):
+                await asyncio.to_thread(self.query_log.flush)
+            precomputed = self.answers.get(data_version, answer_key(query.prompt, query.repos, query.timeframe))
+            if precomputed:
+                metrics.incr("precomputed_answer_hits")
+                response = self._respond(query, conv_state, precomputed, data_version, precomputed=True)
+                self._schedule_prefetch(conv_state, store, data_version, query, self._sub_queries(store, query))
+                return response
+
+        classification = asyncio.create_task(self._run_stage(
+            "classification", asyncio.to_thread(classify_query, query.prompt),
+            STAGE_TIMEOUTS["classification"], fallback=GitHubQueryType.UNKNOWN
+        ))
+        embedding, sub_queries = None, self._sub_queries(store, query)
+        # Question de suivi déjà préchargée : ni embedding ni recherche
+        prefetched = self._prefetched_hits(conv_state, store, data_version, query, sub_queries)
+        if store is not None and prefetched is None:
+            # Question et sous-requêtes de comparaison : un seul appel d'embedding
+            embedding = asyncio.create_task(self._run_stage(
+                "embedding", asyncio.to_thread(
+                    self._embed_queries, [query.prompt] + [sub["text"] for sub in sub_queries]
+                ),
+                STAGE_TIMEOUTS["embedding"], fallback=None
+            ))
+        await asyncio.sleep(0)  # Démarre les étapes avant de formater l'historique
+        with stage("history"):
+            context = self._history_context(conv_state)
+
+        query_type = await classification
+        vectors = await embedding if embedding else None
+        relevant_data = []
+        if prefetched is not None:
+            with stage("retrieval"):
+                relevant_data = self._prefetched_context(prefetched, query_type)
+        elif vectors:
+            relevant_data = await self._run_stage(
+                "retrieval", asyncio.to_thread(
+                    self._retrieve, store, query, query_type, vectors, sub_queries
+                ),
+                STAGE_TIMEOUTS["retrieval"], fallback=[]
+            )
+
+        with stage("aggregates"):
+            aggregates = self._aggregate_context(store, query, query_type, sub_queries)
+        if on_aggregates and aggregates:
+            on_aggregates(query_type, aggregates, data_version)
+        relevant_data = relevant_data + aggregates
+
+        with stage("prompt"):
+            prompt = self._build_prompt(query.prompt, query_type, relevant_data, self._scope_note(query))
+        response = await self._answer(query, conv_state, context, prompt, query_type, data_version, on_text,
+                                      charts=self._precomputed_charts(aggregates))
+        self._schedule_prefetch(conv_state, store, data_version, query, sub_queries)
+        return response
+
+    async def generate_batch(self, queries: List[GitHubQuery], tenant: Optional[str] = None) -> List[Dict]:
+        """Analyse groupée : classification, embedding et recherche FAISS par lots,
+        puis génération concurrente sous un plafond partagé (un seul tenant par lot)"""
+        prompts = [q.prompt for q in queries]
+        store, data_version = await self.index_for(tenant)
+
+        # 1. Classification en parallèle (mots-clés, sinon Gemini)
+        query_types = await asyncio.gather(
+            *(asyncio.to_thread(classify_query, prompt) for prompt in prompts),
+            return_exceptions=True
+        )
+
+        # 2. Un seul embedding multi-textes + 3. une seule recherche FAISS matricielle
+        try:
+            if store is None:
+                hits = [[] for _ in queries]  # Mode dégradé : pas de contexte vectoriel
+            else:
+                vectors = await asyncio.to_thread(self._embed_queries, prompts)
+                hits = search_by_vectors(store, vectors, k=5)
+                # Requêtes restreintes à des dépôts/périodes : recherche sur leur sous-ensemble
+                for i, query in enumerate(queries):
+                    if query.repos or query.timeframe:
+                        hits[i] = await asyncio.to_thread(
+                            self._search, store, vectors[i], 5, query.repos, query.timeframe
+                        )
+        except Exception as e:
+            return [self._batch_error(i, e) for i in range(len(queries))]
+
+        async def run(i: int, query: GitHubQuery) -> Dict:
+            query_type = query_types[i]
+            if isinstance(query_type, Exception):
+                query_type = None
+            relevant_data = self._select_relevant_docs([doc for doc, _ in hits[i]], query_type)
+            prompt = self._build_prompt(query.prompt, query_type, relevant_data, self._scope_note(query))
+            conv_state = self._open_session(query)
+            context = self._history_context(conv_state)
+            async with self._batch_slots:
+                return await self._answer(query, conv_state, context, prompt, query_type, data_version)
+
+        results = await asyncio.gather(
+            *(run(i, query) for i, query in enumerate(queries)),
+            return_exceptions=True
+        )
+        return [
+            self._batch_error(i, result) if isinstance(result, Exception) else {"index": i, **result}
+            for i, result in enumerate(results)
+        ]
+
+    @staticmethod
+    def _batch_error(index: int, error: Exception) -> Dict:
+        return {
+            "index": index,
+            "error": str(error),
+            "type": type(error).__name__
+        }
+
+    def _open_session(self, query: GitHubQuery) -> Dict:
+        """Récupère la session et y ajoute le message utilisateur"""
         if not query.session_id:
                 query.session_id = str(uuid.uuid4())
 
         conv_state = get_conversation_state(query.session_id)
-            
-        conv_state["history"].append({
-                "role": "user",
-                "content": query.prompt,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-        context = "\nPrevious conversation:\n" + "\n".join(
-                f"{msg['role']}: {msg['content']}" 
-                for msg in conv_state["history"][:-1]
-            )
-            
-        full_prompt = f"{context}\n\n{self.prepare_prompt(query.prompt)}"
-            
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+        append_turn(conv_state, "user", query.prompt)
+        return conv_state
+
+    @staticmethod
+    def _history_context(conv_state: Dict) -> str:
+        return "\nPrevious conversation:\n" + format_history(conv_state["history"][:-1])
+
+    async def _answer(self, query: GitHubQuery, conv_state: Dict, context: str, prompt: str,
+                      query_type=None, data_version: Optional[str] = None,
+                      on_text: Optional[Callable[[int, str], None]] = None,
+                      charts: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Génère la réponse Gemini pour un prompt déjà enrichi du contexte vectoriel.
+        Une question identique déjà en vol partage sa génération : seule la première reçoit `on_text`.
+        `charts` : graphiques pré-calculés substitués à celui du modèle quand le type correspond."""
+        full_prompt = f"{context}\n\n{prompt}"
+
+        # Single-flight : les questions identiques en vol partagent une seule génération
+        key = cache_key(
+            normalize_prompt(query.prompt),
+            getattr(query_type, "value", query_type),
+            sorted(r.lower() for r in query.repos or []),
+            query.timeframe,
+            query.tenant,
+            data_version,
+            context
+        )
+        formatted = await self._generation_flight.do(
+            key, lambda: self._generate(full_prompt, query.prompt, on_text)
+        )
+
+        if not formatted["success"]:
+            return {k: v for k, v in formatted.items() if k != "success"}
+        return self._respond(query, conv_state, self._with_precomputed_chart(formatted, charts), data_version)
+
+    @staticmethod
+    def _precomputed_charts(contexts: List[Dict]) -> Dict[str, Dict]:
+        """Graphiques du graphe dépôts/contributeurs par type (repo_network, contrib_matrix)"""
+        return {
+            chart_type: context[chart_type]
+            for context in contexts if context.get("type") == "repo_graph"
+            for chart_type in ("repo_network", "contrib_matrix") if context.get(chart_type)
+        }
+
+    @staticmethod
+    def _with_precomputed_chart(formatted: Dict, charts: Optional[Dict[str, Dict]]) -> Dict:
+        """Remplace le graphique généré par le graphique pré-calculé du même type.
+        Les arêtes de repo_network ({source, target, weight}) ne tiennent pas dans le
+        schéma de réponse (données numériques) : le modèle ne les recopie pas."""
+        content = formatted.get("content")
+        chart = content.get("chart") if isinstance(content, dict) else None
+        if not charts or not isinstance(chart, dict) or chart.get("type") not in charts:
+            return formatted
+        return {**formatted, "content": {**content, "chart": charts[chart["type"]]}}
+
+    @staticmethod
+    def _respond(query: GitHubQuery, conv_state: Dict, formatted: Dict,
+                 data_version: Optional[str], precomputed: bool = False) -> Dict:
+        degraded = data_version is None
+
+        turn = append_turn(conv_state, "assistant", formatted["content"], formatted["type"])
+        update_conversation_state(query.session_id, conv_state)
+
+        # Réponse delta : uniquement le nouveau tour + curseur d'historique
+        return {
+            "session_id": query.session_id,
+            "response_type": formatted["type"],
+            "response": formatted["content"],
+            "turn": turn,
+            "history_cursor": conv_state["cursor"],
+            **({"degraded": True} if degraded else {}),
+            **({"precomputed": True} if precomputed else {})
+        }
+
+    async def precompute_answer(self, query: GitHubQuery, version: str) -> Optional[Dict]:
+        """Réponse d'une première question de session sur `version` (warm-up), sans session"""
+        store, data_version = self._active
+        if data_version != version or store is None:
+            return None
+        query_type = await self._run_stage(
+            "classification", asyncio.to_thread(classify_query, query.prompt),
+            STAGE_TIMEOUTS["classification"], fallback=GitHubQueryType.UNKNOWN
+        )
+        sub_queries = self._sub_queries(store, query)
+        vectors = await asyncio.to_thread(
+            self._embed_queries, [query.prompt] + [sub["text"] for sub in sub_queries]
+        )
+        relevant_data = await asyncio.to_thread(
+            self._retrieve, store, query, query_type, vectors, sub_queries
+        )
+        aggregates = self._aggregate_context(store, query, query_type, sub_queries)
+        prompt = self._build_prompt(query.prompt, query_type, relevant_data + aggregates, self._scope_note(query))
+        context = self._history_context({"history": []})  # Historique vide, comme un premier tour
+        formatted = await self._generate(f"{context}\n\n{prompt}", query.prompt)
+        if not formatted or not formatted.get("success"):
+            return formatted
+        return self._with_precomputed_chart(formatted, self._precomputed_charts(aggregates))
+
+    def _generation_config(self) -> Dict:
+        config = {
+            "temperature": TEMPERATURE,
+            "top_p": TOP_P,
+            "max_output_tokens": MAX_TOKENS,
+        }
+        if STRUCTURED_OUTPUT:
+            # Sortie contrainte par schéma : JSON valide par construction
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = RESPONSE_SCHEMA
+        return config
+
+    @staticmethod
+    def _record_usage(response, wasted: bool = False) -> None:
+        """Comptabilise les tokens consommés (et gaspillés par les tentatives rejetées)"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        tokens = (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+        metrics.incr("generation_tokens", tokens)
+        if wasted:
+            metrics.incr("generation_tokens_wasted", tokens)
+
+    @staticmethod
+    def _recovery_prompt(error_msg: str) -> str:
+        # RECOVERY_PROMPT contient des accolades JSON : pas de str.format
+        return RECOVERY_PROMPT.replace("{errors}", error_msg).replace("{chart_type}", "bar|line|pie|...")
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        try:
+            return chunk.text
+        except ValueError:
+            return ""  # Fragment sans texte (fin de flux, métadonnées d'usage)
+
+    async def _generate(self, full_prompt: str, user_prompt: str,
+                        on_text: Optional[Callable[[int, str], None]] = None) -> Dict:
+        """Appel Gemini avec reprise sur réponse mal formatée.
+        Avec `on_text`, la réponse est lue en flux et chaque fragment transmis avec le numéro
+        de tentative (une nouvelle tentative remplace le texte déjà reçu)."""
+        model = get_gemini_client().model(GEMINI_MODEL_NAME)
+        prompt = full_prompt
             
         for attempt in range(3):
+                metrics.incr("generation_attempts")
+                if attempt > 0:
+                    metrics.incr("generation_retries")
+                response = None
                 try:
-                    response = model.generate_content(
-                        full_prompt,
-                        generation_config={
-                            "temperature": TEMPERATURE,
-                            "top_p": TOP_P,
-                            "max_output_tokens": MAX_TOKENS,
-                        }
-                    )
+                    with stage("generation"):
+                        async with self.gemini_limiter.slot():
+                            response = await model.generate_content_async(
+                                prompt,
+                                generation_config=self._generation_config(),
+                                stream=on_text is not None
+                            )
+                            if on_text is not None:
+                                async for chunk in response:
+                                    text = self._chunk_text(chunk)
+                                    if text:
+                                        on_text(attempt, text)
                     
                     generated_text = response.text
-                    formatted = ResponseFormatter.format_response(generated_text)
+                    with stage("formatter"):
+                        formatted = ResponseFormatter.format_response(generated_text)
                     
                     if formatted["success"]:
-                        conv_state["history"].append({
-                            "role": "assistant",
-                            "content": formatted["content"],
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        update_conversation_state(query.session_id, conv_state)
-                        
-                        return {
-                            "session_id": query.session_id,
-                            "response_type": formatted["type"],
-                            "response": formatted["content"],
-                            "history": conv_state["history"]
-                        }
-                    
+                        self._record_usage(response)
+                        if formatted.get("repaired"):
+                            metrics.incr("generation_json_repaired")
+                        return formatted
+
+                    self._record_usage(response, wasted=attempt < 2)
                     if attempt < 2:
+                        # Le prompt de correction remplace le précédent au lieu de s'y ajouter
                         error_msg = formatted.get("error", "Unknown formatting error")
-                        full_prompt = f"{full_prompt}\n\n{RECOVERY_PROMPT.format(errors=error_msg, query=query.prompt)}"
+                        prompt = f"{full_prompt}\n\n{self._recovery_prompt(error_msg)}"
                         continue
                     
                     return {
+                        "success": False,
                         "error": "Response formatting failed",
                         "details": formatted.get("error"),
                         "raw_response": generated_text
                     }
                 
+                except OverloadedError:
+                    raise  # File d'attente locale pleine : échec rapide, pas de nouvelle tentative
+                except ResourceExhausted:
+                    # 429 du fournisseur : la limite AIMD a déjà été réduite
+                    if attempt == 2:
+                        raise OverloadedError("Model provider is rate limiting", retry_after=RETRY_BACKOFF["cap"])
+                    await asyncio.sleep(backoff_delay(attempt, **RETRY_BACKOFF))
                 except Exception as e:
+                    # Réponse vide ou bloquée : les tokens facturés sont perdus
+                    self._record_usage(response, wasted=True)
                     if attempt == 2:
                         raise e
+                    await asyncio.sleep(backoff_delay(attempt, **RETRY_BACKOFF))
             
         return {
+                "success": False,
                 "error": "Max retries exceeded",
                 "suggestion": "Try a simpler query or different metrics"
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional
+from app.services.metrics import metrics
+from app.utils.normalizers import normalize_prompt, cache_key
+
+ANSWERS_DIR = "answers"
+WARMUP_LOCK_FILE = ".warmup.lock"
+
+
+def answer_key(prompt: str, repos: Optional[List[str]], timeframe) -> str:
+    """Clé d'une réponse pré-calculée (indépendante de la version, portée par le fichier)"""
+    return cache_key(normalize_prompt(prompt), sorted(r.lower() for r in repos or []), timeframe)
+
+
+class QueryLog:
+    """Journal des premières questions de session (JSON lines, partagé entre workers).
+    Ajouts sous verrou partagé, compactage sous verrou exclusif (fichier `<path>.lock`) :
+    aucune ligne d'un autre worker n'est perdue pendant la réécriture."""
+
+    def __init__(self, path: str, flush_every: int = 50):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer: List[str] = []
+        self._lock = Lock()
+
+    def record(self, prompt: str, repos: Optional[List[str]] = None, timeframe=None) -> bool:
+        """Ajoute l'entrée au tampon, sans I/O ; True quand le tampon est à écrire (flush, hors boucle)"""
+        entry = {
+            "ts": time.time(),
+            "prompt": prompt,
+            "repos": sorted(repos) if repos else None,
+            "timeframe": [t.isoformat() for t in timeframe] if timeframe else None
+        }
+        with self._lock:
+            self._buffer.append(json.dumps(entry, ensure_ascii=False))
+            return len(self._buffer) >= self.flush_every
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        # Un seul write en mode append : les lignes des workers ne s'entremêlent pas
+        with self._file_lock(exclusive=False), open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def top_queries(self, limit: int, min_count: int, since_days: float) -> List[Dict]:
+        """Questions normalisées les plus fréquentes sur la période, avec une formulation représentative"""
+        self.flush()
+        cutoff = time.time() - since_days * 86400
+        counts, representative, kept = Counter(), {}, []
+        # Lecture et compactage sous verrou exclusif : les ajouts des autres workers attendent
+        with self._file_lock(exclusive=True):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if entry.get("ts", 0) < cutoff:
+                            continue
+                        kept.append(line)
+                        key = (normalize_prompt(entry["prompt"]), tuple(entry.get("repos") or ()),
+                               tuple(entry.get("timeframe") or ()))
+                        counts[key] += 1
+                        representative.setdefault(key, entry)
+            except OSError:
+                return []
+
+            # Compactage : les entrées hors période ne sont pas conservées
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.path)
+
+        return [
+            {**representative[key], "count": count}
+            for key, count in counts.most_common(limit) if count >= min_count
+        ]
+
+
+class AnswerStore:
+    """Réponses pré-calculées, un fichier par version de données :
+    une nouvelle version de l'index invalide les réponses de la précédente"""
+
+    def __init__(self, root: str):
+        self.root = os.path.join(root, ANSWERS_DIR)
+        self._version: Optional[str] = None
+        self._answers: Dict[str, Dict] = {}
+        self._mtime: Optional[float] = None
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, f"{version}.json")
+
+    def refresh(self, version: Optional[str]) -> None:
+        """Charge les réponses de `version` (rechargées si un autre worker les a mises à jour)"""
+        path = self.path(version) if version else None
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        if version == self._version and mtime == self._mtime:
+            return
+        answers = {}
+        if mtime is not None:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    answers = json.load(f)
+            except (OSError, ValueError):
+                answers = {}
+        self._version, self._answers, self._mtime = version, answers, mtime
+
+    def get(self, version: Optional[str], key: str) -> Optional[Dict]:
+        if version is None or version != self._version:
+            return None
+        return self._answers.get(key)
+
+    def load(self, version: str) -> Dict[str, Dict]:
+        self.refresh(version)
+        return dict(self._answers) if version == self._version else {}
+
+    def save(self, version: str, answers: Dict[str, Dict]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path(version)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(answers, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path(version))
+        self.refresh(version)
+
+    def prune(self, keep: List[str]) -> None:
+        """Supprime les réponses des versions qui ne sont plus disponibles"""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.endswith(".json") and name[:-len(".json")] not in keep:
+                os.remove(os.path.join(self.root, name))
+
+    @property
+    def size(self) -> int:
+        return len(self._answers)
+
+
+async def warm_up_answers(service, query_log: QueryLog, store: AnswerStore, version: str,
+                          top_n: int, min_count: int, per_minute: float, log_days: float) -> int:
+    """Régénère les réponses des questions fréquentes pour `version`, à débit contrôlé.
+    Un seul worker s'en charge (verrou fichier) ; les autres relisent le fichier publié."""
+    from app.schemas import GitHubQuery
+    from app.services.rate_limiter import OverloadedError
+
+    os.makedirs(store.root, exist_ok=True)
+    with open(os.path.join(store.root, WARMUP_LOCK_FILE), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+
+        try:
+            queries = await asyncio.to_thread(query_log.top_queries, top_n, min_count, log_days)
+            answers = store.load(version)  # Reprise d'un warm-up interrompu
+            interval = 60.0 / per_minute if per_minute > 0 else 0
+            generated = 0
+            print(f"🔥 Warm-up des réponses : {len(queries)} questions fréquentes pour la version {version}")
+
+            for entry in queries:
+                if service.data_version != version:
+                    print("⚠️ Nouvelle version publiée, warm-up interrompu")
+                    break
+                try:
+                    query = GitHubQuery(prompt=entry["prompt"], repos=entry.get("repos"),
+                                        timeframe=entry.get("timeframe"))
+                except ValueError:
+                    continue
+                key = answer_key(query.prompt, query.repos, query.timeframe)
+                if key in answers:
+                    continue
+                try:
+                    formatted = await service.precompute_answer(query, version)
+                except OverloadedError as e:
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                except Exception as e:
+                    metrics.incr("answer_warmup_failures")
+                    print(f"⚠️ Warm-up en échec pour « {query.prompt[:60]} » : {e}")
+                    continue
+
+                if formatted and formatted.get("success"):
+                    answers[key] = {
+                        "type": formatted["type"],
+                        "content": formatted["content"],
+                        "prompt": query.prompt,
+                        "generated_at": datetime.utcnow().isoformat()
+                    }
+                    generated += 1
+                    metrics.incr("answer_warmup_generated")
+                    if generated % 10 == 0:
+                        store.save(version, answers)  # Publication progressive
+                await asyncio.sleep(interval)
+
+            store.save(version, answers)
+            print(f"✅ Warm-up terminé : {generated} réponses générées, {len(answers)} disponibles")
+            return generated
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,207 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import orjson
+from pydantic import ValidationError
+from app.config import CHAT_CHANNEL
+from app.schemas import GitHubQuery
+from app.services.memory_service import history_since
+from app.services.metrics import metrics
+from app.services.rate_limiter import OverloadedError
+
+# Mêmes options que ORJSONResponse (graphiques avec valeurs numpy)
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Code de fermeture : client trop lent à lire ses messages
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class ChatConnection:
+    """Connexion WebSocket d'une session de chat.
+    Session, tenant et client sont fixés à l'ouverture. Les questions (identifiées par `id`)
+    sont traitées en parallèle et leurs messages (graphiques partiels, texte en cours de génération,
+    réponse, erreur) sont envoyés dans l'ordre où ils sont prêts : une réponse lente ne bloque pas
+    les suivantes. Les messages `delta` portent les fragments du texte Gemini ; un nouveau numéro
+    `attempt` (réponse mal formatée regénérée) remplace le texte reçu jusque-là.
+
+    Client -> serveur : {"type": "query", "id", "prompt", "repos"?, "timeframe"?} | {"type": "cancel", "id"}
+                        | {"type": "ping"}
+    Serveur -> client : session, partial, delta, answer, error, cancelled, data_version, chart_update, pong"""
+
+    def __init__(self, websocket, ai_service, rate_limiter, session_id: str, tenant: Optional[str],
+                 client: str, data_version: Optional[str]):
+        self.websocket = websocket
+        self.ai_service = ai_service
+        self.rate_limiter = rate_limiter
+        self.session_id = session_id
+        self.tenant = tenant
+        self.client = client
+        self.data_version = data_version
+        self.closed_by_server = False
+        self._closing = False  # Fermeture en cours : plus aucun message mis en file
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=CHAT_CHANNEL["send_queue"])
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # id de question -> {"query", "query_type"} : graphiques exacts rafraîchis à chaque version
+        self._live: "OrderedDict[str, Dict]" = OrderedDict()
+        self._writer: Optional[asyncio.Task] = None
+
+    async def run(self, since: int = 0) -> None:
+        """Envoie l'état de la session puis lit les messages jusqu'à la déconnexion"""
+        self.send({
+            "type": "session",
+            "session_id": self.session_id,
+            "tenant": self.tenant,
+            "data_version": self.data_version,
+            **history_since(self.session_id, since)
+        })
+        self._writer = asyncio.create_task(self._write())
+        reader = asyncio.create_task(self._read())
+        try:
+            done, _ = await asyncio.wait({reader, self._writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._closing = True
+            for task in [reader, self._writer, *self._tasks.values()]:
+                task.cancel()
+        for task in done:
+            # Déconnexion du client (WebSocketDisconnect) ou envoi impossible : fin normale du canal
+            if not task.cancelled() and task.exception() is not None:
+                metrics.incr("chat_disconnects")
+
+    def send(self, frame: Dict) -> None:
+        if self._closing:
+            return
+        try:
+            self._outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Le client ne lit plus : la connexion est fermée plutôt que de bufferiser sans limite
+            metrics.incr("chat_slow_consumers")
+            self.closed_by_server = True
+            if self._writer:
+                self._writer.cancel()
+
+    async def _write(self) -> None:
+        while True:
+            frame = await self._outbox.get()
+            await self.websocket.send_text(orjson.dumps(frame, option=_ORJSON_OPTIONS).decode())
+
+    async def _read(self) -> None:
+        while True:
+            text = await self.websocket.receive_text()
+            try:
+                message = orjson.loads(text)
+                kind = message.get("type")
+            except (orjson.JSONDecodeError, AttributeError):
+                self.send({"type": "error", "error": "Messages must be JSON objects"})
+                continue
+            metrics.incr("chat_messages")
+            if kind == "query":
+                self._submit(message)
+            elif kind == "cancel":
+                task = self._tasks.get(str(message.get("id")))
+                if task:
+                    task.cancel()
+            elif kind == "ping":
+                self.send({"type": "pong"})
+            else:
+                self.send({"type": "error", "error": f"Unknown message type '{kind}'"})
+
+    def _submit(self, message: Dict) -> None:
+        request_id = str(message.get("id") or uuid.uuid4().hex[:8])
+        if request_id in self._tasks:
+            self.send({"type": "error", "id": request_id, "error": "A query with this id is already running"})
+            return
+        if len(self._tasks) >= CHAT_CHANNEL["max_in_flight"]:
+            self.send({"type": "error", "id": request_id, "error": "Too many queries in flight on this connection",
+                       "error_type": "OverloadedError"})
+            return
+        try:
+            self.rate_limiter.check(self.client)
+            query = GitHubQuery(
+                prompt=message.get("prompt", ""),
+                repos=message.get("repos"),
+                timeframe=message.get("timeframe"),
+                session_id=self.session_id,
+                tenant=self.tenant
+            )
+        except OverloadedError as e:
+            self.send({"type": "error", "id": request_id, "error": str(e), "error_type": "OverloadedError",
+                       "retry_after": e.retry_after})
+            return
+        except ValidationError as e:
+            self.send({"type": "error", "id": request_id, "error": str(e), "error_type": "ValidationError"})
+            return
+        task = asyncio.create_task(self._answer(request_id, query))
+        self._tasks[request_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(request_id, None))
+
+    async def _answer(self, request_id: str, query: GitHubQuery) -> None:
+        def partial(query_type, contexts: List[Dict], version: Optional[str]) -> None:
+            self._track(request_id, query, query_type)
+            self.send({"type": "partial", "id": request_id, "data_version": version, "contexts": contexts})
+
+        def delta(attempt: int, text: str) -> None:
+            self.send({"type": "delta", "id": request_id, "attempt": attempt, "text": text})
+
+        try:
+            result = await self.ai_service.generate_response(query, on_aggregates=partial, on_text=delta)
+            self.send({"type": "answer", "id": request_id, **result})
+            metrics.incr("chat_answers")
+        except asyncio.CancelledError:
+            self.send({"type": "cancelled", "id": request_id})
+            raise  # La tâche reste annulée (annulation client ou fermeture du canal)
+        except OverloadedError as e:
+            self.send({"type": "error", "id": request_id, "error": str(e), "error_type": "OverloadedError",
+                       "retry_after": e.retry_after})
+        except Exception as e:
+            self.send({"type": "error", "id": request_id, "error": str(e), "error_type": type(e).__name__})
+
+    def _track(self, request_id: str, query: GitHubQuery, query_type) -> None:
+        self._live[request_id] = {"query": query, "query_type": query_type}
+        self._live.move_to_end(request_id)
+        while len(self._live) > CHAT_CHANNEL["live_charts"]:
+            self._live.popitem(last=False)
+
+    async def refresh(self) -> None:
+        """Nouvelle version de l'index du tenant (documents, KPI, agrégats) : notification
+        puis graphiques exacts recalculés et poussés"""
+        index = self.ai_service.loaded_index(self.tenant)
+        if index is None or index[0] is None or index[1] == self.data_version:
+            return
+        store, version = index
+        self.data_version = version
+        self.send({"type": "data_version", "data_version": version})
+        for request_id, live in list(self._live.items()):
+            contexts = await asyncio.to_thread(
+                self.ai_service.aggregate_charts, store, live["query"], live["query_type"]
+            )
+            self.send({"type": "chart_update", "id": request_id, "data_version": version, "contexts": contexts})
+            metrics.incr("chat_chart_refreshes")
+
+
+class ChatHub:
+    """Connexions WebSocket ouvertes sur ce worker"""
+
+    def __init__(self):
+        self._connections: Set[ChatConnection] = set()
+
+    def register(self, connection: ChatConnection) -> None:
+        self._connections.add(connection)
+
+    def unregister(self, connection: ChatConnection) -> None:
+        self._connections.discard(connection)
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    async def push_versions(self) -> None:
+        """Appelé après chaque bascule possible (watcher, rechargement admin)"""
+        for connection in list(self._connections):
+            try:
+                await connection.refresh()
+            except Exception as e:
+                print(f"⚠️ Rafraîchissement de la session {connection.session_id} impossible : {e}")
+
+
+# Singleton du worker
+chat_hub = ChatHub()
@@ -0,0 +1,318 @@
+import csv
+import io
+import uuid
+from threading import Lock
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.config import EXPORT
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+# Lignes brutes de l'entrepôt : requête (alias r = repo_dim), colonne de période, colonnes (nom, type)
+RAW_DATASETS = {
+    "commits": {
+        "sql": """
+            SELECT c.commit_id, r.name AS repo, u.login AS author, c.commit_timestamp
+            FROM commit_dim c
+            JOIN repo_dim r ON r.repo_id = c.repo_id
+            LEFT JOIN user_dim u ON u.user_id = c.author_id
+            WHERE TRUE {filters}
+            ORDER BY c.commit_timestamp
+        """,
+        "time_column": "c.commit_timestamp",
+        "columns": [("commit_id", "string"), ("repo", "string"), ("author", "string"),
+                    ("commit_timestamp", "timestamp")],
+    },
+    "pull_requests": {
+        "sql": """
+            SELECT pr.pull_request_id, r.name AS repo, u.login AS author, pr.created_at, pr.merged_at
+            FROM pull_request_dim pr
+            JOIN repo_dim r ON r.repo_id = pr.repo_id
+            LEFT JOIN user_dim u ON u.user_id = pr.author_id
+            WHERE TRUE {filters}
+            ORDER BY pr.created_at
+        """,
+        "time_column": "pr.created_at",
+        "columns": [("pull_request_id", "string"), ("repo", "string"), ("author", "string"),
+                    ("created_at", "timestamp"), ("merged_at", "timestamp")],
+    },
+    "issues": {
+        "sql": """
+            SELECT i.issue_id, r.name AS repo, u.login AS author, i.title, i.created_at
+            FROM issue_dim i
+            JOIN repo_dim r ON r.repo_id = i.repo_id
+            LEFT JOIN user_dim u ON u.user_id = i.author_id
+            WHERE TRUE {filters}
+            ORDER BY i.created_at
+        """,
+        "time_column": "i.created_at",
+        "columns": [("issue_id", "string"), ("repo", "string"), ("author", "string"),
+                    ("title", "string"), ("created_at", "timestamp")],
+    },
+    "builds": {
+        "sql": """
+            SELECT b.build_id, r.name AS repo, b.status, b.{build_column}
+            FROM ci_build b
+            JOIN repo_dim r ON r.repo_id = b.repo_id
+            WHERE TRUE {filters}
+            ORDER BY b.{build_column}
+        """,
+        "time_column": "b.{build_column}",
+        "columns": [("build_id", "string"), ("repo", "string"), ("status", "string"),
+                    ("started_at", "timestamp")],
+    },
+}
+
+# Agrégats de WAREHOUSE_QUERIES (ceux indexés dans le vector store), sans échantillonnage
+AGGREGATE_COLUMNS = {
+    "repositories": [("repo_id", "string"), ("name", "string"), ("language", "string"), ("url", "string"),
+                     ("commit_count", "int"), ("avg_merge_time", "float"), ("avg_reopened_issues", "float"),
+                     ("avg_review_delay", "float"), ("code_coverage", "float"), ("total_builds", "int"),
+                     ("build_success_rate", "float")],
+    "developers": [("user_id", "string"), ("login", "string"), ("name", "string"), ("repo_name", "string"),
+                   ("commits", "int"), ("pull_requests", "int"), ("issues_created", "int"),
+                   ("avg_pr_duration_hours", "float")],
+    "trends": [("repo_name", "string"), ("month", "timestamp"), ("monthly_commits", "int"),
+               ("active_developers", "int")],
+    "quality_metrics": [("repo_name", "string"), ("avg_bugs", "float"), ("avg_vulnerabilities", "float"),
+                        ("avg_code_smells", "float"), ("avg_coverage", "float")],
+    "kpi_status": [("repo_name", "string"), ("pr_merge_time_avg", "float"), ("reopened_issues", "float"),
+                   ("review_delay_avg", "float"), ("merge_time_status", "string"), ("reopened_status", "string")],
+}
+
+EXPORT_DATASETS = tuple(RAW_DATASETS) + tuple(AGGREGATE_COLUMNS)
+
+
+class ExportError(ValueError):
+    """Paramètres d'export invalides (jeu de données, format, filtre non supporté)"""
+
+
+def _convert(value, kind: str):
+    """Valeur PostgreSQL (Decimal, date...) ou SQLite (chaîne ISO) vers le type de la colonne"""
+    if value is None:
+        return None
+    if kind == "string":
+        return str(value)
+    if kind == "int":
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+class RowExport:
+    """Requête d'export ouverte sur un curseur serveur : les lignes sont lues par lots de `batch_rows`"""
+
+    def __init__(self, dataset: str, repos: Optional[List[str]] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None):
+        if dataset not in EXPORT_DATASETS:
+            raise ExportError(f"Unknown dataset '{dataset}', expected one of {', '.join(EXPORT_DATASETS)}")
+        if dataset in AGGREGATE_COLUMNS and (start or end):
+            raise ExportError(f"'{dataset}' is a fixed-window aggregate, start/end only apply to raw rows")
+        if dataset in AGGREGATE_COLUMNS and EXPORT["snapshot_path"]:
+            # WAREHOUSE_QUERIES sont écrites pour PostgreSQL (DATE_TRUNC, INTERVAL, array_to_string)
+            raise ExportError(f"'{dataset}' is a warehouse aggregate, not available from the SQLite snapshot")
+        self.dataset = dataset
+        self.batch_rows = EXPORT["batch_rows"]
+        self.columns = RAW_DATASETS[dataset]["columns"] if dataset in RAW_DATASETS else AGGREGATE_COLUMNS[dataset]
+        self.conn, self.cursor = self._open(repos, start, end)
+        self.closed = False
+
+    def _open(self, repos, start, end):
+        from app.github_vectors_creator import get_db_connection, _placeholder, ROLLUP_SOURCES
+
+        if EXPORT["snapshot_path"]:
+            import sqlite3
+
+            # Le générateur de réponse avance dans les threads du pool : connexion partagée entre threads
+            conn = sqlite3.connect(EXPORT["snapshot_path"], check_same_thread=False)
+            cursor = conn.cursor()  # sqlite3 lit les lignes à la demande
+        else:
+            conn = get_db_connection()
+            conn.set_session(readonly=True)
+            # Curseur nommé = curseur côté serveur : PostgreSQL envoie les lignes par paquets de itersize
+            cursor = conn.cursor(name=f"export_{self.dataset}_{uuid.uuid4().hex[:8]}")
+            cursor.itersize = self.batch_rows
+
+        mark = _placeholder(conn)
+        filters, params = [], []
+        if repos:
+            filters.append(f"AND r.name IN ({', '.join([mark] * len(repos))})")
+            params.extend(repos)
+        if self.dataset in RAW_DATASETS:
+            spec = RAW_DATASETS[self.dataset]
+            build_column = ROLLUP_SOURCES["builds"][1]
+            time_column = spec["time_column"].format(build_column=build_column)
+            if start:
+                filters.append(f"AND {time_column} >= {mark}")
+                params.append(start)
+            if end:
+                filters.append(f"AND {time_column} < {mark}")
+                params.append(end)
+            sql = spec["sql"].format(filters=" ".join(filters), build_column=build_column)
+        else:
+            from app.github_vectors_creator import WAREHOUSE_QUERIES
+
+            sql = WAREHOUSE_QUERIES[self.dataset].format(repo_filter=" ".join(filters))
+        try:
+            cursor.execute(sql, tuple(params))
+        except Exception:
+            conn.close()
+            raise
+        return conn, cursor
+
+    def batches(self) -> Iterator[List[Tuple]]:
+        """Lots de lignes converties ; la connexion est fermée en fin de lecture ou d'abandon"""
+        kinds = [kind for _, kind in self.columns]
+        try:
+            while True:
+                rows = self.cursor.fetchmany(self.batch_rows)
+                if not rows:
+                    break
+                yield [tuple(_convert(v, kind) for v, kind in zip(row, kinds)) for row in rows]
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.cursor.close()
+        finally:
+            self.conn.close()
+
+
+class ExportStream:
+    """Octets d'un export. close() libère le curseur serveur même si le flux n'a pas
+    été lu jusqu'au bout (déconnexion du client), y compris avant le premier lot.
+    Lecture et fermeture peuvent venir de threads différents : elles sont sérialisées."""
+
+    def __init__(self, export: RowExport, chunks: Iterator[bytes]):
+        self.export = export
+        self._chunks = chunks
+        self._lock = Lock()
+
+    def __iter__(self) -> "ExportStream":
+        return self
+
+    def __next__(self) -> bytes:
+        with self._lock:
+            return next(self._chunks)
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._chunks.close()
+            finally:
+                self.export.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Flux en écriture seule dont les octets sont récupérés et vidés après chaque lot"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_schema(columns: List[Tuple[str, str]]):
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(), "timestamp": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _record_batch(rows: List[Tuple], schema):
+    import pyarrow as pa
+
+    return pa.record_batch(
+        [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)],
+        schema=schema
+    )
+
+
+def stream_csv(export: RowExport) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in export.columns])
+    for rows in export.batches():
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")  # En-tête seul si aucune ligne
+
+
+def stream_arrow(export: RowExport) -> Iterator[bytes]:
+    """Format IPC stream : schéma puis un RecordBatch par lot"""
+    import pyarrow as pa
+
+    schema = _arrow_schema(export.columns)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in export.batches():
+            writer.write_batch(_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()  # Marqueur de fin de flux
+
+
+def stream_parquet(export: RowExport) -> Iterator[bytes]:
+    """Un row group par lot ; le footer (métadonnées) est écrit à la fermeture"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(export.columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in export.batches():
+            writer.write_table(pa.Table.from_batches([_record_batch(rows, schema)]))
+            yield sink.drain()
+    yield sink.drain()
+
+
+STREAMERS = {"arrow": stream_arrow, "parquet": stream_parquet, "csv": stream_csv}
+
+
+def open_export(dataset: str, export_format: str, repos: Optional[List[str]] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[ExportStream, Dict]:
+    """Exécute la requête (erreurs SQL levées avant l'envoi des en-têtes) et retourne
+    le flux d'octets et les en-têtes HTTP"""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format '{export_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+    if export_format != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError(f"Format '{export_format}' requires pyarrow, use format=csv")
+    export = RowExport(dataset, repos, start, end)
+    media_type, extension = EXPORT_FORMATS[export_format]
+    headers = {
+        "Content-Type": media_type,
+        "Content-Disposition": f'attachment; filename="{dataset}.{extension}"',
+    }
+    return ExportStream(export, STREAMERS[export_format](export)), headers
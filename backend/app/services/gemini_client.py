@@ -0,0 +1,86 @@
+import asyncio
+import inspect
+from threading import Lock
+from typing import Dict, List, Optional
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.api_core.exceptions import ResourceExhausted
+from app.config import GEMINI_API_KEY, GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME, GEMINI_TRANSPORT, GEMINI_CONCURRENCY
+from app.services.rate_limiter import AIMDLimiter
+
+# Concurrence adaptative commune à tous les appels Gemini du worker
+# (génération, classification, embeddings des requêtes et de la construction d'index)
+gemini_limiter = AIMDLimiter(
+    initial=GEMINI_CONCURRENCY["initial"],
+    minimum=GEMINI_CONCURRENCY["min"],
+    maximum=GEMINI_CONCURRENCY["max"],
+    acquire_timeout=GEMINI_CONCURRENCY["acquire_timeout"],
+    max_waiting=GEMINI_CONCURRENCY["max_waiting"],
+    overload_errors=(ResourceExhausted,)
+)
+
+
+class GeminiClient:
+    """Client Gemini unique par worker : SDK configuré une seule fois, modèles et
+    canaux gRPC/HTTP réutilisés d'une requête à l'autre"""
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, transport: str = GEMINI_TRANSPORT):
+        genai.configure(api_key=api_key, transport=transport)
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._lock = Lock()
+
+    def model(self, name: str = GEMINI_MODEL_NAME) -> genai.GenerativeModel:
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = genai.GenerativeModel(model_name=name)
+            return self._models[name]
+
+    def embed(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Un seul appel d'embedding pour un lot de textes (appel bloquant : depuis un thread)"""
+        if not texts:
+            return []
+        with gemini_limiter.blocking_slot():
+            return genai.embed_content(model=EMBEDDING_MODEL_NAME, content=texts, task_type=task_type)["embedding"]
+
+    async def warm_up(self) -> None:
+        """Ouvre les connexions (TLS, canal async de la boucle courante) avant la première requête"""
+        await asyncio.gather(
+            self.model().count_tokens_async("warm-up"),
+            asyncio.to_thread(self.embed, ["warm-up"], "retrieval_query")
+        )
+
+    async def aclose(self) -> None:
+        """Ferme les canaux gRPC/HTTP des clients de service du SDK (partagés par les modèles)"""
+        clients = genai_client._client_manager.clients
+        for service, service_client in list(clients.items()):
+            transport = getattr(service_client, "transport", None)
+            try:
+                closing = transport.close() if transport is not None else None
+                if inspect.isawaitable(closing):
+                    await closing  # Transport grpc_asyncio
+            except Exception as e:
+                print(f"⚠️ Fermeture du client Gemini '{service}' impossible : {e}")
+        clients.clear()
+        self._models.clear()
+
+
+_client: Optional[GeminiClient] = None
+_client_lock = Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """Client partagé du worker (créé au démarrage FastAPI, ou à la demande pour les scripts)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
+
+
+async def close_gemini_client() -> None:
+    """Arrêt du worker : connexions fermées, un prochain appel recrée le client"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        await client.aclose()
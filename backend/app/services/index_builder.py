@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+import time
+import fcntl
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from app.services.vector_store_manager import current_version
+
+LOCK_FILE = ".build.lock"
+PROGRESS_FILE = ".build_progress.json"
+POLL_INTERVAL = 5  # Secondes entre deux vérifications quand un autre worker construit l'index
+
+
+def _write_progress(root: str, **fields) -> None:
+    """Progression partagée entre workers (fichier remplacé atomiquement)"""
+    tmp_path = os.path.join(root, f"{PROGRESS_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({**fields, "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, os.path.join(root, PROGRESS_FILE))
+
+
+def build_status(root: str) -> Optional[Dict]:
+    """Dernier état de construction connu (None si aucune construction n'a eu lieu)"""
+    try:
+        with open(os.path.join(root, PROGRESS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _try_lock(lock) -> bool:
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _build_with_lock(root: str, on_ready: Callable[[str], None]) -> None:
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), "w") as lock:
+        if not _try_lock(lock):
+            # Un autre worker construit l'index : on attend sa publication ou la libération du verrou
+            print("⏳ Vector store en cours de génération par un autre worker...")
+            waiting_since = datetime.utcnow().isoformat()
+            while not _try_lock(lock):
+                if current_version(root) is not None:
+                    on_ready(current_version(root))
+                    return
+                time.sleep(POLL_INTERVAL)
+            status = build_status(root) or {}
+            if (current_version(root) is None and status.get("state") == "failed"
+                    and status.get("updated_at", "") >= waiting_since):
+                # Pas de nouvelle tentative par worker : l'échec serait répété autant de fois
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                print("⚠️ Génération en échec sur un autre worker, démarrage en mode dégradé")
+                return
+            # Verrou libéré sans publication ni échec signalé (worker arrêté) : la génération est reprise ici
+
+        try:
+            # L'index a pu être publié pendant l'attente du verrou
+            version = current_version(root)
+            if version is None:
+                from app.github_vectors_creator import generate_vector_store
+
+                print("🚀 Index FAISS absent, génération du vector store en arrière-plan...")
+                _write_progress(root, state="building", embedded=0, total=None)
+                version = generate_vector_store(
+                    progress_callback=lambda done, total: _write_progress(
+                        root, state="building", embedded=done, total=total
+                    )
+                )
+                status = build_status(root) or {}
+                _write_progress(root, state="ready", embedded=status.get("embedded"),
+                                total=status.get("total"), version=version)
+                print("✅ Vector store généré avec succès !")
+        except Exception as e:
+            _write_progress(root, state="failed", error=str(e))
+            print(f"❌ Échec de la génération du vector store : {e}")
+            return
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    on_ready(version)
+
+
+def start_background_build(root: str, on_ready: Callable[[str], None]) -> threading.Thread:
+    """Lance la génération de l'index dans un thread ; un seul worker la réalise (verrou fichier)"""
+    thread = threading.Thread(
+        target=_build_with_lock, args=(root, on_ready),
+        name="vector-store-build", daemon=True
+    )
+    thread.start()
+    return thread
@@ -1,22 +1,87 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
+from datetime import datetime
 
 
 conversation_memory: Dict[str, Dict] = {}
 
+SUMMARY_MAX_CHARS = 300  # Résumé conservé par tour (le JSON complet n'est pas ré-injecté)
+
 def get_conversation_state(session_id: str = None) -> Dict:
     if not session_id:
         session_id = str(uuid4())
-    
+
     if session_id not in conversation_memory:
         conversation_memory[session_id] = {
             "history": [],
+            "charts": {},  # chart_ref -> graphique complet
+            "cursor": 0,   # Numéro du dernier tour (croissant, survit à la troncature)
             "context_window": 3
         }
-    
+
     return conversation_memory[session_id]
 
 def update_conversation_state(session_id: str, state: Dict):
     if len(state["history"]) > state["context_window"]:
         state["history"] = state["history"][-state["context_window"]:]
-    conversation_memory[session_id] = state
\ No newline at end of file
+        # Seuls les graphiques encore référencés par l'historique sont conservés
+        referenced = {turn["chart_ref"] for turn in state["history"] if turn.get("chart_ref")}
+        state["charts"] = {ref: chart for ref, chart in state["charts"].items() if ref in referenced}
+    conversation_memory[session_id] = state
+
+def _truncate(text: str) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= SUMMARY_MAX_CHARS else text[:SUMMARY_MAX_CHARS - 1] + "…"
+
+def summarize_response(content: Any) -> Tuple[str, Optional[Dict]]:
+    """Résumé court d'une réponse et graphique éventuel"""
+    if isinstance(content, dict):
+        chart = content.get("chart") if isinstance(content.get("chart"), dict) else None
+        summary = content.get("analysis") or (chart or {}).get("title") or ""
+        return _truncate(summary), chart
+    if isinstance(content, list):
+        return _truncate("; ".join(str(item) for item in content)), None
+    return _truncate(content), None
+
+def append_turn(state: Dict, role: str, content: Any, response_type: Optional[str] = None) -> Dict:
+    """Ajoute un tour compact (rôle, résumé, référence de graphique) à la session"""
+    state["cursor"] += 1
+    summary, chart = summarize_response(content) if role == "assistant" else (_truncate(content), None)
+    turn = {
+        "seq": state["cursor"],
+        "role": role,
+        "summary": summary,
+        "timestamp": datetime.now().isoformat()
+    }
+    if response_type:
+        turn["response_type"] = response_type
+    if chart:
+        turn["chart_ref"] = f"c{state['cursor']}"
+        turn["chart_type"] = chart.get("type")
+        state["charts"][turn["chart_ref"]] = chart
+    state["history"].append(turn)
+    return turn
+
+def format_history(turns: List[Dict]) -> str:
+    """Historique pour le prompt : une ligne lisible par tour, sans JSON brut"""
+    lines = []
+    for turn in turns:
+        line = f"{turn['role']}: {turn['summary']}"
+        if turn.get("chart_ref"):
+            line += f" [graphique {turn.get('chart_type')}]"
+        lines.append(line)
+    return "\n".join(lines)
+
+def history_since(session_id: str, cursor: int = 0, include_charts: bool = False) -> Dict:
+    """Tours postérieurs à `cursor` (ceux encore dans la fenêtre de contexte)"""
+    state = conversation_memory.get(session_id)
+    if state is None:
+        return {"history": [], "history_cursor": 0}
+    turns = [turn for turn in state["history"] if turn["seq"] > cursor]
+    result = {"history": turns, "history_cursor": state["cursor"]}
+    if include_charts:
+        result["charts"] = {
+            turn["chart_ref"]: state["charts"].get(turn["chart_ref"])
+            for turn in turns if turn.get("chart_ref")
+        }
+    return result
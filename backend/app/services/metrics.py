@@ -0,0 +1,26 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+
+class Metrics:
+    """Compteurs en mémoire du worker (exposés par GET /metrics)"""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._lock = Lock()
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+
+# Singleton partagé par les services
+metrics = Metrics()
@@ -0,0 +1,180 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.config import PROFILE_SAMPLE_INTERVAL, PROFILE_HISTORY, PROFILE_TOP_N
+
+# Profil de la requête en cours (None hors profilage : stage() ne coûte qu'un get())
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_NOOP = nullcontext()
+PROFILE_MODES = ("sampling", "cprofile")
+_active_lock = threading.Lock()  # Un seul profilage à la fois (profileurs et tracemalloc globaux)
+
+# Derniers profils, consultables via /admin/profiles
+recent_profiles: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+class ProfilingBusyError(RuntimeError):
+    pass
+
+
+def stage(name: str):
+    """Mesure une étape du pipeline si la requête courante est profilée"""
+    profile = _current.get()
+    return profile.stage(name) if profile is not None else _NOOP
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """Échantillonne les piles de tous les threads (boucle asyncio et to_thread)"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfile:
+    def __init__(self, mode: str, label: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.label = label
+        self.stages: List[Dict] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        mem_before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stages.append({
+                "stage": name,
+                "start_ms": round((start - self._start) * 1000, 2),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "memory_delta_kb": round((current - mem_before) / 1024, 1),
+                "peak_kb": round(peak / 1024, 1)
+            })
+
+
+def _top_functions(profiler: cProfile.Profile, limit: int) -> List[Dict]:
+    stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats("cumulative")
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in list(stats.stats.items()):
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3)
+        })
+    return sorted(rows, key=lambda r: r["cumtime_ms"], reverse=True)[:limit]
+
+
+def _top_allocations(before, after, limit: int) -> List[Dict]:
+    return [
+        {
+            "location": str(stat.traceback[0]),
+            "size_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff
+        }
+        for stat in after.compare_to(before, "lineno")[:limit]
+    ]
+
+
+async def profile_request(factory, mode: str = "sampling", label: str = "") -> tuple:
+    """Exécute `factory()` sous profileur (échantillonnage ou cProfile) et tracemalloc.
+    Retourne (résultat, rapport). Les autres requêtes concurrentes du worker
+    apparaissent aussi dans les piles : profiler de préférence hors pic."""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profiling mode '{mode}'")
+    if not _active_lock.acquire(blocking=False):
+        raise ProfilingBusyError("Another request is already being profiled")
+
+    profile = RequestProfile(mode, label)
+    token = _current.set(profile)
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    sampler = _Sampler(PROFILE_SAMPLE_INTERVAL) if mode == "sampling" else None
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+    try:
+        if sampler:
+            sampler.start()
+        if profiler:
+            profiler.enable()
+        try:
+            result = await factory()
+        finally:
+            if profiler:
+                profiler.disable()
+            if sampler:
+                sampler.stop()
+            snapshot_after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+    finally:
+        _current.reset(token)
+        _active_lock.release()
+
+    report = {
+        "profile_id": profile.id,
+        "label": profile.label,
+        "mode": mode,
+        "created_at": datetime.utcnow().isoformat(),
+        "total_ms": round((time.perf_counter() - profile._start) * 1000, 2),
+        "stages": profile.stages,
+        "peak_memory_kb": round(peak / 1024, 1),
+        "top_allocations": _top_allocations(snapshot_before, snapshot_after, PROFILE_TOP_N)
+    }
+    if sampler:
+        # Format « collapsed » (flamegraph.pl, speedscope) : "pile;appel;... compte"
+        report["samples"] = sampler.samples
+        report["collapsed_stacks"] = [f"{stack} {count}" for stack, count in sampler.stacks.most_common()]
+    if profiler:
+        report["top_functions"] = _top_functions(profiler, PROFILE_TOP_N)
+
+    recent_profiles[profile.id] = report
+    while len(recent_profiles) > PROFILE_HISTORY:
+        recent_profiles.popitem(last=False)
+    return result, report
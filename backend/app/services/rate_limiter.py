@@ -0,0 +1,202 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from threading import Lock
+from typing import Tuple, Type
+from app.services.metrics import metrics
+
+
+class OverloadedError(Exception):
+    """Surcharge : la requête est refusée immédiatement plutôt que mise en attente"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons/seconde, rafale max `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def try_acquire(self, cost: float = 1) -> Tuple[bool, float]:
+        """Retourne (accepté, secondes avant que `cost` jetons soient disponibles)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return True, 0.0
+            return False, (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float = 1) -> None:
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class RateLimiter:
+    """Limitation par client et globale (requêtes/minute)"""
+
+    def __init__(self, per_client_per_minute: int, global_per_minute: int, max_clients: int = 10000):
+        self.per_client_per_minute = per_client_per_minute
+        self.global_bucket = TokenBucket(global_per_minute / 60, global_per_minute)
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = Lock()
+
+    def _bucket(self, client_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._clients.get(client_id)
+            if bucket is None:
+                rate = self.per_client_per_minute
+                bucket = TokenBucket(rate / 60, rate)
+                self._clients[client_id] = bucket
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)  # Client le plus ancien
+            else:
+                self._clients.move_to_end(client_id)
+            return bucket
+
+    def check(self, client_id: str, cost: int = 1) -> None:
+        """Lève OverloadedError si le client ou le service dépasse sa limite"""
+        if cost > self.per_client_per_minute:
+            raise OverloadedError("Request cost exceeds per-client limit", retry_after=60)
+
+        bucket = self._bucket(client_id)
+        allowed, retry_after = bucket.try_acquire(cost)
+        if not allowed:
+            metrics.incr("rate_limited_client")
+            raise OverloadedError("Client rate limit exceeded", retry_after=retry_after)
+
+        allowed, retry_after = self.global_bucket.try_acquire(cost)
+        if not allowed:
+            # Requête refusée : le quota du client n'est pas consommé
+            bucket.refund(cost)
+            metrics.incr("rate_limited_global")
+            raise OverloadedError("Service rate limit exceeded", retry_after=retry_after)
+
+
+class AIMDLimiter:
+    """Concurrence adaptative (AIMD) sur les appels sortants :
+    +1/limite à chaque succès, division sur surcharge du fournisseur.
+    État porté par la boucle d'événements du worker ; les appels synchrones faits depuis
+    des threads (pool, construction d'index) passent par blocking_slot()."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int,
+                 acquire_timeout: float, max_waiting: int,
+                 overload_errors: Tuple[Type[BaseException], ...] = (),
+                 decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.acquire_timeout = acquire_timeout
+        self.max_waiting = max_waiting
+        self.overload_errors = overload_errors
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = None
+        self._loop = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Boucle du worker, avant les premiers appels synchrones depuis des threads"""
+        if loop is not self._loop:
+            self._loop, self._condition = loop, None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Créée paresseusement dans la boucle d'événements du worker
+        self.attach(asyncio.get_running_loop())
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _acquire(self) -> None:
+        condition = self._get_condition()
+        if self.in_flight >= int(self.limit) and self.waiting >= self.max_waiting:
+            metrics.incr("gemini_rejected")
+            raise OverloadedError("Too many pending model calls", retry_after=self.acquire_timeout)
+
+        async with condition:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout=self.acquire_timeout
+                )
+            except asyncio.TimeoutError:
+                metrics.incr("gemini_rejected")
+                raise OverloadedError("Model concurrency limit reached", retry_after=self.acquire_timeout)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def _release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_overload(self) -> None:
+        metrics.incr("gemini_overloaded")
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        try:
+            yield
+        except self.overload_errors:
+            self.on_overload()
+            raise
+        else:
+            self.on_success()
+        finally:
+            await self._release()
+
+    @contextmanager
+    def blocking_slot(self):
+        """slot() pour un appel synchrone fait depuis un thread : mêmes limite et compteurs
+        que les appels asynchrones. Sans boucle attachée (script hors API), pas de limite."""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            yield
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("blocking_slot() would block the event loop, use slot()")
+
+        acquired = asyncio.run_coroutine_threadsafe(self._acquire(), loop)
+        try:
+            acquired.result(timeout=self.acquire_timeout + 1)
+        except FutureTimeoutError:
+            acquired.cancel()  # Boucle bloquée ou en arrêt
+            raise OverloadedError("Model concurrency limit reached", retry_after=self.acquire_timeout)
+        try:
+            yield
+        except self.overload_errors:
+            self.on_overload()
+            raise
+        else:
+            self.on_success()
+        finally:
+            asyncio.run_coroutine_threadsafe(self._release(), loop)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponentiel avec jitter complet"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,192 @@
+import os
+import re
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from app.services.vector_store_manager import GRAPH_FILE
+
+PR_WEIGHT = 2.0        # Une pull request pèse plus qu'un commit dans le poids de contribution
+SIMILARITY_BLOCK = 1024  # Lignes de dépôts traitées par bloc (mémoire bornée)
+MAX_CHART_ITEMS = 100    # Limite des datasets (TechDataset)
+
+# Questions portant sur les relations entre dépôts / contributeurs
+_NETWORK_CUE = re.compile(
+    r"\b(?:network|related|similar|neighbou?rs?|graph|shared contributors?|réseau|liés|similaires)\b", re.I)
+_MATRIX_CUE = re.compile(
+    r"\b(?:contribut(?:or|ion)s? matrix|matrix|heatmap|who contributes|matrice|contributeurs)\b", re.I)
+
+_graphs: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def register_graph(store, graph: "RepoGraph") -> None:
+    _graphs[store] = graph
+
+
+def graph_for(store) -> Optional["RepoGraph"]:
+    return _graphs.get(store) if store is not None else None
+
+
+def requested_graph_charts(prompt: str) -> List[str]:
+    """Graphiques de relations demandés par la question (repo_network, contrib_matrix)"""
+    charts = []
+    if _NETWORK_CUE.search(prompt):
+        charts.append("repo_network")
+    if _MATRIX_CUE.search(prompt):
+        charts.append("contrib_matrix")
+    return charts
+
+
+class RepoGraph:
+    """Matrice creuse dépôt × contributeur et graphe de similarité des dépôts
+    (cosinus sur les contributeurs partagés, top-k voisins pré-calculés)"""
+
+    def __init__(self, repos: List[str], contributors: List[str], matrix: sparse.csr_matrix,
+                 neighbour_ids: np.ndarray, neighbour_scores: np.ndarray, neighbour_shared: np.ndarray):
+        self.repos = repos
+        self.contributors = contributors
+        self.matrix = matrix
+        self.neighbour_ids = neighbour_ids
+        self.neighbour_scores = neighbour_scores
+        self.neighbour_shared = neighbour_shared
+        self._repo_index = {name.lower(): i for i, name in enumerate(repos)}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, str, int, int]], top_k: int = 20) -> "RepoGraph":
+        """`rows` : (dépôt, contributeur, commits, pull requests)"""
+        repo_ids, contributor_ids, values = {}, {}, []
+        row_idx, col_idx = [], []
+        for repo, contributor, commits, pull_requests in rows:
+            if not repo or not contributor:
+                continue
+            row_idx.append(repo_ids.setdefault(repo, len(repo_ids)))
+            col_idx.append(contributor_ids.setdefault(contributor, len(contributor_ids)))
+            values.append((commits or 0) + PR_WEIGHT * (pull_requests or 0))
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype="float32"), (row_idx, col_idx)),
+            shape=(len(repo_ids), len(contributor_ids))
+        )
+        matrix.sum_duplicates()
+        ids, scores, shared = _top_neighbours(matrix, top_k)
+        return cls(list(repo_ids), list(contributor_ids), matrix, ids, scores, shared)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            os.path.join(path, GRAPH_FILE),
+            repos=np.asarray(self.repos, dtype=object),
+            contributors=np.asarray(self.contributors, dtype=object),
+            data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+            shape=np.asarray(self.matrix.shape),
+            neighbour_ids=self.neighbour_ids,
+            neighbour_scores=self.neighbour_scores,
+            neighbour_shared=self.neighbour_shared
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RepoGraph":
+        with np.load(os.path.join(path, GRAPH_FILE), allow_pickle=True) as f:
+            matrix = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            return cls(list(f["repos"]), list(f["contributors"]), matrix,
+                       f["neighbour_ids"], f["neighbour_scores"], f["neighbour_shared"])
+
+    def repo_id(self, repo: str) -> Optional[int]:
+        return self._repo_index.get(repo.lower())
+
+    def neighbours(self, repo: str, k: int = 10) -> List[Dict]:
+        """Dépôts les plus proches (contributeurs partagés), pré-calculés"""
+        i = self.repo_id(repo)
+        if i is None:
+            return []
+        return [
+            {
+                "repo": self.repos[j],
+                "similarity": round(float(score), 4),
+                "shared_contributors": int(shared)
+            }
+            for j, score, shared in zip(self.neighbour_ids[i][:k], self.neighbour_scores[i][:k],
+                                        self.neighbour_shared[i][:k])
+            if j >= 0
+        ]
+
+    def network(self, repos: List[str], k: int = 5) -> Optional[Dict]:
+        """Graphique repo_network : dépôts demandés et leurs k voisins.
+        Dataset 0 : contributeurs par nœud ; dataset 1 : arêtes (indices des labels)"""
+        seeds = [i for i in (self.repo_id(r) for r in repos) if i is not None]
+        if not seeds:
+            return None
+        nodes, edges = list(dict.fromkeys(seeds)), {}
+        for i in seeds:
+            for j, score in zip(self.neighbour_ids[i][:k], self.neighbour_scores[i][:k]):
+                if j < 0:
+                    continue
+                if j not in nodes:
+                    nodes.append(int(j))
+                edge = tuple(sorted((nodes.index(i), nodes.index(j))))
+                edges[edge] = max(edges.get(edge, 0.0), round(float(score), 4))
+        nodes = nodes[:MAX_CHART_ITEMS]
+        contributors = np.diff(self.matrix.indptr)[nodes]
+        return {
+            "type": "repo_network",
+            "title": "Dépôts liés par contributeurs partagés",
+            "labels": [self.repos[i] for i in nodes],
+            "datasets": [
+                {"label": "contributors", "data": [int(c) for c in contributors]},
+                {"label": "shared_contributor_similarity", "data": [
+                    {"source": a, "target": b, "weight": w}
+                    for (a, b), w in list(edges.items())[:MAX_CHART_ITEMS] if b < len(nodes)
+                ]}
+            ]
+        }
+
+    def contrib_matrix(self, repos: List[str], top: int = 20) -> Optional[Dict]:
+        """Graphique contrib_matrix : sous-matrice dépôts × principaux contributeurs"""
+        rows = [i for i in (self.repo_id(r) for r in repos) if i is not None]
+        if not rows:
+            return None
+        sub = self.matrix[rows]
+        totals = np.asarray(sub.sum(axis=0)).ravel()
+        top = min(top, MAX_CHART_ITEMS, int((totals > 0).sum()))
+        columns = np.argsort(-totals)[:top]
+        dense = sub[:, columns].toarray()
+        return {
+            "type": "contrib_matrix",
+            "title": "Contributions par dépôt et contributeur",
+            "labels": [self.contributors[j] for j in columns],
+            "datasets": [
+                {"label": self.repos[i][:50], "data": [round(float(v), 1) for v in values]}
+                for i, values in zip(rows, dense)
+            ]
+        }
+
+
+def _top_neighbours(matrix: sparse.csr_matrix, top_k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-k voisins par cosinus entre lignes creuses (poids log1p), calcul par blocs"""
+    n = matrix.shape[0]
+    weighted = matrix.copy()
+    weighted.data = np.log1p(weighted.data)  # Atténue les très gros contributeurs
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    normalized = sparse.diags(1 / np.maximum(norms, 1e-12)) @ weighted
+    binary = (matrix > 0).astype("float32")
+
+    ids = np.full((n, top_k), -1, dtype="int32")
+    scores = np.zeros((n, top_k), dtype="float32")
+    shared = np.zeros((n, top_k), dtype="int32")
+    for start in range(0, n, SIMILARITY_BLOCK):
+        end = min(start + SIMILARITY_BLOCK, n)
+        similarity = (normalized[start:end] @ normalized.T).tocsr()
+        overlap = (binary[start:end] @ binary.T).tocsr()
+        for offset in range(end - start):
+            i = start + offset
+            row = similarity.getrow(offset)
+            mask = row.indices != i
+            candidates, values = row.indices[mask], row.data[mask]
+            if not len(candidates):
+                continue
+            best = np.argsort(-values)[:top_k]
+            ids[i, :len(best)] = candidates[best]
+            scores[i, :len(best)] = values[best]
+            overlap_row = overlap.getrow(offset)
+            counts = dict(zip(overlap_row.indices, overlap_row.data))
+            shared[i, :len(best)] = [counts.get(j, 0) for j in candidates[best]]
+    return ids, scores, shared
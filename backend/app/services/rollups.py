@@ -0,0 +1,227 @@
+import os
+import re
+import weakref
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.services.vector_store_manager import ROLLUPS_FILE
+
+METRICS = ("commits", "pull_requests", "issues", "builds")
+GRANULARITIES = ("day", "week", "month")
+MAX_CHART_POINTS = 100  # Limite des datasets (TechDataset)
+
+# Granularité automatique selon la durée demandée (jours)
+AUTO_GRANULARITY = ((184, "day"), (3 * 366, "week"))
+
+# Métriques citées dans une question de tendance
+_METRIC_CUES = {
+    "commits": re.compile(r"\bcommits?\b", re.I),
+    "pull_requests": re.compile(r"\b(?:pull requests?|prs?|merge requests?)\b", re.I),
+    "issues": re.compile(r"\b(?:issues?|tickets?|bugs?)\b", re.I),
+    "builds": re.compile(r"\b(?:builds?|ci|pipelines?)\b", re.I),
+}
+DEFAULT_RANGE_DAYS = 365
+
+_rollups: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def register_rollups(store, rollups: "RollupStore") -> None:
+    _rollups[store] = rollups
+
+
+def rollups_for(store) -> Optional["RollupStore"]:
+    return _rollups.get(store) if store is not None else None
+
+
+def requested_metrics(prompt: str) -> List[str]:
+    return [metric for metric, cue in _METRIC_CUES.items() if cue.search(prompt)] or ["commits"]
+
+
+def _to_day(value) -> int:
+    """Jour depuis 1970-01-01 (date PostgreSQL ou chaîne SQLite)"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return int(np.datetime64(value if isinstance(value, date) else str(value)[:10], "D").astype("int64"))
+
+
+def _bucket(days: np.ndarray, granularity: str) -> np.ndarray:
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return (days + 3) // 7  # Semaines commençant le lundi (1970-01-01 est un jeudi)
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    return months
+
+
+def _bucket_label(bucket: int, granularity: str) -> str:
+    if granularity == "day":
+        return str(np.datetime64(int(bucket), "D"))
+    if granularity == "week":
+        return str(np.datetime64(int(bucket) * 7 - 3, "D"))
+    return str(np.datetime64(int(bucket), "M"))
+
+
+def _aggregate(repo_ids: np.ndarray, buckets: np.ndarray, values: np.ndarray,
+               n_repos: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Somme par (dépôt, bucket), triée ; retourne (offsets par dépôt, buckets, valeurs)"""
+    if not len(repo_ids):
+        return np.zeros(n_repos + 1, dtype="int64"), np.array([], dtype="int32"), values[:0]
+    # Clé unique 64 bits (dépôt, bucket) : tri 1D bien plus rapide qu'un unique par lignes
+    keys = (repo_ids.astype("int64") << 32) | (buckets.astype("int64") & 0xFFFFFFFF)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    summed = np.zeros((len(unique), values.shape[1]), dtype="int32")
+    np.add.at(summed, inverse, values)
+    offsets = np.searchsorted(unique >> 32, np.arange(n_repos + 1))
+    return offsets.astype("int64"), (unique & 0xFFFFFFFF).astype("uint32").astype("int32"), summed
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets : indices des points conservés (premier et dernier inclus)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype="int64")
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Point du bucket formant le plus grand triangle avec le point retenu précédent et la moyenne suivante
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+class RollupStore:
+    """Compteurs (commits, PRs, issues, builds) par dépôt et par jour / semaine / mois.
+    Stockage colonne trié par (dépôt, bucket) : offsets par dépôt + recherche dichotomique."""
+
+    def __init__(self, repos: List[str], arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        self.repos = repos
+        self.arrays = arrays  # granularité -> (offsets, buckets, valeurs[n, len(METRICS)])
+        self._repo_index = {name.lower(): i for i, name in enumerate(repos)}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, object, str, int]]) -> "RollupStore":
+        """`rows` : (dépôt, jour, métrique, compte)"""
+        repo_ids, repo_col, day_col, metric_col, count_col = {}, [], [], [], []
+        metric_index = {metric: i for i, metric in enumerate(METRICS)}
+        for repo, day, metric, count in rows:
+            if repo is None or day is None:
+                continue
+            repo_col.append(repo_ids.setdefault(repo, len(repo_ids)))
+            day_col.append(str(day)[:10])  # date, datetime ou chaîne ISO (SQLite)
+            metric_col.append(metric_index[metric])
+            count_col.append(count or 0)
+        days = np.asarray(day_col, dtype="datetime64[D]").astype("int64")
+        return cls.from_columns(list(repo_ids), np.asarray(repo_col, dtype="int64"), days,
+                                np.asarray(metric_col, dtype="int64"), np.asarray(count_col, dtype="int32"))
+
+    @classmethod
+    def from_columns(cls, repos: List[str], repo_col: np.ndarray, day_col: np.ndarray,
+                     metric_col: np.ndarray, count_col: np.ndarray) -> "RollupStore":
+        values = np.zeros((len(repo_col), len(METRICS)), dtype="int32")
+        values[np.arange(len(repo_col)), metric_col] = count_col
+        arrays = {
+            granularity: _aggregate(repo_col, _bucket(day_col, granularity), values, len(repos))
+            for granularity in GRANULARITIES
+        }
+        return cls(repos, arrays)
+
+    def _daily_columns(self, exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        offsets, days, values = self.arrays["day"]
+        keep = np.ones(len(days), dtype=bool)
+        for i in exclude:
+            keep[offsets[i]:offsets[i + 1]] = False
+        repo_col = np.repeat(np.arange(len(self.repos)), np.diff(offsets))
+        return repo_col[keep], days[keep], values[keep]
+
+    def replace_repos(self, repo_names: Iterable[str], update: "RollupStore") -> "RollupStore":
+        """Mise à jour incrémentale : les séries des dépôts `repo_names` sont remplacées par `update`"""
+        replaced = [i for i in (self.repo_id(name) for name in repo_names) if i is not None]
+        repo_col, day_col, values = self._daily_columns(exclude=replaced)
+
+        repos = list(self.repos)
+        index = {name.lower(): i for i, name in enumerate(repos)}
+        new_repo_col, new_day_col, new_values = update._daily_columns()
+        mapping = np.empty(len(update.repos), dtype="int64")
+        for i, name in enumerate(update.repos):
+            if name.lower() not in index:
+                index[name.lower()] = len(repos)
+                repos.append(name)
+            mapping[i] = index[name.lower()]
+
+        repo_col = np.concatenate([repo_col, mapping[new_repo_col]])
+        day_col = np.concatenate([day_col, new_day_col])
+        values = np.concatenate([values, new_values])
+        arrays = {
+            granularity: _aggregate(repo_col, _bucket(day_col, granularity), values, len(repos))
+            for granularity in GRANULARITIES
+        }
+        return RollupStore(repos, arrays)
+
+    def save(self, path: str) -> None:
+        columns = {"repos": np.asarray(self.repos, dtype=object)}
+        for granularity, (offsets, buckets, values) in self.arrays.items():
+            columns[f"{granularity}_offsets"] = offsets
+            columns[f"{granularity}_buckets"] = buckets
+            columns[f"{granularity}_values"] = values
+        np.savez_compressed(os.path.join(path, ROLLUPS_FILE), **columns)
+
+    @classmethod
+    def load(cls, path: str) -> "RollupStore":
+        with np.load(os.path.join(path, ROLLUPS_FILE), allow_pickle=True) as f:
+            arrays = {
+                g: (f[f"{g}_offsets"], f[f"{g}_buckets"], f[f"{g}_values"]) for g in GRANULARITIES
+            }
+            return cls(list(f["repos"]), arrays)
+
+    def repo_id(self, repo: str) -> Optional[int]:
+        return self._repo_index.get(repo.lower())
+
+    def latest_day(self) -> Optional[date]:
+        days = self.arrays["day"][1]
+        return np.datetime64(int(days.max()), "D").astype(date) if len(days) else None
+
+    def series(self, repos: List[str], start: date, end: date, granularity: str = "auto",
+               metrics: Optional[List[str]] = None, max_points: int = MAX_CHART_POINTS) -> Optional[Dict]:
+        """Graphique linéaire exact sur [start, end], sous-échantillonné (LTTB) à `max_points`.
+        Les indices conservés sont choisis sur la somme des séries pour garder des labels communs."""
+        metrics = metrics or ["commits"]
+        rows = [(r, i) for r, i in ((r, self.repo_id(r)) for r in repos) if i is not None]
+        if not rows:
+            return None
+        start_day, end_day = _to_day(start), _to_day(end)
+        if granularity == "auto":
+            span = end_day - start_day
+            granularity = next((g for limit, g in AUTO_GRANULARITY if span <= limit), "month")
+        offsets, buckets, values = self.arrays[granularity]
+        first, last = (int(b) for b in _bucket(np.array([start_day, end_day]), granularity))
+        axis = np.arange(first, last + 1)
+        columns = [METRICS.index(m) for m in metrics]
+
+        datasets = []
+        for repo, i in rows:
+            segment = slice(offsets[i], offsets[i + 1])
+            repo_buckets, repo_values = buckets[segment], values[segment]
+            lo, hi = np.searchsorted(repo_buckets, [first, last + 1])
+            dense = np.zeros((len(axis), len(columns)), dtype="int64")
+            dense[repo_buckets[lo:hi] - first] = repo_values[lo:hi][:, columns]
+            for column, metric in enumerate(metrics):
+                datasets.append((f"{repo} {metric}"[:50], dense[:, column]))
+
+        kept = np.arange(len(axis))
+        if len(axis) > max_points:
+            total = np.sum([data for _, data in datasets], axis=0).astype("float64")
+            kept = lttb(axis.astype("float64"), total, max_points)
+        return {
+            "type": "line",
+            "title": f"{', '.join(metrics)} par {granularity}",
+            "labels": [_bucket_label(b, granularity) for b in axis[kept]],
+            "datasets": [{"label": label, "data": data[kept].tolist()} for label, data in datasets],
+            "granularity": granularity,
+            "downsampled": bool(len(kept) < len(axis))
+        }
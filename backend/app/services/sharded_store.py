@@ -0,0 +1,53 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from app.config import VECTOR_SHARD_SEARCH_THREADS
+
+# Pool partagé par toutes les versions : FAISS relâche le GIL pendant `search`
+_search_pool = ThreadPoolExecutor(max_workers=VECTOR_SHARD_SEARCH_THREADS, thread_name_prefix="shard-search")
+
+
+def shard_for(metadata: Dict, count: int, partition: str = "repo") -> int:
+    """Shard d'un document : hachage stable du dépôt (ou du type de document)"""
+    key = metadata.get("repo") if partition == "repo" else metadata.get("type")
+    key = str(key or metadata.get("type") or "").lower()
+    return zlib.crc32(key.encode("utf-8")) % count
+
+
+class ShardedVectorStore:
+    """Ensemble de stores FAISS indépendants vus comme un seul index.
+    Ids globaux = id local + décalage du shard (ordre de `shard_ids`)."""
+
+    def __init__(self, shards: List, shard_ids: List[int], count: int, partition: str, embeddings=None):
+        self.shards = shards
+        self.shard_ids = shard_ids
+        self.count = count
+        self.partition = partition
+        self.embeddings = embeddings
+        self.offsets = np.cumsum([0] + [shard.index.ntotal for shard in shards]).astype("int64")
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.offsets[-1])
+
+    def shard(self, shard_id: int):
+        """Store d'un shard par son identifiant de partition (None s'il est vide)"""
+        if shard_id in self.shard_ids:
+            return self.shards[self.shard_ids.index(shard_id)]
+        return None
+
+    def locate(self, ids: np.ndarray) -> np.ndarray:
+        """Position (dans `shards`) du shard de chaque id global"""
+        return np.searchsorted(self.offsets, ids, side="right") - 1
+
+    def scatter(self, fn: Callable, positions: Optional[List[int]] = None) -> List:
+        """Applique `fn(position, shard)` aux shards en parallèle, résultats dans l'ordre"""
+        positions = range(len(self.shards)) if positions is None else positions
+        return list(_search_pool.map(lambda p: fn(p, self.shards[p]), positions))
+
+    def similarity_search(self, query: str, k: int = 4) -> List:
+        from app.services.vector_search import search_by_vectors
+
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _ in search_by_vectors(self, [vector], k)[0]]
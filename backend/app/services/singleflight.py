@@ -0,0 +1,28 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from app.services.metrics import metrics
+
+
+class SingleFlight:
+    """Déduplication des appels identiques en vol : les doublons concurrents
+    attendent le résultat partagé de la première exécution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.incr(f"{self.name}_coalesced")
+        else:
+            metrics.incr(f"{self.name}_executed")
+            # Tâche détachée : l'annulation d'un appelant n'annule pas les autres
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.config import VECTOR_STORE_PATH, TENANTS_PATH, DEFAULT_TENANT
+from app.services.metrics import metrics
+from app.services.singleflight import SingleFlight
+from app.services.vector_search import metadata_index_for
+from app.services.vector_store_manager import current_version, load_vector_store, version_path
+
+_TENANT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class UnknownTenantError(LookupError):
+    """Tenant invalide ou sans index publié"""
+
+
+def is_default_tenant(tenant: Optional[str]) -> bool:
+    return not tenant or tenant == DEFAULT_TENANT
+
+
+def tenant_root(tenant: Optional[str]) -> str:
+    """Dossier versionné de l'index d'un tenant (VECTOR_STORE_PATH pour le tenant par défaut)"""
+    if is_default_tenant(tenant):
+        return VECTOR_STORE_PATH
+    if not _TENANT_NAME.match(tenant):
+        raise UnknownTenantError(f"Invalid tenant name '{tenant}'")
+    return os.path.join(TENANTS_PATH, tenant)
+
+
+def version_size_mb(path: str) -> float:
+    """Taille sur disque d'une version (index, docstore, sidecars) : estimation de sa mémoire"""
+    total = 0
+    for directory, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    return total / 1024 / 1024
+
+
+class TenantIndexManager:
+    """Index des tenants chargés à la demande, en LRU borné par un budget mémoire.
+    Les tenants inactifs sont déchargés ; les tenants chauds (`preload`) sont chargés au démarrage
+    et ne sont évincés qu'en dernier recours. Les requêtes en cours gardent leur instantané."""
+
+    def __init__(self, embeddings, memory_budget_mb: float, idle_seconds: float, hot: Iterable[str] = ()):
+        self.embeddings = embeddings
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_seconds = idle_seconds
+        self.hot = set(hot)
+        # tenant -> {"store", "version", "size_mb", "loaded_at", "last_used"}, du moins au plus récent
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._loads = SingleFlight("tenant_index_load")
+
+    async def get(self, tenant: str) -> Tuple[object, str]:
+        """(store, version) du tenant, chargé au premier usage (un seul chargement concurrent)"""
+        entry = self._entries.get(tenant)
+        if entry is None:
+            metrics.incr("tenant_index_misses")
+            entry = await self._loads.do(tenant, lambda: self._load(tenant))
+        else:
+            metrics.incr("tenant_index_hits")
+        entry["last_used"] = time.monotonic()
+        if tenant in self._entries:
+            self._entries.move_to_end(tenant)
+        return entry["store"], entry["version"]
+
+    def peek(self, tenant: str) -> Optional[Tuple[object, str]]:
+        """(store, version) si le tenant est déjà chargé, sans chargement ni mise à jour du LRU"""
+        entry = self._entries.get(tenant)
+        return (entry["store"], entry["version"]) if entry else None
+
+    async def _load(self, tenant: str, version: Optional[str] = None) -> Dict:
+        root = tenant_root(tenant)
+        if current_version(root) is None:
+            raise UnknownTenantError(f"No vector store published for tenant '{tenant}'")
+        start = time.perf_counter()
+        store, version = await asyncio.to_thread(load_vector_store, root, self.embeddings, version)
+        await asyncio.to_thread(metadata_index_for, store)  # Postings prêts avant la première requête
+        now = time.monotonic()
+        entry = {
+            "store": store,
+            "version": version,
+            "size_mb": await asyncio.to_thread(version_size_mb, version_path(root, version)),
+            "loaded_at": now,
+            "last_used": now
+        }
+        self._entries[tenant] = entry
+        self._entries.move_to_end(tenant)
+        metrics.incr("tenant_index_load_ms", (time.perf_counter() - start) * 1000)
+        print(f"📂 Index du tenant {tenant} chargé (version {version}, {entry['size_mb']:.0f} MB)")
+        self._evict_over_budget(keep=tenant)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self._entries.values())
+
+    def _evict(self, tenant: str, reason: str) -> None:
+        entry = self._entries.pop(tenant, None)
+        if entry is not None:
+            metrics.incr(f"tenant_index_evictions_{reason}")
+            print(f"🧹 Index du tenant {tenant} déchargé ({reason})")
+
+    def _evict_over_budget(self, keep: Optional[str] = None) -> None:
+        # Moins récemment utilisés d'abord, tenants chauds en dernier
+        candidates = sorted((t for t in self._entries if t != keep), key=lambda t: t in self.hot)
+        for tenant in candidates:
+            if self.memory_mb <= self.memory_budget_mb:
+                break
+            self._evict(tenant, "memory")
+
+    def evict_idle(self) -> List[str]:
+        """Décharge les tenants non chauds inutilisés depuis `idle_seconds`"""
+        limit = time.monotonic() - self.idle_seconds
+        idle = [t for t, entry in self._entries.items() if t not in self.hot and entry["last_used"] < limit]
+        for tenant in idle:
+            self._evict(tenant, "idle")
+        return idle
+
+    async def refresh(self) -> None:
+        """Recharge les tenants chargés dont une nouvelle version a été publiée"""
+        for tenant, entry in list(self._entries.items()):
+            published = current_version(tenant_root(tenant))
+            if published and published != entry["version"]:
+                try:
+                    await self._loads.do(tenant, lambda: self._load(tenant, published))
+                    print(f"🔁 Tenant {tenant} basculé sur la version {published}")
+                except Exception as e:
+                    print(f"⚠️ Rechargement du tenant {tenant} ({published}) impossible : {e}")
+
+    async def preload(self, tenants: Iterable[str]) -> None:
+        """Chargement des tenants chauds au démarrage, l'un après l'autre"""
+        for tenant in tenants:
+            try:
+                await self.get(tenant)
+            except Exception as e:
+                print(f"⚠️ Préchargement du tenant {tenant} impossible : {e}")
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "memory_budget_mb": self.memory_budget_mb,
+            "memory_mb": round(self.memory_mb, 1),
+            "idle_seconds": self.idle_seconds,
+            "loaded": [
+                {
+                    "tenant": tenant,
+                    "version": entry["version"],
+                    "size_mb": round(entry["size_mb"], 1),
+                    "idle_s": round(now - entry["last_used"], 1),
+                    "hot": tenant in self.hot
+                }
+                for tenant, entry in reversed(self._entries.items())
+            ]
+        }
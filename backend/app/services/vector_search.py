@@ -0,0 +1,178 @@
+import heapq
+import weakref
+import numpy as np
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional, Tuple, TYPE_CHECKING
+from app.config import VECTOR_RESCORE_FACTOR
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+
+_full_precision: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def register_full_precision(store, vectors: np.ndarray) -> None:
+    """Associe à un store quantifié ses vecteurs float32 (ligne i = id FAISS i)"""
+    _full_precision[store] = vectors
+
+
+def full_precision_for(store) -> Optional[np.ndarray]:
+    return _full_precision.get(store)
+
+
+def _ascending(store) -> bool:
+    """Convention des scores FAISS (et LangChain) : distance L2² croissante, produit scalaire décroissant"""
+    import faiss
+
+    return store.index.metric_type != faiss.METRIC_INNER_PRODUCT
+
+
+def _exact_scores(store, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    if _ascending(store):
+        return ((vectors - query) ** 2).sum(axis=1)
+    return vectors @ query
+
+
+def _best_first(store, scores: np.ndarray) -> np.ndarray:
+    return np.argsort(scores if _ascending(store) else -scores, kind="stable")
+
+
+def search_by_vectors(store, vectors, k: int) -> List[List[Tuple["Document", float]]]:
+    """Recherche FAISS groupée : un seul appel `search` sur une matrice de vecteurs requêtes.
+    Sur un index quantifié, les k * VECTOR_RESCORE_FACTOR candidats sont re-classés en float32.
+    Sur un index shardé, chaque shard est interrogé en parallèle puis les top-k sont fusionnés."""
+    matrix = np.asarray(vectors, dtype="float32")
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if getattr(store, "shards", None) is not None:
+        return _search_shards(store, matrix, k)
+
+    full = full_precision_for(store)
+    fetch = k * VECTOR_RESCORE_FACTOR if full is not None else k
+    distances, indices = store.index.search(matrix, fetch)
+
+    results = []
+    for query, row_distances, row_indices in zip(matrix, distances, indices):
+        valid = row_indices != -1  # Moins de k vecteurs dans l'index
+        row_distances, row_indices = row_distances[valid], row_indices[valid]
+        if full is not None and len(row_indices):
+            row_distances = _exact_scores(store, full[row_indices], query)
+            order = _best_first(store, row_distances)[:k]
+            row_distances, row_indices = row_distances[order], row_indices[order]
+        results.append([
+            (store.docstore.search(store.index_to_docstore_id[int(idx)]), float(distance))
+            for distance, idx in zip(row_distances, row_indices)
+        ])
+    return results
+
+
+def _merge_top_k(parts: List[List[Tuple["Document", float]]], ascending: List[bool],
+                 k: int) -> List[Tuple["Document", float]]:
+    candidates = (
+        (distance if up else -distance, i, rank, doc, distance)
+        for i, (part, up) in enumerate(zip(parts, ascending))
+        for rank, (doc, distance) in enumerate(part)
+    )
+    return [(doc, distance) for *_, doc, distance in heapq.nsmallest(k, candidates)]
+
+
+def _search_shards(store, matrix: np.ndarray, k: int) -> List[List[Tuple["Document", float]]]:
+    """Scatter-gather : top-k de chaque shard (threads, FAISS relâche le GIL) puis fusion par requête"""
+    per_shard = store.scatter(lambda _, shard: search_by_vectors(shard, matrix, k))
+    ascending = [_ascending(shard) for shard in store.shards]
+    return [
+        _merge_top_k([results[row] for results in per_shard], ascending, k)
+        for row in range(len(matrix))
+    ]
+
+
+class MetadataIndex:
+    """Listes de postings (ids FAISS) par dépôt et par mois, construites depuis
+    les métadonnées `repo` / `month` écrites par create_documents"""
+
+    def __init__(self, store):
+        by_repo, by_month, undated = defaultdict(list), defaultdict(list), []
+        # Index shardé : ids globaux = id local + décalage du shard
+        shards = getattr(store, "shards", None) or [store]
+        offsets = getattr(store, "offsets", [0])
+        for shard, offset in zip(shards, offsets):
+            for idx, doc_id in shard.index_to_docstore_id.items():
+                self._add(shard.docstore.search(doc_id).metadata, int(offset) + idx, by_repo, by_month, undated)
+
+        self.total = sum(shard.index.ntotal for shard in shards)
+        self.repos = {k: np.unique(np.array(v, dtype="int64")) for k, v in by_repo.items()}
+        self.months = {k: np.array(sorted(v), dtype="int64") for k, v in by_month.items()}
+        self.undated = np.array(sorted(undated), dtype="int64")
+
+    @staticmethod
+    def _add(metadata: dict, idx: int, by_repo, by_month, undated: List[int]) -> None:
+        # Quasi-doublons fusionnés : liste "repos" agrégée sur le représentant
+        for repo in metadata.get("repos") or ([metadata["repo"]] if metadata.get("repo") else []):
+            by_repo[str(repo).lower()].append(idx)
+        months = metadata.get("months") or ([metadata["month"]] if metadata.get("month") else [])
+        if months:
+            for month in months:
+                by_month[month].append(idx)
+        else:
+            undated.append(idx)  # Documents instantanés, sans période propre
+
+    def candidate_ids(self, repos: Optional[List[str]] = None,
+                      timeframe: Optional[Tuple[datetime, datetime]] = None) -> Optional[np.ndarray]:
+        """Ids autorisés pour un filtre dépôts/période (None = pas de filtre)"""
+        ids = None
+        if repos:
+            postings = [self.repos.get(repo.lower()) for repo in repos]
+            ids = _union([p for p in postings if p is not None])
+        if timeframe:
+            start, end = (d.strftime("%Y-%m") for d in timeframe)
+            postings = [p for month, p in self.months.items() if start <= month <= end]
+            in_period = _union(postings + [self.undated])
+            ids = in_period if ids is None else np.intersect1d(ids, in_period, assume_unique=True)
+        return ids
+
+
+def _union(postings: List[np.ndarray]) -> np.ndarray:
+    if not postings:
+        return np.array([], dtype="int64")
+    return np.unique(np.concatenate(postings))
+
+
+_metadata_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_metadata_lock = Lock()
+
+
+def metadata_index_for(store) -> MetadataIndex:
+    """Index de métadonnées associé à une instance de store (reconstruit après chaque bascule)"""
+    with _metadata_lock:
+        index = _metadata_indexes.get(store)
+        if index is None:
+            index = MetadataIndex(store)
+            _metadata_indexes[store] = index
+        return index
+
+
+def search_subset(store, vector, ids: np.ndarray, k: int) -> List[Tuple["Document", float]]:
+    """Recherche exacte limitée à un sous-ensemble d'ids : seuls ces vecteurs sont parcourus.
+    Scores dans la même convention que search_by_vectors (cf. _ascending)"""
+    if len(ids) == 0:
+        return []
+    if getattr(store, "shards", None) is not None:
+        # Ids globaux répartis par shard, puis recherche exacte locale dans chacun
+        positions = store.locate(ids)
+        touched = sorted(set(positions.tolist()))
+        parts = store.scatter(
+            lambda p, shard: search_subset(shard, vector, ids[positions == p] - store.offsets[p], k), touched)
+        return _merge_top_k(parts, [_ascending(store.shards[p]) for p in touched], k)
+    query = np.asarray(vector, dtype="float32")
+    full = full_precision_for(store)
+    vectors = full[ids] if full is not None else store.index.reconstruct_batch(ids)
+    distances = _exact_scores(store, vectors, query)
+
+    top = _best_first(store, distances)[:k]
+    return [
+        (store.docstore.search(store.index_to_docstore_id[int(ids[i])]), float(distances[i]))
+        for i in top
+    ]
@@ -0,0 +1,174 @@
+import json
+import os
+import shutil
+import numpy as np
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Arborescence versionnée :
+#   <root>/versions/<version>/index.faiss|index.pkl
+#   <root>/CURRENT            -> nom de la version active
+#   <root>/index.faiss        -> ancien format non versionné ("base")
+#   <root>/versions/<version>/shards/<id>/index.faiss|index.pkl + shards.json (index shardé)
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+LEGACY_VERSION = "base"
+FULL_PRECISION_FILE = "vectors_f32.npy"  # Vecteurs float32 des index quantifiés (re-scoring)
+QUANTIZATION_FILE = "quantization.json"
+GRAPH_FILE = "repo_graph.npz"  # Graphe dépôts / contributeurs de la version
+ROLLUPS_FILE = "rollups.npz"   # Séries temporelles agrégées jour / semaine / mois
+SHARDS_DIR = "shards"
+SHARDS_FILE = "shards.json"    # Écrit en dernier : {"count", "partition", "shards": [ids non vides]}
+EXTRACTED_AT_FILE = "extracted_at.txt"  # Début de l'extraction de l'entrepôt (reconstruction complète)
+
+
+def new_version_id() -> str:
+    # Microsecondes : une capture de changements peut publier juste après une reconstruction
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+
+
+def write_extracted_at(path: str, extracted_at: datetime) -> None:
+    with open(os.path.join(path, EXTRACTED_AT_FILE), "w") as f:
+        f.write(extracted_at.isoformat())
+
+
+def read_extracted_at(path: str) -> Optional[datetime]:
+    """Instant des données d'une version complète (None : version antérieure ou mise à jour incrémentale)"""
+    try:
+        with open(os.path.join(path, EXTRACTED_AT_FILE)) as f:
+            return datetime.fromisoformat(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def version_path(root: str, version: str) -> str:
+    if version == LEGACY_VERSION:
+        return root
+    return os.path.join(root, VERSIONS_DIR, version)
+
+
+def shard_path(path: str, shard_id: int) -> str:
+    return os.path.join(path, SHARDS_DIR, str(shard_id))
+
+
+def read_shard_layout(path: str) -> Optional[dict]:
+    """Description des shards d'une version (None pour un index non shardé)"""
+    layout_file = os.path.join(path, SHARDS_FILE)
+    if not os.path.exists(layout_file):
+        return None
+    with open(layout_file) as f:
+        return json.load(f)
+
+
+def write_shard_layout(path: str, count: int, partition: str, shard_ids: List[int]) -> None:
+    with open(os.path.join(path, SHARDS_FILE), "w") as f:
+        json.dump({"count": count, "partition": partition, "shards": sorted(shard_ids)}, f)
+
+
+def _has_index_files(path: str) -> bool:
+    return all(os.path.exists(os.path.join(path, f)) for f in ("index.faiss", "index.pkl"))
+
+
+def is_complete(path: str) -> bool:
+    layout = read_shard_layout(path)
+    if layout is None:
+        return _has_index_files(path)
+    return all(_has_index_files(shard_path(path, shard_id)) for shard_id in layout["shards"])
+
+
+def list_versions(root: str) -> List[str]:
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    versions = []
+    if os.path.isdir(versions_root):
+        versions = sorted(
+            v for v in os.listdir(versions_root)
+            if is_complete(os.path.join(versions_root, v))
+        )
+    if is_complete(root):
+        versions.insert(0, LEGACY_VERSION)
+    return versions
+
+
+def current_version(root: str) -> Optional[str]:
+    """Version publiée dans CURRENT, sinon la plus récente disponible"""
+    pointer = os.path.join(root, CURRENT_FILE)
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            version = f.read().strip()
+        if version and is_complete(version_path(root, version)):
+            return version
+    versions = list_versions(root)
+    return versions[-1] if versions else None
+
+
+def publish_version(root: str, version: str) -> None:
+    """Bascule atomique du pointeur CURRENT (écriture temporaire + rename)"""
+    tmp_pointer = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(root, CURRENT_FILE))
+
+
+def prune_versions(root: str, keep: int) -> List[str]:
+    """Supprime les anciennes versions en conservant les `keep` plus récentes et l'active"""
+    active = current_version(root)
+    versioned = [v for v in list_versions(root) if v != LEGACY_VERSION]
+    removed = []
+    for version in versioned[:-keep] if keep > 0 else versioned:
+        if version != active:
+            shutil.rmtree(version_path(root, version), ignore_errors=True)
+            removed.append(version)
+    return removed
+
+
+def load_vector_store(root: str, embeddings, version: Optional[str] = None) -> Tuple[object, str]:
+    """Charge une version de l'index FAISS (la version courante par défaut), shardée ou non"""
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No vector store found in {root}")
+    path = version_path(root, version)
+    if not is_complete(path):
+        raise FileNotFoundError(f"Vector store version '{version}' is missing or incomplete")
+
+    layout = read_shard_layout(path)
+    if layout is None:
+        store = _load_faiss(path, embeddings)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services.sharded_store import ShardedVectorStore
+
+        # Shards chargés en parallèle (lecture disque et désérialisation indépendantes)
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(layout["shards"])))) as pool:
+            shards = list(pool.map(lambda i: _load_faiss(shard_path(path, i), embeddings), layout["shards"]))
+        store = ShardedVectorStore(shards, layout["shards"], layout["count"], layout["partition"], embeddings)
+
+    if os.path.exists(os.path.join(path, GRAPH_FILE)):
+        from app.services.repo_graph import RepoGraph, register_graph
+
+        register_graph(store, RepoGraph.load(path))
+
+    if os.path.exists(os.path.join(path, ROLLUPS_FILE)):
+        from app.services.rollups import RollupStore, register_rollups
+
+        register_rollups(store, RollupStore.load(path))
+    return store, version
+
+
+def _load_faiss(path: str, embeddings):
+    from langchain_community.vectorstores import FAISS
+
+    store = FAISS.load_local(
+        folder_path=path,
+        embeddings=embeddings,
+        allow_dangerous_deserialization=True
+    )
+
+    full_precision_path = os.path.join(path, FULL_PRECISION_FILE)
+    if os.path.exists(full_precision_path):
+        from app.services.vector_search import register_full_precision
+
+        # memmap : pages partagées entre workers via le cache disque
+        register_full_precision(store, np.load(full_precision_path, mmap_mode="r"))
+    return store
@@ -1,4 +1,3 @@
-import google.generativeai as genai
 from enum import Enum
 from typing import Dict, List
 from app.config import (
@@ -8,13 +7,7 @@ from app.config import (
     TEMPERATURE,
     MAX_TOKENS
 )
-import os
-from google.generativeai.types import content_types  # utile pour certaines options avancées si besoin
-from dotenv import load_dotenv
-load_dotenv()
-
-# Configuration de l'API (fait une fois)
-genai.configure(api_key=GEMINI_API_KEY)
+from app.services.gemini_client import get_gemini_client, gemini_limiter
 
 class GitHubQueryType(Enum):
     """Types de requêtes spécifiques à GitHub"""
@@ -91,16 +84,14 @@ class QueryClassifier:
     def _classify_with_ai(self, query: str) -> GitHubQueryType:
         """Utilise Gemini pour classification avancée"""
         try:
-            import google.generativeai as genai
-            from google.generativeai.types import content_types
-
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-            model = genai.GenerativeModel(model_name=GEMINI_MODEL_NAME)
+            # Client partagé du worker : pas de reconfiguration ni de nouveau modèle par requête
+            model = get_gemini_client().model(GEMINI_MODEL_NAME)
 
             prompt = self._build_github_prompt(query)
             
-            response = model.generate_content(prompt)
+            # Même limiteur AIMD que la génération : une surcharge réduit la concurrence de tous les appels
+            with gemini_limiter.blocking_slot():
+                response = model.generate_content(prompt)
 
             classification = response.text.strip().lower()
 
@@ -0,0 +1,66 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Séparateurs d'énumération retirés des sous-requêtes ("A vs B vs C", "compare A, B and C")
+_SEPARATORS = re.compile(r"\s*(?:,|;|&|\bvs\.?(?=\s|$)|\bversus\b|\band\b|\bet\b)\s*", re.I)
+_BLANKS = re.compile(r"\s{2,}")
+# Bornes de période ("between January and March", "from Q1 to Q3 2024", "entre mars et juin"),
+# conservées telles quelles dans chaque sous-requête
+_MONTHS = (r"jan(?:uary|vier)?|f[eé]v(?:rier)?|feb(?:ruary)?|mar(?:ch|s)?|apr(?:il)?|avr(?:il)?|ma[yi]|"
+           r"june?|juin|july?|juil(?:let)?|aug(?:ust)?|ao[uû]t|sep(?:t(?:ember|embre)?)?|oct(?:ober|obre)?|"
+           r"nov(?:ember|embre)?|d[eé]c(?:ember|embre)?")
+_TIME = (rf"(?:(?:\d{{1,2}}(?:st|nd|rd|th|er)?\s+)?(?:{_MONTHS})\.?(?:\s+\d{{1,2}}(?:st|nd|rd|th)?)?(?:,?\s+\d{{4}})?"
+         r"|q[1-4](?:\s+\d{4})?|\d{4}-\d{2}(?:-\d{2})?|(?:19|20)\d{2})")
+_DATE_RANGE = re.compile(
+    rf"(\b(?:between|from|entre|de|du)\s+{_TIME}\s+(?:and|to|until|through|et|à|au|-)\s+{_TIME}\b)", re.I
+)
+
+
+def _mentions(prompt: str, name: str) -> Optional[int]:
+    match = re.search(rf"(?<![\w./-]){re.escape(name)}(?![\w-])", prompt, re.I)
+    return match.start() if match else None
+
+
+def mentioned_repos(prompt: str, known_repos: Iterable[str]) -> List[str]:
+    """Dépôts de l'index cités dans la question (nom complet ou nom court), par ordre d'apparition"""
+    found = []
+    for repo in known_repos:
+        positions = [p for p in (_mentions(prompt, repo), _mentions(prompt, repo.split("/")[-1])) if p is not None]
+        if positions:
+            found.append((min(positions), repo))
+    return [repo for _, repo in sorted(found)]
+
+
+def _sub_query(prompt: str, entity: str, others: List[str]) -> str:
+    """Question recentrée sur une entité : les autres entités comparées sont retirées"""
+    focused = prompt
+    for other in others:
+        for name in {other, other.split("/")[-1]}:
+            focused = re.sub(rf"(?<![\w./-]){re.escape(name)}(?![\w-])", " ", focused, flags=re.I)
+    # Séparateurs retirés hors des bornes de période ("between January and March" conservé)
+    pieces = _DATE_RANGE.split(focused)
+    focused = "".join(piece if i % 2 else _SEPARATORS.sub(" ", piece) for i, piece in enumerate(pieces))
+    focused = _BLANKS.sub(" ", focused).strip()
+    return f"{entity}: {focused}"
+
+
+def decompose_query(prompt: str, known_repos: Iterable[str], explicit_repos: Optional[List[str]] = None,
+                    max_entities: int = 5) -> List[Dict]:
+    """Dépôts comparés et sous-requête de chacun ([] si moins de deux dépôts).
+    Seuls les dépôts demandés explicitement, sinon ceux de l'index cités, sont des entités :
+    une énumération de métriques ("coverage and bug density") reste une seule requête."""
+    if explicit_repos and len(explicit_repos) >= 2:
+        entities = [repo.lower() for repo in explicit_repos]
+    else:
+        entities = mentioned_repos(prompt, known_repos)
+
+    entities = list(dict.fromkeys(entities))[:max_entities]
+    if len(entities) < 2:
+        return []
+    return [
+        {
+            "entity": entity,
+            "text": _sub_query(prompt, entity, [e for e in entities if e != entity])
+        }
+        for entity in entities
+    ]
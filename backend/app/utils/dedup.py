@@ -0,0 +1,111 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+# MinHash : 64 permutations en 16 bandes de 4 lignes (seuil LSH ~0.5, vérifié ensuite)
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 5
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Coefficient a < 2^31 : hash (crc32 < 2^32) * a + b reste sous 2^64, pas de débordement uint64
+_MAX_MULTIPLIER = 1 << 31
+_WHITESPACE = re.compile(r"\s+")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Métadonnées propres à chaque doublon, agrégées en liste sur le représentant
+_AGGREGATED_FIELDS = {"issue_id": "issue_ids", "month": "months", "repo": "repos", "labels": "labels_list"}
+
+
+def _shingles(text: str) -> np.ndarray:
+    """Shingles de caractères (robustes sur les textes courts), hachés en 32 bits"""
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return np.array([zlib.crc32(text.encode())], dtype=np.uint64)
+    return np.unique(np.fromiter(
+        (zlib.crc32(text[i:i + SHINGLE_SIZE].encode()) for i in range(len(text) - SHINGLE_SIZE + 1)),
+        dtype=np.uint64
+    ))
+
+
+def minhash_signatures(texts: List[str], seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MAX_MULTIPLIER, size=NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingles(text)[:, None]
+        signatures[i] = ((hashes * a + b) % _MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+
+def near_duplicate_clusters(texts: List[str], threshold: float) -> List[List[int]]:
+    """Groupes de textes dont la similarité de Jaccard estimée dépasse `threshold` et dont les
+    valeurs numériques sont identiques (deux mois d'une tendance ne diffèrent que par leurs chiffres)"""
+    if len(texts) < 2:
+        return [[i] for i in range(len(texts))]
+
+    signatures = minhash_signatures(texts)
+    numbers = [_NUMBERS.findall(text) for text in texts]
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets[key.tobytes()].append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_a, root_b = find(first), find(other)
+                if (root_a != root_b and numbers[first] == numbers[other]
+                        and np.mean(signatures[first] == signatures[other]) >= threshold):
+                    parent[root_b] = root_a
+
+    clusters = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[find(i)].append(i)
+    return list(clusters.values())
+
+
+def _merge_metadata(documents: List) -> Dict:
+    representative = dict(documents[0].metadata)
+    representative["duplicate_count"] = len(documents)
+    for field, aggregated in _AGGREGATED_FIELDS.items():
+        values = list(dict.fromkeys(d.metadata[field] for d in documents if d.metadata.get(field) is not None))
+        if len(values) > 1:
+            representative[aggregated] = values
+    return representative
+
+
+def deduplicate_documents(documents: List, doc_types: Iterable[str],
+                          threshold: float) -> Tuple[List, Dict[str, int]]:
+    """Garde un représentant par groupe de quasi-doublons (par type de document),
+    avec métadonnées agrégées. Retourne (documents, nombre supprimé par type)."""
+    doc_types = set(doc_types)
+    by_type = defaultdict(list)
+    for position, doc in enumerate(documents):
+        if doc.metadata.get("type") in doc_types:
+            by_type[doc.metadata["type"]].append(position)
+
+    removed_positions, removed = set(), {}
+    for doc_type, positions in by_type.items():
+        clusters = near_duplicate_clusters([documents[p].page_content for p in positions], threshold)
+        removed[doc_type] = 0
+        for cluster in clusters:
+            if len(cluster) < 2:
+                continue
+            members = [documents[positions[i]] for i in cluster]
+            members[0].metadata = _merge_metadata(members)
+            removed_positions.update(positions[i] for i in cluster[1:])
+            removed[doc_type] += len(cluster) - 1
+
+    kept = [doc for position, doc in enumerate(documents) if position not in removed_positions]
+    return kept, removed
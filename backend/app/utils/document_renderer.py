@@ -0,0 +1,198 @@
+"""Rendu en colonnes des documents indexés (create_documents).
+
+Les lignes de l'entrepôt sont transposées en colonnes, les libellés dérivés (niveau de
+performance, d'activité, santé) calculés une fois par colonne, puis les textes formatés
+par lot avec un gabarit `str.format`. Sans import LangChain : le module est chargé tel quel
+par les processus du pool de create_documents.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+# Paramètres du RecursiveCharacterTextSplitter : un texte plus court que CHUNK_SIZE
+# reste un seul chunk (texte strippé), le découpage n'est fait que pour les textes plus longs
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ['\n\n', '```', '## ']
+
+# Sections de create_documents, dans l'ordre des documents produits
+SECTIONS = ("repositories", "developers", "trends", "kpi_status", "issues")
+
+# Valeurs de métadonnées très répétées : une seule instance de chaîne par valeur
+INTERNED_FIELDS = ("repo", "language", "login", "labels", "month", "merge_time_status", "reopened_status",
+                   "timestamp")
+
+# (page_content, metadata, à découper)
+Rendered = Tuple[str, Dict, bool]
+
+REPOSITORY_TEMPLATE = """Repository: {}
+Language: {}
+URL: {}
+Total Commits: {}
+Average Merge Time: {:.2f} hours
+Average Reopened Issues: {:.2f}
+Average Review Delay: {:.2f} hours
+Code Coverage: {:.2f}%
+Total CI Builds: {}
+Build Success Rate: {:.2f}%
+"""
+
+DEVELOPER_TEMPLATE = """Developer: {} ({})
+                Repository: {}
+                Commits (3 months): {}
+                Pull Requests: {}
+                Issues Created: {}
+                Average PR Duration: {:.2f} hours
+                Performance Level: {}
+                    """
+
+TREND_TEMPLATE = """Monthly Trend: {}
+                    Month: {}
+                    Commits: {}
+                    Active Developers: {}
+                    Activity Level: {}
+                        """
+
+KPI_TEMPLATE = """KPI Status: {}
+                        Average Merge Time: {} hours ({})
+                        Reopened Issues: {} ({})
+                        Review Delay: {} hours
+                        Overall Health: {}
+                        """
+
+ISSUE_TEMPLATE = """Issue: {}
+                    Repository: {}
+                    Labels: {}
+                    """
+
+
+def _columns(rows: Sequence[Sequence], width: int) -> List[Sequence]:
+    return list(zip(*rows)) if rows else [()] * width
+
+
+def _interned(values: Sequence, cache: Dict) -> List:
+    return [cache.setdefault(value, value) for value in values]
+
+
+def _levels(values: Sequence, high: int, medium: int, labels: Tuple[str, str, str]) -> List[str]:
+    high_label, medium_label, low_label = labels
+    return [high_label if v > high else medium_label if v > medium else low_label for v in values]
+
+
+def _chunked(contents, metadatas) -> List[Rendered]:
+    """Textes courts : un chunk strippé, identique à split_text ; les autres sont à découper"""
+    return [
+        (content.strip(), metadata, False) if len(content) < CHUNK_SIZE else (content, metadata, True)
+        for content, metadata in zip(contents, metadatas)
+    ]
+
+
+def render_repositories(rows, timestamp: str, cache: Dict) -> List[Rendered]:
+    repo_ids, names, languages, urls, commits, merge, reopened, review, coverage, builds, success = \
+        _columns(rows, 11)
+    names, languages = _interned(names, cache), _interned(languages, cache)
+    contents = map(REPOSITORY_TEMPLATE.format, names, languages, urls, commits, merge, reopened, review,
+                   coverage, builds, success)
+    metadatas = [
+        {"type": "repository", "repo_id": str(repo_id), "repo": name, "language": language,
+         "chunk_id": 0, "timestamp": timestamp}
+        for repo_id, name, language in zip(repo_ids, names, languages)
+    ]
+    return _chunked(contents, metadatas)
+
+
+def render_developers(rows, timestamp: str, cache: Dict) -> List[Rendered]:
+    user_ids, logins, names, repos, commits, prs, issues, durations = _columns(rows, 8)
+    logins, repos = _interned(logins, cache), _interned(repos, cache)
+    labels = _levels(commits, 50, 20, ("High", "Medium", "Low"))
+    contents = map(DEVELOPER_TEMPLATE.format, logins, names, repos, commits, prs, issues, durations, labels)
+    metadatas = [
+        {"type": "developer", "user_id": str(user_id), "login": login, "repo": repo,
+         "performance_level": level.lower(), "chunk_id": 0, "timestamp": timestamp}
+        for user_id, login, repo, level in zip(user_ids, logins, repos, labels)
+    ]
+    return _chunked(contents, metadatas)
+
+
+def render_trends(rows, timestamp: str, cache: Dict) -> List[Rendered]:
+    repos, months, commits, active = _columns(rows, 4)
+    repos = _interned(repos, cache)
+    # Quelques mois distincts pour des millions de lignes : un strftime par mois
+    labels = {month: month.strftime('%Y-%m') for month in set(months)}
+    months = [cache.setdefault(labels[month], labels[month]) for month in months]
+    contents = map(TREND_TEMPLATE.format, repos, months, commits, active,
+                   _levels(commits, 100, 50, ("High", "Medium", "Low")))
+    # Comme l'index existant : pas de niveau "low" dans les métadonnées des tendances
+    return [
+        (content, {"type": "trend", "repo": repo, "month": month,
+                   "activity_level": "high" if count > 100 else "medium", "timestamp": timestamp}, False)
+        for content, repo, month, count in zip(contents, repos, months, commits)
+    ]
+
+
+def _health(merge_status: str, reopened_status: str) -> str:
+    statuses = (merge_status, reopened_status)
+    return 'Critical' if 'CRITICAL' in statuses else 'Warning' if 'WARNING' in statuses else 'Good'
+
+
+def render_kpis(rows, timestamp: str, cache: Dict) -> List[Rendered]:
+    repos, merge_times, reopened, review, merge_statuses, reopened_statuses = _columns(rows, 6)
+    repos = _interned(repos, cache)
+    health = list(map(_health, merge_statuses, reopened_statuses))
+    contents = map(KPI_TEMPLATE.format, repos, merge_times, merge_statuses, reopened, reopened_statuses,
+                   review, health)
+    lower = {status: cache.setdefault(status.lower(), status.lower())
+             for status in set(merge_statuses) | set(reopened_statuses)}
+    return [
+        (content, {"type": "kpi_status", "repo": repo,
+                   "health_level": "critical" if level == "Critical" else "warning",
+                   "merge_time_status": lower[merge_status], "reopened_status": lower[reopened_status],
+                   "timestamp": timestamp}, False)
+        for content, repo, level, merge_status, reopened_status
+        in zip(contents, repos, health, merge_statuses, reopened_statuses)
+    ]
+
+
+def render_issues(rows, timestamp: str, cache: Dict) -> List[Rendered]:
+    issue_ids, titles, repos, labels = _columns(rows, 4)
+    repos, labels = _interned(repos, cache), _interned(labels, cache)
+    contents = map(ISSUE_TEMPLATE.format, titles, repos, labels)
+    metadatas = [
+        {"type": "issue", "issue_id": str(issue_id), "repo": repo, "labels": label,
+         "chunk_id": 0, "timestamp": timestamp}
+        for issue_id, repo, label in zip(issue_ids, repos, labels)
+    ]
+    return _chunked(contents, metadatas)
+
+
+RENDERERS = {
+    "repositories": render_repositories,
+    "developers": render_developers,
+    "trends": render_trends,
+    "kpi_status": render_kpis,
+    "issues": render_issues,
+}
+
+
+def render_section(section: str, rows, timestamp: str, cache: Dict = None) -> List[Rendered]:
+    return RENDERERS[section](rows, timestamp, {} if cache is None else cache)
+
+
+def render_chunk(task: Tuple[str, List, str]) -> List[Rendered]:
+    """Tâche du pool de processus : (section, lignes, timestamp)"""
+    section, rows, timestamp = task
+    return render_section(section, rows, timestamp)
+
+
+def reintern(rendered: List[Rendered], cache: Dict) -> None:
+    """Résultats venant de plusieurs processus : une instance de chaîne par valeur, tous lots confondus"""
+    for _, metadata, _ in rendered:
+        for field in INTERNED_FIELDS:
+            if field in metadata:
+                value = metadata[field]
+                metadata[field] = cache.setdefault(value, value)
+
+
+def split_rows(rows: Sequence, parts: int, min_rows: int) -> List[Sequence]:
+    """Lots contigus (l'ordre des documents est conservé) d'au moins `min_rows` lignes"""
+    size = max(min_rows, -(-len(rows) // max(parts, 1)))
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
@@ -3,6 +3,12 @@ import re
 from typing import Dict, Any, Optional
 from app.config import SYSTEM_PROMPT, RECOVERY_PROMPT
 
+_SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"})
+_LINE_COMMENT = re.compile(r'^((?:[^"\n]|"(?:\\.|[^"\\])*")*?)\s*//[^\n]*', re.MULTILINE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERALS = re.compile(r"\b(True|False|None)\b")
+_PY_LITERAL_MAP = {"True": "true", "False": "false", "None": "null"}
+
 class ResponseFormatter:
     @staticmethod
     def format_response(raw_response: str, original_query: Optional[str] = None) -> Dict[str, Any]:
@@ -19,6 +25,17 @@ class ResponseFormatter:
             if json_result["success"]:
                 return json_result
                 
+        # Local repair of near-miss JSON (no extra LLM call)
+        repaired = ResponseFormatter._repair_json(extracted_json or raw_response)
+        if repaired is not None:
+            return {
+                "type": "json",
+                "content": repaired,
+                "success": True,
+                "error": None,
+                "repaired": True
+            }
+            
         # Try to format as list if JSON fails
         list_result = ResponseFormatter._try_parse_list(raw_response)
         if list_result["success"]:
@@ -73,6 +90,59 @@ class ResponseFormatter:
                 return match.group(1).strip()
         return None
 
+    @staticmethod
+    def _repair_json(text: str) -> Optional[Dict[str, Any]]:
+        """Repair common near-miss JSON: comments, trailing commas, smart quotes,
+        Python literals and truncated output (unclosed strings/brackets)."""
+        start = text.find("{")
+        if start == -1:
+            return None
+        candidate = text[start:]
+        end = candidate.rfind("}")
+        if end != -1:
+            try:
+                parsed = json.loads(candidate[:end + 1])
+                return parsed if isinstance(parsed, dict) else None
+            except json.JSONDecodeError:
+                pass
+
+        candidate = candidate.translate(_SMART_QUOTES)
+        candidate = _LINE_COMMENT.sub(r"\1", candidate)
+        candidate = _PY_LITERALS.sub(lambda m: _PY_LITERAL_MAP[m.group(0)], candidate)
+
+        # Fermeture des chaînes et structures laissées ouvertes (réponse tronquée)
+        stack, in_string, escaped = [], False, False
+        for i, char in enumerate(candidate):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                stack.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if not stack:
+                    candidate = candidate[:i]
+                    break
+                stack.pop()
+                if not stack:
+                    candidate = candidate[:i + 1]
+                    break
+        if in_string:
+            candidate += '"'
+        candidate = candidate.rstrip().rstrip(",:") + "".join(reversed(stack))
+        candidate = _TRAILING_COMMA.sub(r"\1", candidate)
+
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
     @staticmethod
     def _try_parse_list(text: str) -> Dict[str, Any]:
         """Attempt to parse text as a list."""
@@ -0,0 +1,17 @@
+import re
+import hashlib
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Forme canonique d'une question : minuscules, espaces compactés, ponctuation finale retirée"""
+    normalized = _WHITESPACE.sub(" ", prompt.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", normalized)
+
+
+def cache_key(*parts) -> str:
+    """Clé stable (sha256) à partir de plusieurs composants"""
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,123 @@
+from typing import Any, Dict, Optional
+from app.schemas import GitHubChartResponse, TechnicalAnalysis
+
+# Sous-ensemble OpenAPI accepté par `response_schema` de Gemini
+_SUPPORTED_KEYS = {"type", "format", "description", "nullable", "enum",
+                   "properties", "required", "items", "minItems", "maxItems"}
+# Noms JSON Schema -> champs de protos.Schema (snake_case, le SDK refuse minItems)
+_RENAMED_KEYS = {"minItems": "min_items", "maxItems": "max_items"}
+_TYPE_PREFERENCE = ["number", "integer", "string", "boolean", "array", "object"]
+
+
+def _json_schema(model) -> Dict[str, Any]:
+    # Pydantic v2 (model_json_schema) ou v1 (schema)
+    if hasattr(model, "model_json_schema"):
+        return model.model_json_schema()
+    return model.schema()
+
+
+def _resolve(node: Dict[str, Any], definitions: Dict[str, Any]) -> Dict[str, Any]:
+    ref = node.get("$ref")
+    if ref:
+        return definitions[ref.split("/")[-1]]
+    if len(node.get("allOf", [])) == 1:
+        return _resolve(node["allOf"][0], definitions)
+    return node
+
+
+def to_gemini_schema(node: Dict[str, Any], definitions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convertit un JSON Schema pydantic en schéma Gemini (refs inlinées, unions réduites).
+    Retourne None pour les champs non représentables (dictionnaires libres)."""
+    node = _resolve(node, definitions)
+    nullable = False
+
+    variants = node.get("anyOf") or node.get("oneOf")
+    if variants:
+        candidates = []
+        for variant in variants:
+            variant = _resolve(variant, definitions)
+            if variant.get("type") == "null":
+                nullable = True
+            else:
+                candidates.append(variant)
+        # Union de types : on garde le plus permissif pour les valeurs de graphique
+        candidates.sort(key=lambda v: _TYPE_PREFERENCE.index(v["type"]) if v.get("type") in _TYPE_PREFERENCE else len(_TYPE_PREFERENCE))
+        converted = next(filter(None, (to_gemini_schema(c, definitions) for c in candidates)), None)
+        if converted is not None and nullable:
+            converted["nullable"] = True
+        if converted is not None and node.get("description"):
+            converted.setdefault("description", node["description"])
+        return converted
+
+    schema = {_RENAMED_KEYS.get(k, k): v for k, v in node.items() if k in _SUPPORTED_KEYS}
+    if "enum" in node and "type" not in schema:
+        schema["type"] = "string"
+
+    if schema.get("type") == "object":
+        properties = {}
+        for name, prop in node.get("properties", {}).items():
+            converted = to_gemini_schema(prop, definitions)
+            if converted is not None:
+                properties[name] = converted
+        if not properties:
+            return None  # Gemini refuse les objets sans propriétés
+        schema["properties"] = properties
+        required = [name for name in node.get("required", []) if name in properties]
+        if required:
+            schema["required"] = required
+        else:
+            schema.pop("required", None)
+    elif schema.get("type") == "array":
+        items = to_gemini_schema(node.get("items", {}), definitions)
+        if items is None:
+            return None
+        schema["items"] = items
+
+    return schema if "type" in schema else None
+
+
+def _model_schema(model) -> Dict[str, Any]:
+    raw = _json_schema(model)
+    definitions = {**raw.get("definitions", {}), **raw.get("$defs", {})}
+    return to_gemini_schema(raw, definitions)
+
+
+def build_response_schema() -> Dict[str, Any]:
+    """Schéma de la réponse JSON attendue (cf. SYSTEM_PROMPT), dérivé de
+    GitHubChartResponse pour le graphique et de TechnicalAnalysis pour l'analyse"""
+    analysis = _model_schema(TechnicalAnalysis)["properties"]
+    return {
+        "type": "object",
+        "properties": {
+            "chart": _model_schema(GitHubChartResponse),
+            "sql": {"type": "string", "description": "Requête SQL générée"},
+            "analysis": {"type": "string", "description": "3-7 lignes d'observations techniques"},
+            "insights": analysis["insights"],
+            "confidence": analysis["confidence"],
+            "kpi_insights": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "metric": {"type": "string"},
+                        "value": {"type": "number"},
+                        "status": {"type": "string", "enum": ["good", "warning", "critical"]},
+                        "recommendation": {"type": "string"}
+                    },
+                    "required": ["metric", "value", "status"]
+                }
+            },
+            "decisions": {
+                "type": "object",
+                "properties": {
+                    "priority": {"type": "string", "enum": ["high", "medium", "low"]},
+                    "actions": {"type": "array", "items": {"type": "string"}},
+                    "timeline": {"type": "string", "enum": ["immediate", "1-week", "1-month"]}
+                }
+            }
+        },
+        "required": ["analysis"]
+    }
+
+
+RESPONSE_SCHEMA = build_response_schema()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.services import gemini_client
+from app.services.ai_service import AIService
+from app.services.vector_store_manager import new_version_id, publish_version, version_path
+
+DIM = 8
+DOCUMENTS = [
+    ("Repository alpha: 120 commits, 14 contributors", {"type": "repository", "repo": "alpha"}),
+    ("Trend alpha 2024-01: 40 commits", {"type": "trend", "repo": "alpha", "month": "2024-01"}),
+    ("Repository beta: 80 commits, 9 contributors", {"type": "repository", "repo": "beta"}),
+    ("Trend beta 2024-01: 25 commits", {"type": "trend", "repo": "beta", "month": "2024-01"}),
+]
+
+
+class FakeModel:
+    """Modèle génératif local : réponse JSON fixe, générations simultanées observées"""
+
+    def __init__(self):
+        self.calls, self.running, self.peak = 0, 0, 0
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.running -= 1
+        return SimpleNamespace(text=json.dumps({"analysis": "Activité stable"}), usage_metadata=None)
+
+
+class FakeGeminiClient:
+    """Même interface que GeminiClient, sans réseau"""
+
+    def __init__(self):
+        self.generative = FakeModel()
+        self._embeddings = FakeEmbeddings(size=DIM)
+
+    def model(self, name=None):
+        return self.generative
+
+    def embed(self, texts, task_type):
+        return self._embeddings.embed_documents(texts)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    client = FakeGeminiClient()
+    monkeypatch.setattr(gemini_client, "_client", client)
+    return client
+
+
+@pytest.fixture
+def ai_service(tmp_path, gemini):
+    """AIService sur un petit index publié dans tmp_path (embeddings factices)"""
+    root = str(tmp_path / "vector_store")
+    embeddings = FakeEmbeddings(size=DIM)
+    store = FAISS.from_texts([text for text, _ in DOCUMENTS], embeddings,
+                             metadatas=[metadata for _, metadata in DOCUMENTS])
+    version = new_version_id()
+    store.save_local(version_path(root, version))
+    publish_version(root, version)
+    return AIService(embeddings, root=root, query_log_path=str(tmp_path / "queries.jsonl"))
@@ -0,0 +1,37 @@
+import json
+import threading
+
+from app.services import answer_store
+from app.services.answer_store import QueryLog
+
+
+def test_record_only_buffers_until_the_threshold(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), flush_every=2)
+    assert log.record("commits de react") is False
+    assert not (tmp_path / "queries.jsonl").exists()
+    assert log.record("commits de vue") is True
+    log.flush()
+    assert len((tmp_path / "queries.jsonl").read_text().splitlines()) == 2
+
+
+def test_appends_during_compaction_are_not_lost(tmp_path, monkeypatch):
+    path = str(tmp_path / "queries.jsonl")
+    compacting, other = QueryLog(path), QueryLog(path)
+    compacting.record("commits de react")
+    other.record("bugs de vue")
+
+    real_replace = answer_store.os.replace
+    writer = threading.Thread(target=other.flush)
+
+    def replace_while_another_worker_appends(src, dst):
+        writer.start()
+        writer.join(timeout=0.2)
+        assert writer.is_alive()  # L'ajout attend la fin du compactage
+        real_replace(src, dst)
+
+    monkeypatch.setattr(answer_store.os, "replace", replace_while_another_worker_appends)
+    compacting.top_queries(limit=10, min_count=1, since_days=1)
+    writer.join()
+
+    prompts = [json.loads(line)["prompt"] for line in open(path, encoding="utf-8")]
+    assert prompts == ["commits de react", "bugs de vue"]
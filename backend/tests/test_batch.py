@@ -0,0 +1,40 @@
+import asyncio
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.config import BATCH_GENERATION_CONCURRENCY
+from app.schemas import GitHubQuery
+from app.services.vector_search import search_by_vectors
+
+
+def test_search_by_vectors_matches_one_search_per_query():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8)).astype("float32")
+    store = FAISS.from_embeddings([(f"doc {i}", v.tolist()) for i, v in enumerate(vectors)], FakeEmbeddings(size=8))
+    queries = rng.normal(size=(5, 8)).astype("float32")
+
+    batched = search_by_vectors(store, queries, k=4)
+    for query, hits in zip(queries, batched):
+        expected = store.similarity_search_with_score_by_vector(query.tolist(), k=4)
+        assert [doc.page_content for doc, _ in hits] == [doc.page_content for doc, _ in expected]
+        assert np.allclose([score for _, score in hits], [score for _, score in expected], rtol=1e-5)
+
+
+def test_concurrent_batches_share_the_generation_limit(ai_service, gemini):
+    size = BATCH_GENERATION_CONCURRENCY
+    # Questions distinctes : aucune génération partagée entre les deux lots
+    first_batch = [GitHubQuery(prompt=f"Show the commit trend over time #{i}") for i in range(size)]
+    second_batch = [GitHubQuery(prompt=f"Show the commit trend over time #{i}") for i in range(size, 2 * size)]
+
+    async def two_batches():
+        return await asyncio.gather(ai_service.generate_batch(first_batch), ai_service.generate_batch(second_batch))
+
+    first, second = asyncio.run(two_batches())
+    assert not ai_service.degraded
+    assert gemini.generative.calls == 2 * size
+    assert gemini.generative.peak == size
+    assert [result["index"] for result in first] == list(range(size))
+    assert all("error" not in result for result in first + second)
+    assert all(result["response"] == {"analysis": "Activité stable"} for result in first + second)
@@ -0,0 +1,145 @@
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import FakeEmbeddings
+
+from app import change_capture
+from app.change_capture import TRACKED_SOURCES, ChangeCaptureIngester, _upsert_store, detect_changes
+
+
+def _warehouse():
+    conn = sqlite3.connect(":memory:")
+    for table, column, repo_column, key_column in TRACKED_SOURCES:
+        columns = dict.fromkeys([column, repo_column, key_column])
+        conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+    conn.execute("CREATE TABLE date_dim (date_id INTEGER, full_date TEXT)")
+    conn.executemany("INSERT INTO date_dim VALUES (?, ?)",
+                     [(20240100 + day, f"2024-01-{day:02d}") for day in range(1, 32)])
+    return conn
+
+
+def _insert_kpi(conn, kpi_id, repo_id, date_id):
+    conn.execute("INSERT INTO kpi_result (kpi_id, repo_id, date_id) VALUES (?, ?, ?)", (kpi_id, repo_id, date_id))
+
+
+def _insert_commit(conn, commit_id, repo_id, timestamp):
+    conn.execute("INSERT INTO commit_dim (commit_id, repo_id, commit_timestamp) VALUES (?, ?, ?)",
+                 (commit_id, repo_id, timestamp))
+
+
+def test_first_pass_only_initialises_watermarks():
+    conn = _warehouse()
+    _insert_commit(conn, "c1", 1, "2024-01-01T10:00:00")
+    affected, watermarks = detect_changes(conn, {})
+    assert affected == set()
+    assert watermarks["commit_dim.commit_timestamp"] == {"value": "2024-01-01T10:00:00", "keys": ["c1"]}
+
+
+def test_rows_at_the_watermark_value_are_not_lost():
+    conn = _warehouse()
+    _insert_commit(conn, "c1", 1, "2024-01-01T10:00:00")
+    _, watermarks = detect_changes(conn, {})
+    # Même horodatage que le watermark, inséré après le cycle précédent
+    _insert_commit(conn, "c2", 2, "2024-01-01T10:00:00")
+    affected, watermarks = detect_changes(conn, watermarks)
+    assert affected == {2}
+    assert watermarks["commit_dim.commit_timestamp"]["keys"] == ["c1", "c2"]
+
+    affected, _ = detect_changes(conn, watermarks)
+    assert affected == set()
+
+
+def test_newer_rows_move_the_watermark():
+    conn = _warehouse()
+    _insert_commit(conn, "c1", 1, "2024-01-01T10:00:00")
+    _, watermarks = detect_changes(conn, {})
+    _insert_commit(conn, "c2", 3, "2024-01-02T08:00:00")
+    affected, watermarks = detect_changes(conn, watermarks)
+    assert affected == {3}
+    assert watermarks["commit_dim.commit_timestamp"] == {"value": "2024-01-02T08:00:00", "keys": ["c2"]}
+
+
+def test_first_pass_replays_rows_written_since_the_full_build():
+    conn = _warehouse()
+    _insert_commit(conn, "c1", 1, "2024-01-01T10:00:00")
+    _insert_commit(conn, "c2", 2, "2024-01-05T09:00:00")  # Pendant la construction
+    _insert_kpi(conn, 1, 3, 20240104)
+    _insert_kpi(conn, 2, 4, 20240106)
+    affected, watermarks = detect_changes(conn, {}, since=datetime(2024, 1, 5, 8, 0))
+    assert affected == {2, 4}
+    assert watermarks["kpi_result.date_id"] == {"value": 20240106, "keys": ["2"]}
+
+
+def test_rows_sharing_repo_and_date_are_told_apart_by_primary_key():
+    conn = _warehouse()
+    _insert_kpi(conn, 1, 7, 20240110)
+    _, watermarks = detect_changes(conn, {})
+    # Deuxième KPI du même dépôt et du même jour
+    _insert_kpi(conn, 2, 7, 20240110)
+    affected, watermarks = detect_changes(conn, watermarks)
+    assert affected == {7}
+    assert watermarks["kpi_result.date_id"]["keys"] == ["1", "2"]
+
+
+def test_legacy_scalar_watermark_is_accepted():
+    conn = _warehouse()
+    _insert_commit(conn, "c1", 1, "2024-01-01T10:00:00")
+    _insert_commit(conn, "c2", 2, "2024-01-03T10:00:00")
+    affected, _ = detect_changes(conn, {"commit_dim.commit_timestamp": "2024-01-02T00:00:00"})
+    assert 2 in affected and 1 not in affected
+
+
+def _store(entries):
+    vectors = np.eye(len(entries), 4, dtype="float32")
+    return FAISS.from_embeddings(
+        [(text, vector.tolist()) for (text, _), vector in zip(entries, vectors)],
+        FakeEmbeddings(size=4), metadatas=[metadata for _, metadata in entries]
+    )
+
+
+def _documents(store):
+    return [store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()]
+
+
+def test_upsert_keeps_representatives_shared_with_unchanged_repos(tmp_path):
+    store = _store([
+        ("alpha only", {"type": "issue", "repo": "alpha"}),
+        ("shared", {"type": "issue", "repo": "alpha", "repos": ["alpha", "beta", "gamma"]}),
+        ("beta only", {"type": "issue", "repo": "beta"}),
+    ])
+    _upsert_store(store, {"Alpha"}, ["alpha new"], [[0, 0, 0, 1]], [{"type": "issue", "repo": "alpha"}],
+                  str(tmp_path / "out"), str(tmp_path / "previous"))
+
+    by_text = {doc.page_content: doc.metadata for doc in _documents(store)}
+    assert set(by_text) == {"shared", "beta only", "alpha new"}
+    assert by_text["shared"]["repos"] == ["beta", "gamma"]
+    assert by_text["shared"]["repo"] == "beta"
+    assert store.index.ntotal == 3
+
+
+def test_upsert_drops_representatives_of_changed_repos_only(tmp_path):
+    store = _store([
+        ("shared", {"type": "issue", "repo": "alpha", "repos": ["alpha", "beta"]}),
+        ("gamma", {"type": "issue", "repo": "gamma"}),
+    ])
+    _upsert_store(store, {"alpha", "beta"}, [], [], [], str(tmp_path / "out"), str(tmp_path / "previous"))
+    assert [doc.page_content for doc in _documents(store)] == ["gamma"]
+
+
+def test_failed_upsert_drops_the_mutated_store(tmp_path, monkeypatch):
+    ingester = ChangeCaptureIngester(root=str(tmp_path))
+    ingester.store = _store([("alpha", {"type": "issue", "repo": "alpha"}),
+                             ("beta", {"type": "issue", "repo": "beta"})])
+    ingester.version = "20240101T000000000000"
+
+    def fail(root, version):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(change_capture, "publish_version", fail)
+    with pytest.raises(OSError):
+        ingester.upsert({"alpha"}, [])
+    # Documents d'alpha déjà supprimés du store en mémoire : rechargé au prochain cycle
+    assert ingester.store is None and ingester.version is None
@@ -0,0 +1,97 @@
+import asyncio
+import uuid
+
+from app.schemas import GitHubQuery
+from app.services.chat_channel import ChatConnection
+
+
+class _StreamingService:
+    """Génération simulée : graphiques exacts, deux tentatives en flux puis réponse"""
+
+    async def generate_response(self, query, on_aggregates=None, on_text=None):
+        on_aggregates("trend", [{"chart": "commits"}], "v1")
+        on_text(0, '{"analysis": ')
+        on_text(1, '{"analysis": "ok"')
+        on_text(1, "}")
+        return {"session_id": query.session_id, "response": {"analysis": "ok"}}
+
+
+def _frames(connection):
+    frames = []
+    while not connection._outbox.empty():
+        frames.append(connection._outbox.get_nowait())
+    return frames
+
+
+def test_answer_streams_deltas_before_the_final_answer():
+    session_id = str(uuid.uuid4())
+    connection = ChatConnection(None, _StreamingService(), None, session_id=session_id, tenant=None,
+                                client="127.0.0.1", data_version="v1")
+    query = GitHubQuery(prompt="How active is alpha?", session_id=session_id)
+    asyncio.run(connection._answer("q1", query))
+
+    frames = _frames(connection)
+    assert [frame["type"] for frame in frames] == ["partial", "delta", "delta", "delta", "answer"]
+    deltas = [(frame["attempt"], frame["text"]) for frame in frames if frame["type"] == "delta"]
+    assert deltas == [(0, '{"analysis": '), (1, '{"analysis": "ok"'), (1, "}")]
+    assert all(frame["id"] == "q1" for frame in frames)
+
+
+class _SlowService:
+    async def generate_response(self, query, on_aggregates=None, on_text=None):
+        await asyncio.sleep(10)
+
+
+class _DisconnectingSocket:
+    """Envoie une question puis se déconnecte pendant sa génération"""
+
+    def __init__(self):
+        self.messages = ['{"type": "query", "id": "q1", "prompt": "How active is alpha?"}']
+
+    async def receive_text(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.sleep(0.01)
+        raise ConnectionError("client disconnected")
+
+    async def send_text(self, text):
+        pass
+
+
+class _Unlimited:
+    def check(self, client):
+        pass
+
+
+def test_cancelled_answer_stays_cancelled():
+    session_id = str(uuid.uuid4())
+    connection = ChatConnection(None, _SlowService(), None, session_id=session_id, tenant=None,
+                                client="127.0.0.1", data_version="v1")
+    query = GitHubQuery(prompt="How active is alpha?", session_id=session_id)
+
+    async def cancel_answer():
+        task = asyncio.create_task(connection._answer("q1", query))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    task = asyncio.run(cancel_answer())
+    assert task.cancelled()
+    assert _frames(connection) == [{"type": "cancelled", "id": "q1"}]
+
+
+def test_teardown_does_not_flag_a_server_close():
+    connection = ChatConnection(_DisconnectingSocket(), _SlowService(), _Unlimited(), session_id=str(uuid.uuid4()),
+                                tenant=None, client="127.0.0.1", data_version="v1")
+
+    async def run():
+        await connection.run()
+        answers = list(connection._tasks.values())
+        await asyncio.gather(*answers, return_exceptions=True)
+        return answers
+
+    answers = asyncio.run(run())
+    assert len(answers) == 1 and answers[0].cancelled()
+    assert connection.closed_by_server is False
+    assert connection._outbox.empty()
@@ -0,0 +1,21 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+
+
+def _request(host, client_header=None):
+    headers = {"X-Client-ID": client_header} if client_header else {}
+    return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers)
+
+
+def test_direct_clients_are_keyed_on_peer_address(monkeypatch):
+    monkeypatch.setattr(main, "TRUSTED_PROXIES", set())
+    assert main.client_id(_request("203.0.113.7", "spoofed")) == "203.0.113.7"
+
+
+@pytest.mark.parametrize("header, expected", [("user-42", "user-42"), (None, "10.0.0.2")])
+def test_trusted_proxy_may_set_client_id(monkeypatch, header, expected):
+    monkeypatch.setattr(main, "TRUSTED_PROXIES", {"10.0.0.2"})
+    assert main.client_id(_request("10.0.0.2", header)) == expected
@@ -0,0 +1,60 @@
+import pytest
+
+from app.utils.decomposition import decompose_query, mentioned_repos
+
+REPOS = ["org/alpha", "org/beta", "org/gamma"]
+
+
+def _entities(prompt, known=(), explicit=None):
+    return [sub["entity"] for sub in decompose_query(prompt, known, explicit)]
+
+
+@pytest.mark.parametrize("prompt", [
+    "How many commits between January and March?",
+    "Merge time from Q1 to Q3 2024",
+    "Commits entre mars et juin 2024",
+    "Issues opened between 2023-01 and 2023-06",
+])
+def test_date_ranges_are_not_entities(prompt):
+    assert _entities(prompt, REPOS) == []
+
+
+def test_date_range_is_kept_in_each_sub_query():
+    subs = decompose_query("Compare alpha and beta between January and March", REPOS)
+    assert [sub["entity"] for sub in subs] == ["org/alpha", "org/beta"]
+    assert subs[0]["text"] == "org/alpha: Compare alpha between January and March"
+
+
+@pytest.mark.parametrize("prompt", [
+    "Compare code coverage and bug density",
+    "Compare code coverage and bug density for alpha",
+    "Commits, PRs and issues of alpha vs last year",
+    "Compare frontend and backend between May and July",
+])
+def test_metric_enumerations_stay_one_query(prompt):
+    assert _entities(prompt, REPOS) == []
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("alpha vs beta vs gamma", ["org/alpha", "org/beta", "org/gamma"]),
+    ("Difference between alpha and beta", ["org/alpha", "org/beta"]),
+    ("Show the commits of alpha and gamma", ["org/alpha", "org/gamma"]),
+    ("How is alpha doing?", []),
+])
+def test_known_repos_mentioned(prompt, expected):
+    assert _entities(prompt, REPOS) == expected
+
+
+def test_explicit_repos_take_priority():
+    assert _entities("Compare them", REPOS, explicit=["Org/Gamma", "org/alpha"]) == ["org/gamma", "org/alpha"]
+
+
+def test_sub_query_keeps_the_topic():
+    subs = decompose_query("Compare alpha, beta and gamma on merge time", REPOS)
+    assert [sub["entity"] for sub in subs] == ["org/alpha", "org/beta", "org/gamma"]
+    assert subs[1]["text"] == "org/beta: Compare beta on merge time"
+
+
+def test_mentioned_repos_in_order_of_appearance():
+    assert mentioned_repos("beta is slower than org/alpha", REPOS) == ["org/beta", "org/alpha"]
+    assert mentioned_repos("alphabet soup", REPOS) == []
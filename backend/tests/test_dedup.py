@@ -0,0 +1,68 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from app.utils.dedup import NUM_PERM, _shingles, deduplicate_documents, minhash_signatures, near_duplicate_clusters
+
+ISSUE = "Issue: Crash on startup when the config file is missing\n Repository: {}\n Labels: bug"
+
+
+def test_signatures_are_deterministic_and_whitespace_insensitive():
+    first = minhash_signatures(["Hello   World", "hello world"])
+    assert first.shape == (2, NUM_PERM)
+    assert (first[0] == first[1]).all()
+    assert (minhash_signatures(["hello world"]) == first[:1]).all()
+
+
+def test_near_duplicates_cluster_and_distinct_texts_do_not():
+    texts = [ISSUE.format("alpha"), ISSUE.format("beta"), "Monthly Trend: gamma, 120 commits, 8 developers"]
+    clusters = sorted(sorted(cluster) for cluster in near_duplicate_clusters(texts, threshold=0.8))
+    assert clusters == [[0, 1], [2]]
+
+
+def test_threshold_is_enforced():
+    texts = [ISSUE.format("alpha"), ISSUE.format("a-much-longer-repository-name")]
+    assert len(near_duplicate_clusters(texts, threshold=0.99)) == 2
+
+
+def test_deduplicate_keeps_one_representative_with_aggregated_metadata():
+    documents = [
+        Document(page_content=ISSUE.format(repo), metadata={"type": "issue", "repo": repo, "issue_id": str(i)})
+        for i, repo in enumerate(["alpha", "beta", "alpha"])
+    ]
+    documents.append(Document(page_content=ISSUE.format("alpha"), metadata={"type": "repository", "repo": "alpha"}))
+
+    kept, removed = deduplicate_documents(documents, ["issue"], threshold=0.8)
+    assert removed == {"issue": 2}
+    assert [doc.metadata["type"] for doc in kept] == ["issue", "repository"]  # Autres types intacts
+    representative = kept[0].metadata
+    assert representative["duplicate_count"] == 3
+    assert representative["repos"] == ["alpha", "beta"]
+    assert representative["issue_ids"] == ["0", "1", "2"]
+
+
+def test_single_document_is_untouched():
+    document = Document(page_content="only one", metadata={"type": "issue"})
+    kept, removed = deduplicate_documents([document], ["issue"], threshold=0.8)
+    assert kept == [document] and removed == {"issue": 0}
+    assert near_duplicate_clusters([], 0.8) == []
+    assert minhash_signatures([]).shape == (0, NUM_PERM)
+
+
+def test_documents_differing_only_in_numbers_are_kept():
+    # Tendances mensuelles : même texte, chiffres différents -> Jaccard estimé élevé mais données distinctes
+    trend = ("Monthly Trend: react\n Month: 2024-0{}\n Commits: {}\n Active Developers: 12\n"
+             " Activity Level: High")
+    texts = [trend.format(month, commits) for month, commits in [(1, 101), (2, 102), (3, 103)]]
+    assert sorted(map(sorted, near_duplicate_clusters(texts, threshold=0.5))) == [[0], [1], [2]]
+    assert near_duplicate_clusters([texts[0], texts[0]], threshold=0.5) == [[0, 1]]
+
+
+def test_signatures_match_exact_universal_hashing():
+    prime = (1 << 61) - 1
+    text = "exact modular arithmetic"
+    rng = np.random.default_rng(1)
+    a = rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, prime, size=NUM_PERM, dtype=np.uint64)
+    hashes = [int(h) for h in _shingles(text)]
+    expected = [min((h * int(a_i) + int(b_i)) % prime for h in hashes) for a_i, b_i in zip(a, b)]
+    assert minhash_signatures([text])[0].tolist() == expected
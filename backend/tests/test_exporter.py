@@ -0,0 +1,67 @@
+import csv
+import io
+import sqlite3
+
+import pytest
+
+from app.config import EXPORT
+from app.services.exporter import ExportError, open_export
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "warehouse.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE repo_dim (repo_id INTEGER, name TEXT);
+        CREATE TABLE user_dim (user_id INTEGER, login TEXT);
+        CREATE TABLE commit_dim (commit_id TEXT, repo_id INTEGER, author_id INTEGER, commit_timestamp TEXT);
+        INSERT INTO repo_dim VALUES (1, 'alpha'), (2, 'beta');
+        INSERT INTO user_dim VALUES (10, 'ada');
+        INSERT INTO commit_dim VALUES ('c1', 1, 10, '2024-01-01T10:00:00'), ('c2', 2, 10, '2024-02-01T10:00:00');
+    """)
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(EXPORT, "snapshot_path", path)
+    return path
+
+
+def test_raw_rows_export_from_snapshot(snapshot):
+    stream, headers = open_export("commits", "csv", repos=["beta"])
+    rows = list(csv.reader(io.StringIO(b"".join(stream).decode())))
+    assert headers["Content-Type"].startswith("text/csv")
+    assert rows == [["commit_id", "repo", "author", "commit_timestamp"],
+                    ["c2", "beta", "ada", "2024-02-01 10:00:00"]]
+
+
+def test_aggregates_are_rejected_in_snapshot_mode(snapshot):
+    with pytest.raises(ExportError, match="SQLite snapshot"):
+        open_export("repositories", "csv")
+
+
+def test_closing_an_unread_stream_releases_the_cursor(snapshot):
+    stream, _ = open_export("commits", "csv")
+    stream.close()
+    assert stream.export.closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        stream.export.conn.execute("SELECT 1")
+
+
+def test_export_endpoint_requires_admin_token_and_is_not_gzipped(snapshot, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+
+    conn = sqlite3.connect(snapshot)
+    conn.executemany("INSERT INTO commit_dim VALUES (?, 1, 10, '2024-03-01T10:00:00')",
+                     [(f"c{i}",) for i in range(3, 200)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    client = TestClient(main.app)
+
+    assert client.get("/export/commits", params={"format": "csv"}).status_code == 403
+    response = client.get("/export/commits", params={"format": "csv"},
+                          headers={"X-Admin-Token": "secret", "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert len(response.text.splitlines()) == 200  # En-tête + 199 commits
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+from google.generativeai import client as genai_client
+
+from app.services import gemini_client
+from app.services.gemini_client import GeminiClient, close_gemini_client
+
+
+def test_close_releases_sdk_channels(monkeypatch):
+    monkeypatch.setattr(gemini_client, "_client", GeminiClient(api_key="test-key", transport="grpc"))
+    service = genai_client.get_default_generative_async_client()
+
+    asyncio.run(close_gemini_client())
+
+    assert gemini_client._client is None
+    assert genai_client._client_manager.clients == {}
+    with pytest.raises(ValueError, match="closed channel"):
+        asyncio.run(service.count_tokens(model="models/gemini-pro", contents=[]))
@@ -0,0 +1,51 @@
+import fcntl
+import os
+import threading
+
+import pytest
+
+from app.services import index_builder
+from app.services.index_builder import LOCK_FILE, _build_with_lock, _write_progress
+
+
+@pytest.fixture
+def held_lock(tmp_path, monkeypatch):
+    """Verrou de construction tenu par un « autre worker »"""
+    monkeypatch.setattr(index_builder, "POLL_INTERVAL", 0.01)
+    lock = open(os.path.join(tmp_path, LOCK_FILE), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    yield lock
+    lock.close()
+
+
+def _waiter(root, ready):
+    thread = threading.Thread(target=_build_with_lock, args=(str(root), ready.append), daemon=True)
+    thread.start()
+    return thread
+
+
+def test_waiting_worker_gives_up_when_the_builder_fails(tmp_path, held_lock):
+    ready = []
+    thread = _waiter(tmp_path, ready)
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    _write_progress(str(tmp_path), state="failed", error="quota exceeded")
+    fcntl.flock(held_lock, fcntl.LOCK_UN)
+    thread.join(2)
+    assert not thread.is_alive()
+    assert ready == []
+
+
+def test_waiting_worker_loads_the_published_version(tmp_path, held_lock):
+    ready = []
+    thread = _waiter(tmp_path, ready)
+    thread.join(0.1)
+
+    version = tmp_path / "versions" / "20240101T000000000000"
+    version.mkdir(parents=True)
+    (version / "index.faiss").write_bytes(b"")
+    (version / "index.pkl").write_bytes(b"")
+    thread.join(2)
+    assert not thread.is_alive()
+    assert ready == ["20240101T000000000000"]
@@ -0,0 +1,166 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import AIMDLimiter, OverloadedError, RateLimiter, TokenBucket, backoff_delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge monotone contrôlée par le test"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now.value)
+    return now
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert all(bucket.try_acquire()[0] for _ in range(4))
+    allowed, retry_after = bucket.try_acquire()
+    assert not allowed and retry_after == pytest.approx(0.5)
+
+    clock.value += 1
+    assert bucket.try_acquire(2) == (True, 0.0)
+    assert not bucket.try_acquire()[0]
+
+
+def test_token_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    clock.value += 60
+    assert bucket.try_acquire(3)[0]
+    assert not bucket.try_acquire()[0]
+    bucket.refund(10)
+    assert bucket.tokens == 3
+
+
+def test_client_limit_is_per_client(clock):
+    limiter = RateLimiter(per_client_per_minute=2, global_per_minute=100)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(OverloadedError, match="Client"):
+        limiter.check("a")
+    limiter.check("b")
+
+
+def test_global_rejection_does_not_charge_the_client(clock):
+    limiter = RateLimiter(per_client_per_minute=2, global_per_minute=1)
+    limiter.check("a")
+    for _ in range(3):
+        with pytest.raises(OverloadedError, match="Service"):
+            limiter.check("b")
+    # Le seau global se remplit : "b" n'a rien consommé pendant les refus
+    clock.value += 60
+    limiter.check("b")
+    limiter.global_bucket.refund()
+    limiter.check("b")
+
+
+def test_cost_above_client_limit_is_rejected(clock):
+    limiter = RateLimiter(per_client_per_minute=2, global_per_minute=100)
+    with pytest.raises(OverloadedError) as error:
+        limiter.check("a", cost=3)
+    assert error.value.retry_after == 60
+
+
+def test_aimd_increases_additively_and_decreases_multiplicatively():
+    limiter = AIMDLimiter(initial=4, minimum=1, maximum=8, acquire_timeout=1, max_waiting=2)
+    limiter.on_success()
+    assert limiter.limit == pytest.approx(4.25)
+    limiter.on_overload()
+    assert limiter.limit == pytest.approx(2.125)
+    for _ in range(5):
+        limiter.on_overload()
+    assert limiter.limit == 1
+
+
+def test_aimd_slot_shrinks_on_provider_overload():
+    limiter = AIMDLimiter(initial=4, minimum=1, maximum=8, acquire_timeout=1, max_waiting=2,
+                          overload_errors=(TimeoutError,))
+
+    async def overloaded_call():
+        async with limiter.slot():
+            raise TimeoutError
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(overloaded_call())
+    assert limiter.limit == 2 and limiter.in_flight == 0
+
+
+def test_aimd_rejects_when_queue_is_full():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, acquire_timeout=0.05, max_waiting=1)
+
+    async def until(predicate):
+        while not predicate():
+            await asyncio.sleep(0)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await until(lambda: limiter.in_flight == 1)
+        waiter = asyncio.create_task(limiter._acquire())
+        await until(lambda: limiter.waiting == 1)
+        with pytest.raises(OverloadedError, match="pending"):
+            await limiter._acquire()
+        with pytest.raises(OverloadedError, match="concurrency"):
+            await waiter
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0
+
+
+def test_blocking_slot_shares_the_limit_with_async_calls():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=4, acquire_timeout=1, max_waiting=2,
+                          overload_errors=(TimeoutError,))
+    entered = []
+
+    def threaded_call(fail=False):
+        with limiter.blocking_slot():
+            entered.append(limiter.in_flight)
+            if fail:
+                raise TimeoutError
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        while limiter.in_flight != 1:
+            await asyncio.sleep(0)
+        thread = asyncio.create_task(asyncio.to_thread(threaded_call))
+        while limiter.waiting != 1:
+            await asyncio.sleep(0.001)
+        assert entered == []  # Le thread attend la place tenue par l'appel asynchrone
+        release.set()
+        await asyncio.gather(holder, thread)
+        with pytest.raises(TimeoutError):
+            await asyncio.to_thread(threaded_call, True)
+        while limiter.in_flight:
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert entered == [1, 1]
+    # Deux succès (1 -> 2 -> 2.5) puis une surcharge depuis le thread (/ 2)
+    assert limiter.limit == pytest.approx(1.25)
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+
+def test_blocking_slot_without_event_loop_is_unlimited():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, acquire_timeout=0.05, max_waiting=0)
+    with limiter.blocking_slot(), limiter.blocking_slot():
+        assert limiter.in_flight == 0
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt, base=1, cap=5) <= 5 for attempt in range(10))
@@ -0,0 +1,57 @@
+from google.generativeai import protos
+from google.generativeai.types import generation_types
+
+from app.utils.response_schema import RESPONSE_SCHEMA
+
+
+def _keys(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield key
+            yield from _keys(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _keys(value)
+
+
+def test_schema_uses_sdk_field_names():
+    keys = set(_keys(RESPONSE_SCHEMA))
+    assert "minItems" not in keys and "maxItems" not in keys
+    assert "min_items" in keys
+
+
+def test_schema_converts_to_generation_config():
+    # Même conversion que GenerativeModel._prepare_request
+    config = generation_types.to_generation_config_dict({
+        "response_mime_type": "application/json",
+        "response_schema": RESPONSE_SCHEMA,
+    })
+    proto = protos.GenerationConfig(config)
+    schema = proto.response_schema
+    assert schema.type_ == protos.Type.OBJECT
+    assert list(schema.required) == ["analysis"]
+    assert schema.properties["insights"].min_items == 1
+
+
+
+def test_precomputed_network_chart_replaces_the_generated_one():
+    from app.services.ai_service import AIService
+
+    network = {"type": "repo_network", "title": "Dépôts liés", "labels": ["a", "b"], "datasets": [
+        {"label": "contributors", "data": [3, 2]},
+        {"label": "shared_contributor_similarity", "data": [{"source": 0, "target": 1, "weight": 0.5}]}
+    ]}
+    charts = AIService._precomputed_charts([{"type": "timeseries", "chart": {}},
+                                            {"type": "repo_graph", "repo_network": network}])
+    generated = {"success": True, "type": "json", "content": {
+        "chart": {"type": "repo_network", "title": "Réseau", "labels": ["a"], "datasets": [{"data": [1]}]},
+        "analysis": "a et b partagent des contributeurs"
+    }}
+
+    formatted = AIService._with_precomputed_chart(generated, charts)
+    assert formatted["content"]["chart"] == network
+    assert formatted["content"]["analysis"] == generated["content"]["analysis"]
+    assert generated["content"]["chart"]["title"] == "Réseau"  # Réponse partagée non modifiée
+
+    bar = {**generated, "content": {**generated["content"], "chart": {"type": "bar"}}}
+    assert AIService._with_precomputed_chart(bar, charts) is bar
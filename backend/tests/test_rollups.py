@@ -0,0 +1,89 @@
+from datetime import date
+
+import numpy as np
+
+from app.services.rollups import RollupStore, lttb
+
+ROWS = [
+    ("alpha", "2024-01-01", "commits", 3),
+    ("alpha", "2024-01-01", "commits", 2),
+    ("alpha", "2024-01-03", "issues", 1),
+    ("alpha", "2024-02-10", "commits", 4),
+    ("beta", "2024-01-02", "commits", 7),
+]
+
+
+def _data(chart):
+    return {dataset["label"]: dataset["data"] for dataset in chart["datasets"]}
+
+
+def test_daily_weekly_and_monthly_sums():
+    store = RollupStore.build(ROWS)
+    daily = store.series(["alpha"], date(2024, 1, 1), date(2024, 1, 3), granularity="day",
+                         metrics=["commits", "issues"])
+    assert daily["labels"] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert _data(daily) == {"alpha commits": [5, 0, 0], "alpha issues": [0, 0, 1]}
+
+    monthly = store.series(["Alpha", "beta"], date(2024, 1, 1), date(2024, 2, 29), granularity="month")
+    assert monthly["labels"] == ["2024-01", "2024-02"]
+    assert _data(monthly) == {"Alpha commits": [5, 4], "beta commits": [7, 0]}
+
+    weekly = store.series(["alpha"], date(2024, 1, 1), date(2024, 1, 14), granularity="week")
+    assert weekly["labels"] == ["2024-01-01", "2024-01-08"]  # Semaines commençant le lundi
+    assert store.series(["unknown"], date(2024, 1, 1), date(2024, 1, 3)) is None
+
+
+def test_replace_repos_swaps_only_the_updated_series():
+    store = RollupStore.build(ROWS)
+    update = RollupStore.build([
+        ("ALPHA", "2024-01-02", "commits", 1),
+        ("gamma", "2024-01-02", "builds", 9),
+    ])
+    merged = store.replace_repos(["alpha", "gamma"], update)
+
+    assert merged.repos == ["alpha", "beta", "gamma"]
+    chart = merged.series(["alpha", "beta", "gamma"], date(2024, 1, 1), date(2024, 2, 29),
+                          granularity="month", metrics=["commits", "builds"])
+    assert _data(chart) == {
+        "alpha commits": [1, 0], "alpha builds": [0, 0],  # Anciennes lignes d'alpha (février incluses) retirées
+        "beta commits": [7, 0], "beta builds": [0, 0],
+        "gamma commits": [0, 0], "gamma builds": [9, 0],
+    }
+    # Instance d'origine inchangée
+    assert _data(store.series(["alpha"], date(2024, 2, 1), date(2024, 2, 29), granularity="month")) == \
+        {"alpha commits": [4]}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = RollupStore.build(ROWS)
+    store.save(str(tmp_path))
+    loaded = RollupStore.load(str(tmp_path))
+    assert loaded.repos == store.repos
+    assert loaded.latest_day() == date(2024, 2, 10)
+    for granularity, arrays in store.arrays.items():
+        assert all(np.array_equal(a, b) for a, b in zip(arrays, loaded.arrays[granularity]))
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype="float64")
+    y = np.zeros(1000)
+    y[[137, 512, 801]] = [50, -40, 90]
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert {137, 512, 801} <= set(kept.tolist())
+
+
+def test_lttb_returns_everything_below_threshold():
+    x = np.arange(10, dtype="float64")
+    assert lttb(x, x, 20).tolist() == list(range(10))
+    assert lttb(x, x, 2).tolist() == list(range(10))
+
+
+def test_long_ranges_are_downsampled():
+    rows = [("alpha", str(np.datetime64("2023-01-01") + i), "commits", i % 7) for i in range(365)]
+    chart = RollupStore.build(rows).series(["alpha"], date(2023, 1, 1), date(2023, 12, 31),
+                                           granularity="day", max_points=60)
+    assert chart["downsampled"] and len(chart["labels"]) == 60
+    assert chart["labels"][0] == "2023-01-01" and chart["labels"][-1] == "2023-12-31"
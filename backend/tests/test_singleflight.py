@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+from app.utils.normalizers import cache_key, normalize_prompt
+
+
+def test_identical_calls_share_one_execution():
+    flight, calls = SingleFlight("test"), []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": 42}
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("k", generate) for _ in range(5)))
+        return results, flight.in_flight
+
+    results, in_flight = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert in_flight == 0
+
+
+def test_distinct_keys_run_separately():
+    flight = SingleFlight("test")
+
+    async def scenario():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0, "a")),
+                                    flight.do("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight, calls = SingleFlight("test"), []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+        with pytest.raises(RuntimeError):
+            await flight.do("k", failing)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 2  # Nouvel appel après l'échec : pas de résultat mémorisé
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+
+    async def generate():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("k", generate))
+        second = asyncio.create_task(flight.do("k", generate))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("done", True)
+
+
+def test_equivalent_prompts_share_a_key():
+    assert normalize_prompt("  Top   contributors of Alpha?? ") == "top contributors of alpha"
+    assert cache_key(normalize_prompt("Top contributors?"), None, []) == cache_key("top contributors", None, [])
+    assert cache_key("top contributors", "v1") != cache_key("top contributors", "v2")
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.services.vector_search import MetadataIndex, register_full_precision, search_by_vectors, search_subset
+
+METADATAS = [
+    {"type": "repository", "repo": "Alpha"},
+    {"type": "trend", "repo": "alpha", "month": "2024-01"},
+    {"type": "trend", "repo": "beta", "month": "2024-03"},
+    {"type": "issue", "repo": "beta", "repos": ["beta", "gamma"]},
+    {"type": "trend", "repo": "gamma", "month": "2024-02", "months": ["2024-02", "2024-05"]},
+]
+
+
+def _store(dim=6, seed=0, distance_strategy=DistanceStrategy.EUCLIDEAN_DISTANCE):
+    vectors = np.random.default_rng(seed).normal(size=(len(METADATAS), dim)).astype("float32")
+    store = FAISS.from_embeddings([(f"doc {i}", v.tolist()) for i, v in enumerate(vectors)],
+                                  FakeEmbeddings(size=dim), metadatas=METADATAS,
+                                  distance_strategy=distance_strategy)
+    return store, vectors
+
+
+def test_postings_by_repo_and_month():
+    index = MetadataIndex(_store()[0])
+    assert index.total == 5
+    assert index.repos["alpha"].tolist() == [0, 1]
+    assert index.repos["beta"].tolist() == [2, 3]
+    assert index.repos["gamma"].tolist() == [3, 4]  # Liste "repos" agrégée du représentant
+    assert index.months["2024-05"].tolist() == [4]
+    assert index.undated.tolist() == [0, 3]
+
+
+def test_candidate_ids_combines_repos_and_timeframe():
+    index = MetadataIndex(_store()[0])
+    assert index.candidate_ids() is None
+    assert index.candidate_ids(repos=["ALPHA", "unknown"]).tolist() == [0, 1]
+    january_february = (datetime(2024, 1, 1), datetime(2024, 2, 28))
+    # Documents sans période (dépôt, issue) toujours inclus
+    assert index.candidate_ids(timeframe=january_february).tolist() == [0, 1, 3, 4]
+    assert index.candidate_ids(repos=["beta"], timeframe=january_february).tolist() == [3]
+    assert index.candidate_ids(repos=["unknown"]).tolist() == []
+
+
+def test_search_subset_is_exact_within_the_subset():
+    store, vectors = _store()
+    query = np.random.default_rng(1).normal(size=vectors.shape[1]).astype("float32")
+    ids = np.array([1, 3, 4])
+
+    hits = search_subset(store, query, ids, k=2)
+    distances = ((vectors[ids] - query) ** 2).sum(axis=1)
+    expected = ids[np.argsort(distances)[:2]]
+    assert [doc.page_content for doc, _ in hits] == [f"doc {i}" for i in expected]
+    assert np.allclose([score for _, score in hits], np.sort(distances)[:2], rtol=1e-5)
+
+
+def test_search_subset_of_nothing():
+    store, vectors = _store()
+    assert search_subset(store, vectors[0], np.array([], dtype="int64"), k=3) == []
+
+
+def test_inner_product_scores_share_one_convention():
+    store, vectors = _store(distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+    query = np.random.default_rng(1).normal(size=vectors.shape[1]).astype("float32")
+    every_id = np.arange(len(vectors))
+
+    full_index = search_by_vectors(store, [query], k=3)[0]
+    subset = search_subset(store, query, every_id, k=3)
+    register_full_precision(store, vectors)
+    rescored = search_by_vectors(store, [query], k=3)[0]
+
+    # Produit scalaire brut, du plus grand au plus petit, quel que soit le chemin de recherche
+    expected_scores = np.sort(vectors @ query)[::-1][:3]
+    for hits in (full_index, subset, rescored):
+        assert [doc.page_content for doc, _ in hits] == [doc.page_content for doc, _ in full_index]
+        assert np.allclose([score for _, score in hits], expected_scores, rtol=1e-5)